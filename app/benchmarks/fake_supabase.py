@@ -0,0 +1,247 @@
+import re
+import copy
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FakeResponse:
+    """Response of a fake query, mirrors the data attribute of the client responses."""
+
+    def __init__(self, data: Any):
+        self.data = data
+
+    def __contains__(self, key: str) -> bool:
+        return False
+
+
+class FakeQuery:
+    """Query builder supporting the subset of the PostgREST client used by the app."""
+
+    KEYSET_PATTERN = re.compile(r'(\w+)\.lt\."([^"]+)",and\(\w+\.eq\."[^"]+",(\w+)\.lt\."?([^"]+)"?\)$')
+    HTTP_METHODS = {"select": "GET", "insert": "POST", "upsert": "POST", "update": "PATCH", "delete": "DELETE"}
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self._client = client
+        self._table = table
+        self._operation = ("select", "*")
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: List[tuple] = []
+        self._limit: Optional[int] = None
+
+    # Request attributes of the PostgREST builders, used to label database metrics
+    @property
+    def path(self) -> str:
+        return f"/{self._table}"
+
+    @property
+    def http_method(self) -> str:
+        return self.HTTP_METHODS[self._operation[0]]
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Prefer": "resolution=merge-duplicates"} if self._operation[0] == "upsert" else {}
+
+    def select(self, columns: str = "*", **kwargs) -> "FakeQuery":
+        self._operation = ("select", columns)
+        return self
+
+    def insert(self, data: Any, **kwargs) -> "FakeQuery":
+        self._operation = ("insert", data)
+        return self
+
+    def upsert(self, data: Any, on_conflict: str = "", **kwargs) -> "FakeQuery":
+        self._operation = ("upsert", (data, on_conflict))
+        return self
+
+    def update(self, data: Dict[str, Any]) -> "FakeQuery":
+        self._operation = ("update", data)
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self._operation = ("delete", None)
+        return self
+
+    def _filter(self, column: str, test: Callable[[Any], bool]) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) is not None and test(row.get(column)))
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda current: current > value)
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda current: current >= value)
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda current: current < value)
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        return self._filter(column, lambda current: current <= value)
+
+    def in_(self, column: str, values: List[Any]) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, expression: str) -> "FakeQuery":
+        # Only the keyset condition built by the listing queries is understood
+        match = self.KEYSET_PATTERN.match(expression)
+        if match is None:
+            raise NotImplementedError(f"Unsupported or filter {expression}")
+        first, first_value, second, second_value = match.groups()
+        self._filters.append(lambda row: row[first] < first_value
+                             or (row[first] == first_value and row[second] < second_value))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "FakeQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        self._limit = count
+        return self
+
+    def execute(self) -> FakeResponse:
+        self._client.simulate_latency()
+        return self._client.run(self)
+
+
+class FakeBucket:
+    def __init__(self, client: "FakeSupabase", objects: Dict[str, bytes]):
+        self._client = client
+        self._objects = objects
+
+    def upload(self, path: str, file: Any, file_options: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        self._client.simulate_latency()
+        self._objects[path] = bytes(file)
+        return {"Key": path}
+
+    def download(self, path: str) -> Optional[bytes]:
+        self._client.simulate_latency()
+        return self._objects.get(path)
+
+
+class FakeStorage:
+    def __init__(self, client: "FakeSupabase"):
+        self._client = client
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self._client, self._client.buckets.setdefault(str(bucket), {}))
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeSupabase", name: str, params: Dict[str, Any]):
+        self._client = client
+        self._name = name
+        self._params = params
+        self.path = f"/rpc/{name}"
+        self.http_method = "POST"
+
+    def execute(self) -> FakeResponse:
+        self._client.simulate_latency()
+        return self._client.call(self._name, self._params)
+
+
+class FakeSupabase:
+    """In-memory stand-in for the Supabase client with injectable latency.
+
+    Every query, RPC and storage call sleeps latency_seconds plus a uniform random
+    jitter in the calling thread before it runs, like a network round trip of the
+    synchronous client. Rows live in plain lists per table, the scenario_model_listing
+    view is computed on read. Only meant for benchmarks, not for correctness tests.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, jitter_seconds: float = 0.0, seed: int = 0):
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.buckets: Dict[str, Dict[str, bytes]] = {}
+        self.storage = FakeStorage(self)
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, str(name))
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        return FakeRpc(self, str(name), params)
+
+    def simulate_latency(self) -> None:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_seconds + self._random.uniform(0, self.jitter_seconds)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rows(self, table: str) -> List[Dict[str, Any]]:
+        if table == "scenario_model_listing":
+            models = {row["model_id"]: row for row in self.tables.get("ml_models", [])}
+            return [{**models.get(row["model_id"], {}), **row} for row in self.tables.get("scenario_models", [])]
+        return self.tables.setdefault(table, [])
+
+    def run(self, query: FakeQuery) -> FakeResponse:
+        with self._lock:
+            rows = self._rows(query._table)
+            matched = [row for row in rows if all(test(row) for test in query._filters)]
+            operation, argument = query._operation
+            if operation == "select":
+                for column, desc in reversed(query._order):
+                    matched.sort(key=lambda row: row.get(column), reverse=desc)
+                if query._limit is not None:
+                    matched = matched[:query._limit]
+                if argument != "*":
+                    columns = [column.strip() for column in argument.split(",")]
+                    matched = [{column: row.get(column) for column in columns} for row in matched]
+                return FakeResponse(copy.deepcopy(matched))
+            if operation == "insert":
+                records = argument if isinstance(argument, list) else [argument]
+                rows.extend(copy.deepcopy(records))
+                return FakeResponse(records)
+            if operation == "upsert":
+                records, conflict = argument
+                records = records if isinstance(records, list) else [records]
+                keys = [column.strip() for column in conflict.split(",") if column.strip()]
+                if keys:
+                    index = {tuple(row.get(key) for key in keys): row for row in rows}
+                    for record in records:
+                        existing = index.get(tuple(record.get(key) for key in keys))
+                        if existing is not None:
+                            existing.update(copy.deepcopy(record))
+                        else:
+                            rows.append(copy.deepcopy(record))
+                else:
+                    rows.extend(copy.deepcopy(records))
+                return FakeResponse(records)
+            if operation == "update":
+                for row in matched:
+                    row.update(argument)
+                return FakeResponse(copy.deepcopy(matched))
+            if operation == "delete":
+                self.tables[query._table] = [row for row in rows if row not in matched]
+                return FakeResponse(copy.deepcopy(matched))
+        raise NotImplementedError(f"Unsupported operation {operation}")
+
+    def call(self, name: str, params: Dict[str, Any]) -> FakeResponse:
+        if name != "activate_scenario_model":
+            raise NotImplementedError(f"Unknown database function {name}")
+        scenario_id, model_id = params["p_scenario_id"], params["p_model_id"]
+        with self._lock:
+            scenarios = [row for row in self.tables.get("scenarios", []) if row["scenario_id"] == scenario_id]
+            links = [row for row in self.tables.get("scenario_models", []) if row["scenario_id"] == scenario_id]
+            if not scenarios or not any(row["model_id"] == model_id for row in links):
+                return FakeResponse(False)
+            for row in links:
+                row["is_active"] = row["model_id"] == model_id
+                if row["is_active"]:
+                    row["activated_on"] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+            scenarios[0]["current_model_id"] = model_id
+        return FakeResponse(True)
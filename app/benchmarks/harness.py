@@ -0,0 +1,126 @@
+import json
+import time
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import httpx
+
+
+@dataclass
+class BenchRequest:
+    """One request of a replayed or synthetic stream, grouped in the results by name."""
+    method: str
+    path: str
+    json: Any = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    name: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return self.name or f"{self.method.upper()} {self.path}"
+
+
+def load_requests(path: str) -> List[BenchRequest]:
+    """Reads a recorded request stream, one JSON object per line.
+
+    Every line has method and path, and optionally json (the request body),
+    headers and name (the group the latency is reported under).
+    """
+    requests = []
+    with open(path) as stream:
+        for line in stream:
+            if line.strip():
+                record = json.loads(line)
+                requests.append(BenchRequest(
+                    method=record["method"], path=record["path"], json=record.get("json"),
+                    headers=record.get("headers") or {}, name=record.get("name"),
+                ))
+    return requests
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """Latency percentiles in milliseconds and throughput per second of a set of calls."""
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if len(values) == 0:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": int(len(values)),
+        "errors": int(errors),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "throughput_per_s": float(len(values) / elapsed) if elapsed > 0 else 0.0,
+    }
+
+
+async def replay(client: httpx.AsyncClient, requests: Iterable[BenchRequest],
+                 concurrency: int) -> Dict[str, Dict[str, Any]]:
+    """Sends a request stream with concurrency requests in flight.
+
+    Returns:
+        Latency and throughput per request label and over all requests ("total");
+        responses other than 2xx and 304 count as errors
+    """
+    stream = iter(requests)
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    async def worker() -> None:
+        for request in stream:
+            started = time.perf_counter()
+            try:
+                response = await client.request(request.method, request.path, json=request.json,
+                                                headers=request.headers)
+                failed = not (response.is_success or response.status_code == 304)
+            except httpx.HTTPError:
+                failed = True
+            latencies.setdefault(request.label, []).append(time.perf_counter() - started)
+            errors[request.label] = errors.get(request.label, 0) + int(failed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {label: summarize(values, elapsed, errors[label]) for label, values in latencies.items()}
+    results["total"] = summarize(list(itertools.chain(*latencies.values())), elapsed, sum(errors.values()))
+    return results
+
+
+def microbenchmark(function: Callable[[], Any], repeat: int, warmup: int = 10) -> Dict[str, Any]:
+    """Times repeat sequential calls of function after warmup untimed calls."""
+    for _ in range(warmup):
+        function()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call_started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# Relative change of a metric that counts as a regression, lower is better for latencies
+COMPARED_METRICS = {"p50_ms": False, "p99_ms": False, "throughput_per_s": True}
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float) -> List[str]:
+    """Lists the metrics of results that are more than threshold worse than the baseline."""
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if higher_is_better else (new - old) / old
+            if change > threshold:
+                regressions.append(f"{name} {metric}: {old:.3f} -> {new:.3f} ({change:+.0%} worse)")
+    return regressions
@@ -0,0 +1,261 @@
+"""Benchmark suite of the inference and CRUD routes.
+
+Replays a recorded or synthetic request stream against the app running in-process
+on top of FakeSupabase, and times the inference building blocks in isolation.
+Run from the app directory:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --latency-ms 5 --concurrency 32 --requests 5000 \\
+        --baseline previous.json --threshold 0.15
+
+The app reads its usual environment variables, e.g. PREDICTION_CACHE=false or
+INFERENCE_MICRO_BATCHING=true, so configurations can be compared run by run.
+With --baseline the exit status is 1 if any p50, p99 or throughput is more than
+threshold worse than in the baseline results.
+"""
+import io
+import os
+import sys
+import json
+import uuid
+import pickle
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.harness import BenchRequest, compare, load_requests, microbenchmark, replay
+
+BENCHMARK_SCENARIO = "00000000-0000-4000-8000-00000000be0c"
+BATCH_RECORDS = 32
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the inference and CRUD routes")
+    parser.add_argument("--suite", choices=["all", "micro", "http"], default="all")
+    parser.add_argument("--requests", type=int, default=2000, help="Synthetic requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--replay", help="Recorded request stream in JSON lines instead of the synthetic one")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated database round trip")
+    parser.add_argument("--jitter-ms", type=float, default=1.0, help="Random extra database latency")
+    parser.add_argument("--models", type=int, default=200, help="Models listed for the benchmark scenario")
+    parser.add_argument("--repeat", type=int, default=1000, help="Calls per microbenchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def synthetic_records(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Valid prediction requests drawn uniformly from the accepted values."""
+    from models.models import CATEGORICAL_VOCABULARIES
+
+    rng = random.Random(seed)
+    return [
+        {
+            "age": rng.randint(18, 90),
+            "income": round(rng.uniform(0, 200000), 2),
+            "time_spent_on_platform": round(rng.uniform(0, 300), 1),
+            "number_of_sessions": rng.randint(0, 40),
+            "fields_filled_percentage": round(rng.uniform(0, 100), 1),
+            "previous_year_filing": rng.randint(0, 1),
+            **{field: rng.choice(vocabulary) for field, vocabulary in CATEGORICAL_VOCABULARIES.items()},
+        }
+        for _ in range(count)
+    ]
+
+
+def train_model(records: List[Dict[str, Any]], seed: int) -> bytes:
+    """Fits the default pipeline on synthetic records and returns the pickled model."""
+    from utility.model_trainer import build_pipeline
+
+    frame = pd.DataFrame(records)
+    noise = np.random.default_rng(seed).normal(0, 15, len(frame))
+    labels = (frame["fields_filled_percentage"] + 10 * frame["previous_year_filing"] + noise > 55).astype(int)
+    return pickle.dumps(build_pipeline(random_state=seed).fit(frame, labels))
+
+
+async def seed_database(db: FakeSupabase, model_blob: bytes, models: int) -> str:
+    """Creates the benchmark scenario with models listed entries and activates the newest one.
+
+    Returns:
+        ID of the active model
+    """
+    from database.crud import update_active_model, upload_new_model
+
+    db.tables["scenarios"] = [{
+        "scenario_id": BENCHMARK_SCENARIO, "scenario_name": "benchmark",
+        "description": "Synthetic benchmark scenario", "current_model_id": None,
+    }]
+    # Listing rows only, their artifacts are never loaded
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(max(models - 1, 0)):
+        model_id = str(uuid.UUID(int=index + 1))
+        db.tables.setdefault("ml_models", []).append({
+            "model_id": model_id, "model_name": f"benchmark-v{index + 1}", "model_filename": "model.pkl",
+            "model_state": "inactive", "model_version": str(index + 1), "accuracy": 0.8,
+            "created_at": (created + timedelta(hours=index)).isoformat(),
+        })
+        db.tables.setdefault("scenario_models", []).append({
+            "scenario_id": BENCHMARK_SCENARIO, "model_id": model_id, "is_active": False, "activated_on": None,
+        })
+
+    model_id = str(uuid.uuid4())
+    metrics = json.dumps({"accuracy": 0.8, "precision": 0.8, "recall": 0.8, "f1_score": 0.8})
+    if await upload_new_model(io.BytesIO(model_blob), "model.pkl", "benchmark", model_id, float(models),
+                              metrics, BENCHMARK_SCENARIO, db) is None:
+        raise RuntimeError("Failed to upload the benchmark model")
+    if not await update_active_model(BENCHMARK_SCENARIO, model_id, db):
+        raise RuntimeError("Failed to activate the benchmark model")
+    return model_id
+
+
+def synthetic_stream(records: List[Dict[str, Any]], count: int, seed: int) -> List[BenchRequest]:
+    """Mix of single predictions, batch predictions and dashboard listings."""
+    rng = random.Random(seed)
+    base = f"/v1/scenarios/{BENCHMARK_SCENARIO}"
+    stream = []
+    for _ in range(count):
+        draw = rng.random()
+        if draw < 0.7:
+            stream.append(BenchRequest("POST", f"{base}/predict", json=rng.choice(records),
+                                       name="POST /v1/scenarios/{id}/predict"))
+        elif draw < 0.8:
+            stream.append(BenchRequest("POST", f"{base}/predict/batch",
+                                       json={"records": rng.sample(records, BATCH_RECORDS)},
+                                       name="POST /v1/scenarios/{id}/predict/batch"))
+        elif draw < 0.9:
+            stream.append(BenchRequest("GET", "/v1/scenarios", name="GET /v1/scenarios"))
+        else:
+            stream.append(BenchRequest("GET", f"{base}/models?limit=50&fields=model_id,model_name,created_at",
+                                       name="GET /v1/scenarios/{id}/models"))
+    return stream
+
+
+def run_micro(model_blob: bytes, records: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Times preprocessing, model loading and prediction without the HTTP stack."""
+    from utility.model_executor import ModelExecutor
+    from utility.model_loader import ModelLoader
+
+    loader = ModelLoader()
+    loaded = loader.build_candidate(io.BytesIO(model_blob), "benchmark-micro", "benchmark-micro-model")
+    single, batch = records[:1], records[:64]
+    encoded_single = ModelExecutor._preprocess_data(single, loaded.encoder)
+    encoded_batch = ModelExecutor._preprocess_data(batch, loaded.encoder)
+
+    results = {
+        "micro.preprocess_data.1": microbenchmark(
+            lambda: ModelExecutor._preprocess_data(single, loaded.encoder), repeat),
+        "micro.preprocess_data.64": microbenchmark(
+            lambda: ModelExecutor._preprocess_data(batch, loaded.encoder), repeat),
+        "micro.model_predict.1": microbenchmark(lambda: loaded.model.predict(encoded_single), repeat),
+        "micro.model_predict.64": microbenchmark(lambda: loaded.model.predict(encoded_batch), repeat),
+        "micro.execute_batch_inference.1": microbenchmark(
+            lambda: ModelExecutor.execute_batch_inference(single, loaded), repeat),
+        "micro.execute_batch_inference.64": microbenchmark(
+            lambda: ModelExecutor.execute_batch_inference(batch, loaded), repeat),
+        # Unpickling, validation, compilation and warm-up of a whole model
+        "micro.load_model_from_binary": microbenchmark(
+            lambda: loader.load_model_from_binary(
+                io.BytesIO(model_blob), "benchmark-micro", "benchmark-micro-model", activate=False),
+            max(repeat // 50, 5), warmup=1),
+    }
+    if loaded.compiled is not None:
+        results["micro.compiled_predict.1"] = microbenchmark(lambda: loaded.compiled.predict(single), repeat)
+        results["micro.compiled_predict.64"] = microbenchmark(lambda: loaded.compiled.predict(batch), repeat)
+    return results
+
+
+async def run_http(args: argparse.Namespace, db: FakeSupabase, model_blob: bytes,
+                   records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Replays the request stream against the app with its full lifespan."""
+    import httpx
+    from main import app, lifespan
+
+    await seed_database(db, model_blob, args.models)
+    requests = load_requests(args.replay) if args.replay else synthetic_stream(records, args.requests, args.seed)
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                     timeout=60) as client:
+            # Warm up the route and cache paths before measuring
+            await replay(client, requests[:min(len(requests), 50)], args.concurrency)
+            results = await replay(client, requests, args.concurrency)
+    return {f"http.{label}": stats for label, stats in results.items()}
+
+
+def configure_environment() -> None:
+    """Points the app at local scratch paths and placeholder credentials unless set."""
+    scratch = tempfile.mkdtemp(prefix="ml_pipeline_benchmark_")
+    os.environ.setdefault("SUPABASE_DB_HOST", "http://benchmark.invalid")
+    os.environ.setdefault("SUPABASE_DB_KEY", "benchmark")
+    os.environ.setdefault("MODEL_PRELOAD", "false")
+    os.environ.setdefault("MODEL_CACHE_DIR", os.path.join(scratch, "models"))
+    os.environ.setdefault("DATASET_CACHE_DIR", os.path.join(scratch, "datasets"))
+    os.environ.setdefault("METADATA_STAMP_DIR", os.path.join(scratch, "metadata_stamps"))
+    os.environ.setdefault("PREDICTION_SPILL_PATH", os.path.join(scratch, "prediction_spill.jsonl"))
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    configure_environment()
+    logging.getLogger().setLevel(logging.WARNING)
+    # One line per replayed request would dominate the run time
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    from database.database import SupabaseClientManager
+
+    db = FakeSupabase(latency_seconds=args.latency_ms / 1000.0, jitter_seconds=args.jitter_ms / 1000.0,
+                      seed=args.seed)
+    # Every database access of the app goes through the stand-in
+    SupabaseClientManager._instance = db
+
+    records = synthetic_records(2000, args.seed)
+    model_blob = train_model(records, args.seed)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    if args.suite in ("all", "micro"):
+        results.update(run_micro(model_blob, records, args.repeat))
+    if args.suite in ("all", "http"):
+        results.update(asyncio.run(run_http(args, db, model_blob, records)))
+    logging.getLogger().setLevel(logging.INFO)
+
+    output = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "arguments": vars(args),
+            "database_calls": db.calls,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(output, output_file, indent=2)
+
+    for name, stats in results.items():
+        if stats.get("count"):
+            print(f"{name:<48} n={stats['count']:<6} err={stats['errors']:<4} p50={stats['p50_ms']:9.3f}ms "
+                  f"p99={stats['p99_ms']:9.3f}ms {stats['throughput_per_s']:10.1f}/s")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file)["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
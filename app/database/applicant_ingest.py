@@ -0,0 +1,353 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from functools import lru_cache
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import pandas as pd
+from supabase import Client
+
+from models.models import ApplicantIngestReport, ApplicantReject, CATEGORICAL_VOCABULARIES
+from database.table_names import TableName
+from database.db_executor import DatabaseTimeoutError, execute
+from utility.training_dataset import FALSE_VALUES, TRUE_VALUES
+
+logger = logging.getLogger("applicant_ingest")
+
+CSV_FORMAT = "csv"
+NDJSON_FORMAT = "ndjson"
+
+# Columns of the applicants table and the types of the Applicant model
+INTEGER_COLUMNS = ["age", "number_of_sessions"]
+FLOAT_COLUMNS = ["income", "time_spent_on_platform", "fields_filled_percentage"]
+BOOLEAN_COLUMNS = ["previous_year_filing", "completed_filing"]
+# Columns of the enum types of create_tables.sql, which hold the prediction request vocabularies
+ENUM_COLUMNS = {
+    column: CATEGORICAL_VOCABULARIES[column] for column in ("employment_type", "marital_status", "device_type")
+}
+TEXT_COLUMNS = ["referral_source"]
+APPLICANT_COLUMNS = (
+    ["user_id"] + INTEGER_COLUMNS + FLOAT_COLUMNS + BOOLEAN_COLUMNS + list(ENUM_COLUMNS) + TEXT_COLUMNS
+)
+UUID_PATTERN = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+# SQLSTATE classes caused by the values of a row: 22 data exception, 23 integrity constraint violation
+ROW_ERROR_SQLSTATE_CLASSES = ("22", "23")
+
+# (frame of raw values, input row number of every frame row, rejects found while parsing)
+RawChunk = Tuple[pd.DataFrame, np.ndarray, List[ApplicantReject]]
+
+
+def format_for_filename(file_name: str) -> str:
+    """Returns the input format of a file from its extension, CSV unless it is .ndjson/.jsonl."""
+    return NDJSON_FORMAT if file_name.lower().endswith((".ndjson", ".jsonl")) else CSV_FORMAT
+
+
+def _check_columns(columns: List[str]) -> None:
+    missing = [column for column in APPLICANT_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Missing applicant columns: {', '.join(missing)}")
+
+
+def iter_csv_chunks(source: BinaryIO, chunk_rows: int) -> Iterator[RawChunk]:
+    """Reads a CSV stream with a header row in chunks of raw string values.
+
+    Raises:
+        ValueError: If a column is missing or the CSV is malformed
+    """
+    reader = pd.read_csv(
+        source, dtype=str, chunksize=chunk_rows,
+        usecols=lambda column: column in APPLICANT_COLUMNS,
+    )
+    first_row = 1
+    for chunk in reader:
+        _check_columns(list(chunk.columns))
+        row_numbers = np.arange(first_row, first_row + len(chunk))
+        first_row += len(chunk)
+        yield chunk.reset_index(drop=True), row_numbers, []
+
+
+def iter_ndjson_chunks(source: BinaryIO, chunk_rows: int) -> Iterator[RawChunk]:
+    """Reads a stream of JSON objects, one per line, in chunks.
+
+    Lines that are not JSON objects are rejected, blank lines are skipped.
+    """
+    records: List[Dict[str, Any]] = []
+    row_numbers: List[int] = []
+    rejects: List[ApplicantReject] = []
+    for row_number, line in enumerate(io.TextIOWrapper(source, encoding="utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            rejects.append(ApplicantReject(row=row_number, errors=[f"invalid JSON: {str(e)}"]))
+            continue
+        if not isinstance(record, dict):
+            rejects.append(ApplicantReject(row=row_number, errors=["line is not a JSON object"]))
+            continue
+        records.append(record)
+        row_numbers.append(row_number)
+        if len(records) >= chunk_rows:
+            yield _ndjson_frame(records), np.array(row_numbers), rejects
+            records, row_numbers, rejects = [], [], []
+    if records or rejects:
+        yield _ndjson_frame(records), np.array(row_numbers, dtype=np.int64), rejects
+
+
+def _ndjson_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(records, columns=APPLICANT_COLUMNS)
+    # Missing keys become NaN like empty CSV cells
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def is_row_error(error: Exception) -> bool:
+    """True if a database error was caused by the values of a row rather than the request.
+
+    PostgREST errors carry the SQLSTATE of the failed statement in their code, its own
+    errors (authentication, schema cache) use PGRST codes.
+    """
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and len(code) == 5 and code.startswith(ROW_ERROR_SQLSTATE_CLASSES)
+
+
+def validate_applicants(frame: pd.DataFrame, row_numbers: np.ndarray
+                        ) -> Tuple[List[Dict[str, Any]], np.ndarray, List[ApplicantReject]]:
+    """Validates and converts a chunk of raw applicant rows column by column.
+
+    Args:
+        frame: Raw values, strings for CSV or JSON values for NDJSON
+        row_numbers: Input row number of every frame row
+
+    Returns:
+        (records of the valid rows ready for insertion, their row numbers, rejects)
+    """
+    invalid: Dict[str, np.ndarray] = {}
+    converted: Dict[str, pd.Series] = {}
+
+    text = {column: frame[column].where(frame[column].notna(), "").astype(str).str.strip()
+            for column in ["user_id"] + list(ENUM_COLUMNS) + TEXT_COLUMNS}
+
+    converted["user_id"] = text["user_id"].str.lower()
+    invalid["user_id must be a UUID"] = ~converted["user_id"].str.fullmatch(UUID_PATTERN).to_numpy(dtype=bool)
+
+    for column in INTEGER_COLUMNS + FLOAT_COLUMNS:
+        values = pd.to_numeric(frame[column], errors="coerce").astype(np.float64)
+        bad = ~np.isfinite(values.to_numpy())
+        if column in INTEGER_COLUMNS:
+            bad |= values.to_numpy() % 1 != 0
+            values = values.where(~bad, 0).astype(np.int64)
+        invalid[f"{column} must be {'an integer' if column in INTEGER_COLUMNS else 'a number'}"] = bad
+        converted[column] = values
+
+    for column in BOOLEAN_COLUMNS:
+        raw = frame[column]
+        text_values = raw.where(raw.notna(), "").astype(str).str.strip().str.lower()
+        truthy = text_values.isin(TRUE_VALUES).to_numpy()
+        invalid[f"{column} must be a boolean"] = ~(truthy | text_values.isin(FALSE_VALUES).to_numpy())
+        converted[column] = pd.Series(truthy, index=frame.index)
+
+    for column, values in ENUM_COLUMNS.items():
+        converted[column] = text[column].str.lower()
+        invalid[f"{column} must be one of {values}"] = ~converted[column].isin(values).to_numpy()
+
+    for column in TEXT_COLUMNS:
+        converted[column] = text[column]
+        invalid[f"{column} is required"] = (text[column] == "").to_numpy()
+
+    rejected = np.zeros(len(frame), dtype=bool)
+    for mask in invalid.values():
+        rejected |= mask
+
+    rejects = []
+    for position in np.flatnonzero(rejected):
+        rejects.append(ApplicantReject(
+            row=int(row_numbers[position]),
+            user_id=text["user_id"].iat[position] or None,
+            errors=[message for message, mask in invalid.items() if mask[position]],
+        ))
+
+    valid = pd.DataFrame(converted)[APPLICANT_COLUMNS][~rejected]
+    return valid.to_dict("records"), row_numbers[~rejected], rejects
+
+
+class ApplicantIngestor:
+    """Loads applicant rows from CSV or NDJSON streams into the applicants table.
+
+    The stream is read and validated in chunks of batch_size rows in a worker thread,
+    each chunk is written with a single upsert on user_id so that a load can be
+    repeated. Up to parallelism upserts are in flight while the next chunk is read.
+    A batch rejected by the database because of row values (see is_row_error) is
+    split in halves until the failing rows are isolated and reported, the rest of
+    the batch is still written. Batches that time out or cannot reach the database
+    are rejected as a whole. Any other database error, e.g. authentication, row
+    level security, schema or server errors, would fail every batch alike: the load
+    is aborted, remaining batches are rejected and the report carries the error.
+    """
+
+    def __init__(self, batch_size: int = 5000, parallelism: int = 4, max_reported_rejects: int = 1000):
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+        self.max_reported_rejects = max_reported_rejects
+
+    async def ingest(self, source: BinaryIO, input_format: str, db: Client) -> ApplicantIngestReport:
+        """Validates and writes every applicant of a stream.
+
+        Args:
+            source: Binary stream with a header row for CSV, or one JSON object per line
+            input_format: CSV_FORMAT or NDJSON_FORMAT
+            db: Supabase client
+
+        Returns:
+            Row counts, the first max_reported_rejects rejects and an error if reading stopped early
+        """
+        report = ApplicantIngestReport()
+        started = time.monotonic()
+        if input_format == NDJSON_FORMAT:
+            chunks = iter_ndjson_chunks(source, self.batch_size)
+        elif input_format == CSV_FORMAT:
+            chunks = iter_csv_chunks(source, self.batch_size)
+        else:
+            raise ValueError(f"Unknown input format {input_format}")
+
+        semaphore = asyncio.Semaphore(self.parallelism)
+        writes = set()
+        try:
+            while report.error is None:
+                try:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                except (ValueError, pd.errors.ParserError, UnicodeDecodeError) as e:
+                    report.error = f"Stopped reading the input: {str(e)}"
+                    logger.error(report.error)
+                    break
+                if chunk is None:
+                    break
+                frame, row_numbers, parse_rejects = chunk
+                records, record_rows, rejects = await asyncio.to_thread(validate_applicants, frame, row_numbers)
+                report.rows += len(frame) + len(parse_rejects)
+                self._reject(report, parse_rejects + rejects)
+                records, record_rows = self._deduplicate(report, records, record_rows)
+                if not records:
+                    continue
+                # Backpressure, reading waits until a write slot is free
+                await semaphore.acquire()
+                write = asyncio.create_task(self._write(report, records, record_rows, db))
+                write.add_done_callback(lambda _: semaphore.release())
+                writes.add(write)
+                write.add_done_callback(writes.discard)
+            if writes:
+                await asyncio.gather(*writes)
+        finally:
+            for write in writes:
+                write.cancel()
+
+        report.elapsed_seconds = time.monotonic() - started
+        report.rows_per_second = report.rows / report.elapsed_seconds if report.elapsed_seconds > 0 else 0.0
+        logger.info(f"Ingested {report.written} of {report.rows} applicants in {report.elapsed_seconds:.1f} seconds, "
+                    f"{report.rejected} rejected")
+        return report
+
+    def _reject(self, report: ApplicantIngestReport, rejects: List[ApplicantReject]) -> None:
+        report.rejected += len(rejects)
+        room = self.max_reported_rejects - len(report.rejects)
+        report.rejects.extend(rejects[:max(room, 0)])
+        if len(rejects) > room:
+            report.rejects_truncated = True
+
+    @staticmethod
+    def _deduplicate(report: ApplicantIngestReport, records: List[Dict[str, Any]], record_rows: np.ndarray
+                     ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Keeps the last row of every user_id, an upsert cannot change the same row twice."""
+        last = {record["user_id"]: position for position, record in enumerate(records)}
+        if len(last) == len(records):
+            return records, record_rows
+        report.duplicates += len(records) - len(last)
+        positions = sorted(last.values())
+        return [records[position] for position in positions], record_rows[positions]
+
+    async def _write(self, report: ApplicantIngestReport, records: List[Dict[str, Any]],
+                     record_rows: np.ndarray, db: Client) -> None:
+        if report.error is not None:
+            self._reject(report, self._database_rejects(records, record_rows, "not written, the load was aborted"))
+            return
+        try:
+            await execute(db.table(TableName.APPLICANTS).upsert(records, on_conflict="user_id"))
+        except (DatabaseTimeoutError, httpx.TransportError) as e:
+            self._reject(report, self._database_rejects(records, record_rows, f"database: {str(e)}"))
+            return
+        except Exception as e:
+            if not is_row_error(e):
+                self._reject(report, self._database_rejects(records, record_rows, f"database: {str(e)}"))
+                if report.error is None:
+                    report.error = f"Stopped loading after a database error: {str(e)}"
+                    logger.error(report.error)
+                return
+            if len(records) == 1:
+                self._reject(report, self._database_rejects(records, record_rows, f"database: {str(e)}"))
+                return
+            middle = len(records) // 2
+            await self._write(report, records[:middle], record_rows[:middle], db)
+            await self._write(report, records[middle:], record_rows[middle:], db)
+            return
+        report.written += len(records)
+        report.batches += 1
+
+    @staticmethod
+    def _database_rejects(records: List[Dict[str, Any]], record_rows: np.ndarray,
+                          message: str) -> List[ApplicantReject]:
+        return [
+            ApplicantReject(row=int(row), user_id=record["user_id"], errors=[message])
+            for record, row in zip(records, record_rows)
+        ]
+
+
+@lru_cache()
+def get_applicant_ingestor() -> ApplicantIngestor:
+    """Returns the applicant ingestor configured from the environment."""
+    return ApplicantIngestor(
+        batch_size=int(os.environ.get("APPLICANT_INGEST_BATCH_SIZE", "5000")),
+        parallelism=int(os.environ.get("APPLICANT_INGEST_PARALLELISM", "4")),
+        max_reported_rejects=int(os.environ.get("APPLICANT_INGEST_MAX_REPORTED_REJECTS", "1000")),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, run from the app directory:
+
+        python -m database.applicant_ingest applicants.csv --batch-size 5000 --parallelism 8
+    """
+    parser = argparse.ArgumentParser(description="Bulk load applicants from CSV or NDJSON files")
+    parser.add_argument("path", help="Input file, - reads standard input")
+    parser.add_argument("--format", choices=[CSV_FORMAT, NDJSON_FORMAT],
+                        help="Input format, by default derived from the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per upsert")
+    parser.add_argument("--parallelism", type=int, default=4, help="Upserts in flight")
+    parser.add_argument("--rejects", help="Write the rejected rows to this JSON lines file")
+    args = parser.parse_args(argv)
+
+    from database.database import SupabaseClientManager
+
+    ingestor = ApplicantIngestor(
+        batch_size=args.batch_size, parallelism=args.parallelism,
+        max_reported_rejects=sys.maxsize if args.rejects else 1000,
+    )
+    input_format = args.format or format_for_filename(args.path)
+    source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    with source:
+        report = asyncio.run(ingestor.ingest(source, input_format, SupabaseClientManager.get_client()))
+
+    if args.rejects:
+        with open(args.rejects, "w") as rejects_file:
+            rejects_file.writelines(reject.model_dump_json() + "\n" for reject in report.rejects)
+    print(report.model_dump_json(exclude={"rejects"}, indent=2))
+    return 1 if report.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
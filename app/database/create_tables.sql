@@ -1,6 +1,6 @@
 -- Create enum types
-CREATE TYPE employment_type AS ENUM ('full_time', 'part_time', 'unemployed');
-CREATE TYPE marital_status AS ENUM ('single', 'married', 'divorced');
+CREATE TYPE employment_type AS ENUM ('full_time', 'part_time', 'self_employed', 'unemployed', 'retired');
+CREATE TYPE marital_status AS ENUM ('single', 'married', 'divorced', 'widowed', 'separated');
 CREATE TYPE device_type AS ENUM ('desktop', 'mobile', 'tablet');
 CREATE TYPE model_status AS ENUM ('training', 'deployed', 'failed', 'inactive', 'pending');
 
@@ -23,6 +23,11 @@ CREATE TABLE applicants (
 CREATE TABLE training_data(
     model_training_data_ID UUID PRIMARY KEY,
     model_training_data_URL TEXT NOT NULL,
+    model_training_data_name TEXT,
+    sha256 TEXT,
+    size_bytes BIGINT,
+    row_count BIGINT,
+    columnar_URL TEXT,
     created_at TIMESTAMP WITH TIME ZONE NOT NULL,
     used_status BOOLEAN NOT NULL
 );
@@ -33,6 +38,8 @@ CREATE TABLE ml_models (
     model_URL TEXT NOT NULL,
     model_name TEXT NOT NULL,
     model_filename TEXT NOT NULL,
+    model_sha256 TEXT,
+    model_size_bytes BIGINT,
     accuracy FLOAT NOT NULL,
     model_precision FLOAT NOT NULL,
     recall FLOAT NOT NULL,
@@ -50,7 +57,9 @@ CREATE TABLE scenarios (
     scenario_ID UUID PRIMARY KEY,
     scenario_name TEXT NOT NULL,
     description TEXT NOT NULL,
-    current_model_ID UUID REFERENCES ml_models(model_ID)
+    current_model_ID UUID REFERENCES ml_models(model_ID),
+    -- Last version handed out by next_model_version
+    last_model_version INT NOT NULL DEFAULT 0
 );
 
 
@@ -60,7 +69,27 @@ CREATE TABLE prediction_responses (
     result BOOLEAN NOT NULL,
     confidence FLOAT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE NOT NULL,
-    applicant_ID UUID REFERENCES applicants(user_ID)
+    applicant_ID UUID REFERENCES applicants(user_ID),
+    scenario_ID UUID REFERENCES scenarios(scenario_ID),
+    model_ID UUID REFERENCES ml_models(model_ID)
+);
+
+-- Create training job table, status follows model_status
+CREATE TABLE training_jobs(
+    training_ID UUID PRIMARY KEY,
+    scenario_ID UUID REFERENCES scenarios(scenario_ID),
+    data_ID UUID REFERENCES training_data(model_training_data_ID),
+    tuned BOOLEAN DEFAULT FALSE,
+    model_ID UUID REFERENCES ml_models(model_ID),
+    status model_status NOT NULL,
+    metrics JSONB,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    -- Refreshed by the worker running the job, cancellation requests reach it through the flag
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE
 );
 
 -- Create junction table for Scenario Model join
@@ -71,3 +100,96 @@ CREATE TABLE scenario_models(
     activated_on TIMESTAMP WITH TIME ZONE NOT NULL,
     PRIMARY KEY (scenario_ID, model_id)
 );
+
+-- Models of a scenario with their metadata, listed newest first with keyset pagination
+CREATE VIEW scenario_model_listing AS
+SELECT sm.scenario_ID, sm.model_ID, sm.is_active, sm.activated_on,
+       m.model_name, m.model_version, m.model_state,
+       m.accuracy, m.model_precision, m.recall, m.f1_score, m.model_size_bytes,
+       m.created_at, m.trained_at
+FROM scenario_models sm
+JOIN ml_models m ON m.model_ID = sm.model_ID;
+
+CREATE INDEX ml_models_created_at_idx ON ml_models (created_at DESC, model_ID DESC);
+
+-- Activate a model of a scenario in a single transaction: flips the active flags,
+-- stamps activated_on and points the scenario at the model.
+-- Returns FALSE without changing anything if the model does not belong to the scenario.
+CREATE OR REPLACE FUNCTION activate_scenario_model(p_scenario_id UUID, p_model_id UUID)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Serialize concurrent activations of the same scenario
+    PERFORM 1 FROM scenarios WHERE scenario_ID = p_scenario_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+    PERFORM 1 FROM scenario_models sm JOIN ml_models m ON m.model_ID = sm.model_ID
+        WHERE sm.scenario_ID = p_scenario_id AND sm.model_ID = p_model_id;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    UPDATE scenario_models
+        SET is_active = (model_ID = p_model_id),
+            activated_on = CASE WHEN model_ID = p_model_id THEN now() ELSE activated_on END
+        WHERE scenario_ID = p_scenario_id AND (is_active OR model_ID = p_model_id);
+    UPDATE scenarios SET current_model_ID = p_model_id WHERE scenario_ID = p_scenario_id;
+    RETURN TRUE;
+END;
+$$;
+
+-- Move a pending training job to training if fewer than p_max_concurrency jobs train,
+-- counted over every worker and replica. Running jobs without a heartbeat for
+-- p_stale_seconds lost their worker and are failed, which frees their slot.
+-- Returns 'claimed', 'busy', 'cancelled' or 'missing' (unknown or no longer pending).
+CREATE OR REPLACE FUNCTION claim_training_slot(p_training_id UUID, p_max_concurrency INT, p_stale_seconds INT)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_cancel_requested BOOLEAN;
+BEGIN
+    -- Serialize claims so two workers cannot take the last slot
+    PERFORM pg_advisory_xact_lock(hashtext('claim_training_slot'));
+
+    SELECT cancel_requested INTO v_cancel_requested
+        FROM training_jobs WHERE training_ID = p_training_id AND status = 'pending';
+    IF NOT FOUND THEN
+        RETURN 'missing';
+    END IF;
+    IF v_cancel_requested THEN
+        RETURN 'cancelled';
+    END IF;
+
+    UPDATE training_jobs
+        SET status = 'failed', error = 'Training worker stopped responding', finished_at = now()
+        WHERE status = 'training' AND heartbeat_at < now() - make_interval(secs => p_stale_seconds);
+    IF (SELECT count(*) FROM training_jobs WHERE status = 'training') >= p_max_concurrency THEN
+        RETURN 'busy';
+    END IF;
+
+    UPDATE training_jobs
+        SET status = 'training', started_at = now(), heartbeat_at = now()
+        WHERE training_ID = p_training_id;
+    RETURN 'claimed';
+END;
+$$;
+
+-- Reserve the next model version of a scenario. Versions come from a per-scenario
+-- counter, the row lock of the update keeps concurrent training jobs from getting the same one.
+-- Returns NULL if the scenario does not exist.
+CREATE OR REPLACE FUNCTION next_model_version(p_scenario_id UUID)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_version INT;
+BEGIN
+    UPDATE scenarios SET last_model_version = last_model_version + 1
+        WHERE scenario_ID = p_scenario_id
+        RETURNING last_model_version INTO v_version;
+    RETURN v_version;
+END;
+$$;
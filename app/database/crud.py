@@ -1,16 +1,30 @@
 import os
+import time
+import uuid
+import base64
 import logging
 import asyncio
 from io import BytesIO
 from functools import lru_cache
-from typing import BinaryIO
-from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
 import json
 
 from models.models import MLModel, Scenario, ModelStatus, ModelStatistics, PerformanceMetrics
 from supabase import create_client, Client
 from database.table_names import TableName
 from utility.model_loader import ModelLoader
+from utility.model_registry import ModelRegistry, RegisteredModel
+from utility.artifact_cache import get_artifact_cache, sha256_hex
+from database.storage_upload import upload_file_streaming, download_file_streaming, CHUNK_SIZE
+from database.db_executor import execute, run_db
+from database.metadata_cache import (
+    get_activation_stamps, get_metadata_cache, metadata_cache_enabled, scenarios_key, scenario_key, models_key,
+    active_model_key
+)
+from utility.training_dataset import FORMAT_VERSION as DATASET_FORMAT_VERSION, MANIFEST_NAME as DATASET_MANIFEST_NAME
+from utility.metrics import MODEL_ACTIVATION_SECONDS, STORAGE_DOWNLOAD_BYTES, STORAGE_DOWNLOAD_SECONDS
 
 # Configure logging
 logging.basicConfig(
@@ -19,41 +33,214 @@ logging.basicConfig(
 )
 logger = logging.getLogger("supabase_client")
 
+# Listing pages
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+SCENARIO_FIELDS = ("scenario_id", "scenario_name", "description", "current_model_id")
+SCENARIO_KEY_COLUMNS = ("scenario_id",)
+MODEL_LISTING_FIELDS = (
+    "scenario_id", "model_id", "is_active", "activated_on", "model_name", "model_version", "model_state",
+    "accuracy", "model_precision", "recall", "f1_score", "model_size_bytes", "created_at", "trained_at",
+)
+DEFAULT_MODEL_FIELDS = ("scenario_id", "model_id", "is_active", "activated_on")
+MODEL_KEY_COLUMNS = ("created_at", "model_id")
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp with a UTC offset, as returned for timestamptz columns"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        raise ValueError(f"Timestamp without UTC offset: {value}")
+    return parsed
+
+
+# Parsers of the keyset columns, cursor values are only used in queries once they parsed
+SCENARIO_KEY_PARSERS = (uuid.UUID,)
+MODEL_KEY_PARSERS = (_parse_timestamp, uuid.UUID)
+
+
+async def _cached(key: tuple, load):
+    """Serve metadata from the read-through metadata cache, or query it if the cache is disabled"""
+    if not metadata_cache_enabled():
+        return await load()
+    cache = get_metadata_cache()
+    # Entries of one scenario are dropped once another worker changed it, the scenario list follows the TTL
+    if key[0] != scenarios_key()[0] and get_activation_stamps().changed(key[1]):
+        cache.invalidate(key[1])
+    return await cache.get_or_load(key, load)
+
+
+def invalidate_metadata(scenario_id: str) -> None:
+    """Drop the cached metadata of a scenario after its models changed, in every worker of the host"""
+    get_metadata_cache().invalidate(scenario_id)
+    get_activation_stamps().bump(scenario_id)
+
+
+@dataclass
+class Page:
+    """One page of a keyset-paginated listing"""
+    rows: List[Dict[str, Any]]
+    # Opaque cursor of the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str, parsers: Sequence[Callable[[str], Any]]) -> list:
+    """Decode a cursor created by encode_cursor
+    Args:
+        cursor (str): Opaque cursor
+        parsers (list): Parser of each keyset column, e.g. MODEL_KEY_PARSERS
+    Returns:
+        list: Parsed keyset values
+    Raises:
+        ValueError: If the cursor is malformed or a value does not parse
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if not isinstance(values, list) or len(values) != len(parsers) or not all(isinstance(v, str) for v in values):
+        raise ValueError("Invalid cursor")
+    try:
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
+def _projection(fields: Optional[Sequence[str]], allowed: Sequence[str], default: Sequence[str],
+                key_columns: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """Columns to return and columns to select, the keyset columns are always selected
+    Raises:
+        ValueError: If a field is not in allowed
+    """
+    returned = list(dict.fromkeys(fields or default))
+    unknown = [field for field in returned if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return returned, returned + [column for column in key_columns if column not in returned]
+
+
+def _page(rows: List[Dict[str, Any]], limit: int, returned: List[str], key_columns: Sequence[str]) -> Page:
+    """Cut the limit + 1 rows of a keyset query into a page and its next cursor"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][column] for column in key_columns])
+    return Page(rows=[{column: row.get(column) for column in returned} for row in rows], next_cursor=next_cursor)
+
+
+async def get_scenarios(db: Client, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                        fields: Optional[Sequence[str]] = None) -> Page:
+    """Get a page of scenarios ordered by scenario ID
+    Args:
+        db (Client): Supabase client
+        limit (int): Maximum number of scenarios, at most MAX_PAGE_SIZE
+        cursor (str): next_cursor of the previous page
+        fields (list[str]): Columns to return out of SCENARIO_FIELDS, all by default
+    Returns:
+        Page: Scenarios and the cursor of the next page
+    Raises:
+        ValueError: If the cursor or a field is invalid
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    returned, selected = _projection(fields, SCENARIO_FIELDS, SCENARIO_FIELDS, SCENARIO_KEY_COLUMNS)
+    after = decode_cursor(cursor, SCENARIO_KEY_PARSERS) if cursor else None
+    return await _cached(
+        scenarios_key(limit, cursor, tuple(returned)),
+        lambda: _load_scenarios(db, limit, after, returned, selected),
+    )
+
 
-async def get_scenarios(db: Client) -> list[Scenario]:
+async def _load_scenarios(db: Client, limit: int, after: Optional[list], returned: List[str],
+                          selected: List[str]) -> Page:
     logger.info(f"Getting scenario list")
-    scenarios = db.table("scenarios").select("*").execute()
+    query = db.table(TableName.SCENARIOS).select(",".join(selected))
+    if after is not None:
+        query = query.gt("scenario_id", str(after[0]))
+    # One extra row tells whether there is a next page
+    scenarios = await execute(query.order("scenario_id").limit(limit + 1))
     if not scenarios.data or len(scenarios.data) == 0:
         logger.info(f"No scenarois found in the database")
-        return None
-    return scenarios.data
+    return _page(scenarios.data or [], limit, returned, SCENARIO_KEY_COLUMNS)
 
 
-async def get_models(scenario_id: str, db: Client) -> list[MLModel]:
-    """Get all models for a given scenario
+async def get_models(scenario_id: str, db: Client, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                     fields: Optional[Sequence[str]] = None, active: Optional[bool] = None,
+                     state: Optional[ModelStatus] = None, created_after: Optional[datetime] = None,
+                     created_before: Optional[datetime] = None) -> Page:
+    """Get a page of the models of a scenario, newest first
+    Filters are applied by the database, a page is always a single query.
     Args:
         scenario_id (str): Scenario ID
         db (Client): Supabase client
+        limit (int): Maximum number of models, at most MAX_PAGE_SIZE
+        cursor (str): next_cursor of the previous page
+        fields (list[str]): Columns to return out of MODEL_LISTING_FIELDS, the scenario_models columns by default
+        active (bool): Only active or only inactive models
+        state (ModelStatus): Only models in this state
+        created_after (datetime): Only models created at or after this time
+        created_before (datetime): Only models created before this time
     Returns:
-        list[MLModel]: List of models for the given scenario
+        Page: Models and the cursor of the next page
+    Raises:
+        ValueError: If the cursor or a field is invalid
     """
+    limit = min(limit, MAX_PAGE_SIZE)
+    returned, selected = _projection(fields, MODEL_LISTING_FIELDS, DEFAULT_MODEL_FIELDS, MODEL_KEY_COLUMNS)
+    after = decode_cursor(cursor, MODEL_KEY_PARSERS) if cursor else None
+    filters = (active, state.value if state else None,
+               created_after.isoformat() if created_after else None,
+               created_before.isoformat() if created_before else None)
+    return await _cached(
+        models_key(scenario_id, limit, cursor, tuple(returned)) + filters,
+        lambda: _load_models(scenario_id, db, limit, after, returned, selected, *filters),
+    )
+
+
+async def _load_models(scenario_id: str, db: Client, limit: int, after: Optional[list], returned: List[str],
+                       selected: List[str], active: Optional[bool], state: Optional[str],
+                       created_after: Optional[str], created_before: Optional[str]) -> Page:
     logger.info(f"Getting model list for scenario_id:{scenario_id} ")
-    models = (
-        db.table("scenario_models")
-        .select("*")
+    query = (
+        db.table(TableName.SCENARIO_MODEL_LISTING)
+        .select(",".join(selected))
         .eq("scenario_id", scenario_id)
-        .execute()
+    )
+    if active is not None:
+        query = query.eq("is_active", active)
+    if state is not None:
+        query = query.eq("model_state", state)
+    if created_after is not None:
+        query = query.gte("created_at", created_after)
+    if created_before is not None:
+        query = query.lt("created_at", created_before)
+    if after is not None:
+        # Rebuilt from the parsed values, which cannot contain quotes or separators of the filter
+        created_at, model_id = after[0].isoformat(), str(after[1])
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",model_id.lt."{model_id}")'
+        )
+    # One extra row tells whether there is a next page
+    models = await execute(
+        query.order("created_at", desc=True).order("model_id", desc=True).limit(limit + 1)
     )
     if not models.data or len(models.data) == 0:
         logger.info(f"No models found for the assigned scenario")
-        return None
-    return models.data
+    return _page(models.data or [], limit, returned, MODEL_KEY_COLUMNS)
 
 
 async def get_scenario_data(scenario_id: str, db: Client) -> Scenario:
+    return await _cached(scenario_key(scenario_id), lambda: _load_scenario_data(scenario_id, db))
+
+
+async def _load_scenario_data(scenario_id: str, db: Client) -> Scenario:
     logger.info(f"Getting Scenario metadata for scenario_id:{scenario_id}")
-    scenario_data = (
-        db.table("scenarios").select("*").eq("scenario_id", scenario_id).execute()
+    scenario_data = await execute(
+        db.table("scenarios").select("*").eq("scenario_id", scenario_id)
     )
     if not scenario_data.data or len(scenario_data.data) == 0:
         logger.info(f"Scenario {scenario_id} not found in the databse")
@@ -68,16 +255,23 @@ async def get_scenario_data(scenario_id: str, db: Client) -> Scenario:
     return scenario_data.data[0]
 
 
-async def upload_new_model(file: BinaryIO, file_name: str, model_name: str, model_id: str, model_version: float, model_performance: ModelStatistics, scenario_id: str, db: Client) -> str:
+async def upload_new_model(file: BinaryIO, file_name: str, model_name: str, model_id: str, model_version: float, model_performance: ModelStatistics, scenario_id: str, db: Client, training_data_id: str = None) -> str:
     """Upload a new model to the storage and insert metadata into the database
+    The artifact is streamed from the file in chunks, its hash and size are computed on the way,
+    so large models are never held in memory.
     Args:
-        model (MLModel): Model metadata
-        file (BinaryIO): Model file
+        file (BinaryIO): Seekable model file, e.g. the spooled file of an UploadFile
+        file_name (str): Name of the model file
+        model_name (str): Model name
+        model_id (str): Model ID
+        model_version (float): Model version
+        model_performance (ModelStatistics): JSON encoded model performance metrics
+        scenario_id (str): Scenario the model belongs to
         db (Client): Supabase client
+        training_data_id (str): Training data the model was fitted on, defaults to model_id
     Returns:
-        bool: True if model uploaded successfully, False otherwise
+        str: Storage URL of the model, None if the upload failed
     """
-    model_file = file.read()
     file_path = f"{model_id}/{file_name}"
     current_time = datetime.now().isoformat()
     file_url = f"/storage/v1/object/public/{TableName.MODELS_BUCKET}/{file_path}"
@@ -88,15 +282,28 @@ async def upload_new_model(file: BinaryIO, file_name: str, model_name: str, mode
         performance = json.loads(model_performance)
         logger.info(f"Model performance data decoded successfully {performance}")
     except json.JSONDecodeError as e:
-        return {"error": f"Error decoding model performance data: {str(e)}"}
+        logger.error(f"Error decoding model performance data: {str(e)}")
+        return None
     
     logger.info(f"unpacked data type {type(performance)}, performance = {performance}")
     logger.info(f"dict keys = {performance.keys()}")
+
+    logger.info(f"Uploading model {model_id} to the storage")
+    try:
+        upload_summary = await upload_file_streaming(
+            file, str(TableName.MODELS_BUCKET), file_path, db, content_type="application/octet-stream"
+        )
+    except Exception as e:
+        logger.error(f"Error uploading model {model_id} to the storage: {str(e)}")
+        return None
+
     data = {
         "model_id": model_id,
         "model_url": file_url,
         "model_name": model_name,
         "model_filename": file_name,
+        "model_sha256": upload_summary.sha256,
+        "model_size_bytes": upload_summary.size_bytes,
         "accuracy": performance[PerformanceMetrics.ACCURACY],
         "model_precision": performance[PerformanceMetrics.PRECISION],
         "recall": performance[PerformanceMetrics.RECALL],
@@ -104,34 +311,169 @@ async def upload_new_model(file: BinaryIO, file_name: str, model_name: str, mode
         "created_at": current_time,
         "modified_at": current_time,
         "model_state": ModelStatus.INACTIVE,
-        "model_training_data_id": model_id,
+        "model_training_data_id": training_data_id or model_id,
         "model_version": model_version,
         "trained_at": current_time,
     }
 
-    logger.info(f"Uploading model {model_id} to the storage")
-    storage_response = db.storage.from_(TableName.MODELS_BUCKET).upload(file_path, model_file)
-    if not storage_response:
-        logger.error(f"Error uploading model {model_id} to the storage")
-        return False
-    
-    db_response = db.table(TableName.ML_MODELS).insert(data).execute()
+    db_response = await execute(db.table(TableName.ML_MODELS).insert(data))
     logger.info(f"supabase response = {db_response}")
     if not db_response:
         logger.error(
             f"Error inserting model {model_id} metadata into the database"
         )
-        return False 
-    db_response = db.table(TableName.SCENARIO_MODELS).insert({"scenario_id": scenario_id, "model_id": model_id, "is_active": False}).execute()
+        return None
+    db_response = await execute(db.table(TableName.SCENARIO_MODELS).insert({"scenario_id": scenario_id, "model_id": model_id, "is_active": False}))
+    invalidate_metadata(scenario_id)
     if not db_response:
         logger.error(
             f"Error inserting model {model_id} metadata into the scenario_models table"
         )
-        return False
+        return None
+
+    # Keep a local copy so activating the new model does not download it again
+    await asyncio.to_thread(get_artifact_cache().put_file, model_id, file, upload_summary.sha256)
 
     return file_url
 
 
+async def download_model_artifact(model_id: str, db: Client) -> bytes:
+    """Download the pickled model artifact of a model from the storage and cache it locally
+    Args:
+        model_id (str): Model ID
+        db (Client): Supabase client
+    Returns:
+        bytes: Model artifact, None if the model or its file does not exist
+    """
+    # The client calls run on the database executor so several models can download at once
+    model_data = await execute(
+        db.table(TableName.ML_MODELS)
+        .select("model_filename, model_sha256")
+        .eq("model_id", model_id)
+    )
+    if not model_data.data or len(model_data.data) == 0:
+        logger.error(f"Model {model_id} not found in the database")
+        return None
+    file_path = f"{model_id}/{model_data.data[0]['model_filename']}"
+    expected_sha256 = model_data.data[0].get("model_sha256")
+
+    logger.info(f"Downloading model {model_id} from the storage")
+    storage_response = await _download_object(TableName.MODELS_BUCKET, file_path, db)
+    if not storage_response:
+        logger.error(f"Error downloading model {model_id} from the storage")
+        return None
+
+    model_sha256 = sha256_hex(storage_response)
+    if expected_sha256 and model_sha256 != expected_sha256:
+        logger.error(f"Downloaded model {model_id} does not match its recorded sha256")
+        return None
+    await asyncio.to_thread(get_artifact_cache().put, model_id, storage_response, model_sha256)
+    return storage_response
+
+
+async def _download_object(bucket: str, file_path: str, db: Client) -> bytes:
+    """Download a storage object into memory, recording its duration and size
+    No overall deadline for the transfer, the client timeout still bounds stalled reads.
+    Args:
+        bucket (str): Storage bucket
+        file_path (str): Path of the object inside the bucket
+        db (Client): Supabase client
+    Returns:
+        bytes: Object content, None if the storage returned nothing
+    """
+    with STORAGE_DOWNLOAD_SECONDS.time(str(bucket)):
+        storage_response = await run_db(db.storage.from_(bucket).download, file_path, timeout=None)
+    if storage_response:
+        STORAGE_DOWNLOAD_BYTES.observe(len(storage_response), str(bucket))
+    return storage_response
+
+
+async def open_model_artifact(model_id: str, db: Client) -> BinaryIO:
+    """Open the pickled model artifact of a model from the local cache or the storage
+    Artifacts are immutable per model_id, so a verified cached copy is read from disk
+    without any network round trip.
+    Args:
+        model_id (str): Model ID
+        db (Client): Supabase client
+    Returns:
+        BinaryIO: Open artifact to be closed by the caller, None if the model or its file does not exist
+    """
+    cached_file = await asyncio.to_thread(get_artifact_cache().open, model_id)
+    if cached_file is not None:
+        logger.info(f"Model {model_id} served from the local artifact cache")
+        return cached_file
+
+    storage_response = await download_model_artifact(model_id, db)
+    if not storage_response:
+        return None
+    return BytesIO(storage_response)
+
+
+async def get_active_scenario_models(db: Client) -> list[dict]:
+    """Get the active (scenario_id, model_id) pairs of all scenarios
+    Args:
+        db (Client): Supabase client
+    Returns:
+        list[dict]: Rows with scenario_id and model_id, empty if no model is active
+    """
+    logger.info("Getting active models of all scenarios")
+    active_models = await execute(
+        db.table(TableName.SCENARIO_MODELS)
+        .select("scenario_id, model_id")
+        .eq("is_active", True)
+    )
+    return active_models.data or []
+
+
+async def get_active_model(scenario_id: str, db: Client) -> RegisteredModel:
+    """Get the active model of a scenario, loading it into the registry on demand
+    The active model_id is read through the metadata cache. Activations on other workers
+    of the host invalidate it through the activation stamps, activations on other replicas
+    are picked up after the metadata cache TTL. With METADATA_CACHE disabled it is read
+    from the database on every call. A model activated elsewhere is loaded and warmed up
+    before it serves its first request.
+    Args:
+        scenario_id (str): Scenario ID
+        db (Client): Supabase client
+    Returns:
+        RegisteredModel: Loaded active model, None if the scenario has no active model
+    """
+    model_id = await _cached(active_model_key(scenario_id), lambda: _load_active_model_id(scenario_id, db))
+    if model_id is None:
+        return None
+
+    loader = ModelLoader()
+    registry = ModelRegistry()
+    if registry.active_model_id(scenario_id) != model_id:
+        async with loader.activation_lock(scenario_id):
+            # A local activation holding the lock may have published the model meanwhile
+            if registry.active_model_id(scenario_id) != model_id:
+                logger.info(f"Switching scenario {scenario_id} to model {model_id} activated in the database")
+                entry = await loader.ensure_loaded(scenario_id, model_id, lambda: open_model_artifact(model_id, db))
+                if entry is None:
+                    return None
+                loader.publish(entry)
+                return entry
+
+    return await loader.ensure_loaded(
+        scenario_id, model_id, lambda: open_model_artifact(model_id, db)
+    )
+
+
+async def _load_active_model_id(scenario_id: str, db: Client) -> Optional[str]:
+    logger.info(f"Looking up active model for scenario_id:{scenario_id}")
+    active_models = await execute(
+        db.table(TableName.SCENARIO_MODELS)
+        .select("model_id")
+        .eq("scenario_id", scenario_id)
+        .eq("is_active", True)
+    )
+    if not active_models.data or len(active_models.data) == 0:
+        logger.info(f"No active model found for scenario_id:{scenario_id}")
+        return None
+    return active_models.data[0]["model_id"]
+
+
 async def update_active_model(scenario_id: str, model_id: str, db: Client) -> bool:
     """Set active model for a selected scenario
     Reutrn true if model set sucessfully
@@ -143,54 +485,377 @@ async def update_active_model(scenario_id: str, model_id: str, db: Client) -> bo
     Returns:
         bool: True if model set successfully, False otherwise
     """
-    file_name = db.table(TableName.ML_MODELS).select("model_filename").eq("model_id", model_id).execute().data[0]["model_filename"]
-    file_path = f"{model_id}/{file_name}"
-    
-    # Download the model from the storage
-    storage_response = db.storage.from_(TableName.MODELS_BUCKET).download(file_path)
-    if not storage_response:
-        logger.error(f"Error downloading model {model_id} from the storage")
-        return False
-    # Load the model into memory
-    model_binary = BytesIO(storage_response)
+    async with ModelLoader().activation_lock(scenario_id):
+        return await _activate_model(scenario_id, model_id, db)
+
+
+async def rollback_active_model(scenario_id: str, steps: int, db: Client) -> str:
+    """Roll a scenario back to a previously active model
+    The previous model is rehydrated from its artifact on local disk, or downloaded again
+    if the artifact was evicted from the cache.
+    Args:
+        scenario_id (str): Scenario ID
+        steps (int): Number of versions to go back
+        db (Client): Supabase client
+    Returns:
+        str: Model ID that is active after the rollback, None if the rollback failed
+    """
     loader = ModelLoader()
-    if not loader.load_model_from_binary(model_binary):
-        logger.error(f"Error loading model {model_id} from binary data")
+    async with loader.activation_lock(scenario_id):
+        model_id = loader.rollback_target(scenario_id, steps)
+        if model_id is None:
+            return None
+        # The versions rolled back over are dropped instead of being pushed to the history
+        if not await _activate_model(scenario_id, model_id, db, record_history=False):
+            return None
+        loader.drop_history(scenario_id, steps)
+        logger.info(f"Rolled back scenario {scenario_id} by {steps} versions to model {model_id}")
+        return model_id
+
+
+async def _activate_model(scenario_id: str, model_id: str, db: Client, record_history: bool = True) -> bool:
+    """Activate a model, recording the duration of the activation by its result"""
+    started = time.perf_counter()
+    activated = False
+    try:
+        activated = await _swap_active_model(scenario_id, model_id, db, record_history)
+        return activated
+    finally:
+        MODEL_ACTIVATION_SECONDS.observe(time.perf_counter() - started, "success" if activated else "failure")
+
+
+async def _swap_active_model(scenario_id: str, model_id: str, db: Client, record_history: bool) -> bool:
+    """Load a model off to the side, mark it active in the database and publish it
+    Must be called while holding the activation lock of the scenario.
+    The database is updated by the activate_scenario_model function in one transaction
+    and round trip, so a failure never leaves the scenario without an active model.
+    """
+    loader = ModelLoader()
+    # Open the model from the local cache or download it from the storage,
+    # while checking concurrently that the model belongs to the scenario
+    membership, model_artifact = await asyncio.gather(
+        execute(
+            db.table(TableName.SCENARIO_MODELS)
+            .select("model_id")
+            .eq("scenario_id", scenario_id)
+            .eq("model_id", model_id)
+        ),
+        open_model_artifact(model_id, db),
+        return_exceptions=True,
+    )
+    if isinstance(membership, BaseException) or isinstance(model_artifact, BaseException):
+        if model_artifact is not None and not isinstance(model_artifact, BaseException):
+            model_artifact.close()
+        raise membership if isinstance(membership, BaseException) else model_artifact
+    if model_artifact is None:
         return False
-    # Update database to set the active model
-    model_data = db.table(TableName.ML_MODELS).select("*").eq("model_id", model_id).execute()
-    if not model_data.data or len(model_data.data) == 0:
-        logger.error(f"Model {model_id} not found in the database")
+    if not membership.data or len(membership.data) == 0:
+        model_artifact.close()
+        logger.error(f"Model {model_id} does not belong to scenario {scenario_id}")
         return False
-    # If database update fails we could have loaded model that is different than the database !!!
-    # We should consider rolling back the model in memory if the database update fails
-    
+    # Load, validate and warm up the model off to the side while traffic keeps using the current one
+    with model_artifact:
+        candidate = await loader.prepare_model(model_artifact, scenario_id, model_id)
+    if candidate is None:
+        logger.error(f"Error loading model {model_id} from binary data")
+        return False
+
+    # The candidate is only published once the database update committed,
+    # so a failed update leaves the serving model untouched
     logger.info(f"Setting active model: {model_id} for Scenario: {scenario_id}")
-    logger.info(f"Setting all other models to inactive")
-    response = (
-        db.table(TableName.SCENARIO_MODELS)
-        .update({"is_active": False})
-        .eq("scenario_id", scenario_id)
-        .execute()
+    try:
+        response = await execute(
+            db.rpc(str(TableName.ACTIVATE_SCENARIO_MODEL), {"p_scenario_id": scenario_id, "p_model_id": model_id})
+        )
+    finally:
+        # Listings must reflect the activation, also if its outcome is unknown
+        invalidate_metadata(scenario_id)
+    if response.data is not True:
+        logger.error(f"Model {model_id} or scenario {scenario_id} not found in the database")
+        return False
+
+    # Swap in the new snapshot atomically, requests already in flight finish on the old version
+    loader.publish(candidate, record_history=record_history)
+    logger.info(f"Model {model_id} set to active successfully")
+    return True
+
+
+async def get_training_data(data_id: str, db: Client) -> dict:
+    """Get the metadata of an uploaded training data file
+    Args:
+        data_id (str): Training data ID
+        db (Client): Supabase client
+    Returns:
+        dict: training_data row, None if the training data does not exist
+    """
+    training_data = await execute(
+        db.table(TableName.TRAINING_DATA)
+        .select("*")
+        .eq("model_training_data_id", data_id)
     )
-    logger.info(f"response is {response}")
-    if "error" in response:
-        logger.error(f"Error setting all models to inactive: {response.error}")
-        loader.rollback_model()
+    if not training_data.data or len(training_data.data) == 0:
+        logger.info(f"Training data {data_id} not found in the database")
+        return None
+    return training_data.data[0]
+
+
+async def _download_to_file(bucket: str, file_path: str, destination: str, size_bytes: int, db: Client) -> str:
+    """Download a storage object to a local path
+    Objects larger than one chunk, or of unknown size, are streamed to disk so they
+    never have to fit in memory.
+    Args:
+        bucket (str): Storage bucket
+        file_path (str): Path of the object inside the bucket
+        destination (str): Local file path to write the object to
+        size_bytes (int): Size of the object if known
+        db (Client): Supabase client
+    Returns:
+        str: SHA-256 of the downloaded object, None if the download failed
+    """
+    if size_bytes is not None and size_bytes <= CHUNK_SIZE:
+        try:
+            storage_response = await _download_object(bucket, file_path, db)
+        except Exception as e:
+            logger.error(f"Error downloading {bucket}/{file_path} from the storage: {str(e)}")
+            return None
+        if storage_response is None:
+            logger.error(f"Error downloading {bucket}/{file_path} from the storage")
+            return None
+
+        def write_file():
+            with open(destination, 'wb') as data_file:
+                data_file.write(storage_response)
+
+        await asyncio.to_thread(write_file)
+        return sha256_hex(storage_response)
+
+    try:
+        with open(destination, 'wb') as data_file:
+            summary = await download_file_streaming(bucket, file_path, data_file)
+    except Exception as e:
+        logger.error(f"Error downloading {bucket}/{file_path} from the storage: {str(e)}")
+        return None
+    return summary.sha256
+
+
+async def download_training_data(training_data: dict, destination: str, db: Client) -> bool:
+    """Download a training data file from the storage to a local path
+    The recorded sha256 is verified when present.
+    Args:
+        training_data (dict): training_data row of the file
+        destination (str): Local file path to write the data to
+        db (Client): Supabase client
+    Returns:
+        bool: True if the file was downloaded
+    """
+    bucket_prefix = f"/storage/v1/object/public/{TableName.TRAINING_DATA_BUCKET}/"
+    file_path = training_data["model_training_data_url"].split(bucket_prefix, 1)[-1]
+    expected_sha256 = training_data.get("sha256")
+    logger.info(f"Downloading training data {file_path} from the storage")
+
+    downloaded_sha256 = await _download_to_file(
+        str(TableName.TRAINING_DATA_BUCKET), file_path, destination, training_data.get("size_bytes"), db
+    )
+    if downloaded_sha256 is None:
         return False
-    
-    logger.info(f"Setting model {model_id} to active")
-    response = (
-        db.table(TableName.SCENARIO_MODELS)
-        .update({"is_active": True})
-        .eq("scenario_id", scenario_id)
-        .eq("model_id", model_id)
-        .execute()
+    if expected_sha256 and downloaded_sha256 != expected_sha256:
+        logger.error(f"Downloaded training data {file_path} does not match its recorded sha256")
+        return False
+    return True
+
+
+async def upload_columnar_dataset(data_id: str, directory: str, db: Client) -> str:
+    """Upload a converted training dataset next to its CSV and record it in training_data
+    Args:
+        data_id (str): Training data ID
+        directory (str): Dataset directory with the column files and the manifest
+        db (Client): Supabase client
+    Returns:
+        str: Storage URL of the dataset directory, None if the upload failed
+    """
+    with open(os.path.join(directory, DATASET_MANIFEST_NAME)) as manifest_file:
+        manifest = json.load(manifest_file)
+    prefix = f"{data_id}/columnar"
+    # The manifest goes last, a dataset without one is never downloaded
+    file_names = [spec["file"] for spec in manifest["columns"].values()] + [DATASET_MANIFEST_NAME]
+
+    async def upload(file_name: str) -> None:
+        with open(os.path.join(directory, file_name), 'rb') as data_file:
+            await upload_file_streaming(
+                data_file, str(TableName.TRAINING_DATA_BUCKET), f"{prefix}/{file_name}", db,
+                content_type="application/octet-stream",
+            )
+
+    try:
+        await asyncio.gather(*(upload(file_name) for file_name in file_names[:-1]))
+        await upload(DATASET_MANIFEST_NAME)
+    except Exception as e:
+        logger.error(f"Error uploading columnar dataset of training data {data_id}: {str(e)}")
+        return None
+
+    columnar_url = f"/storage/v1/object/public/{TableName.TRAINING_DATA_BUCKET}/{prefix}"
+    await execute(
+        db.table(TableName.TRAINING_DATA)
+        .update({"columnar_url": columnar_url})
+        .eq("model_training_data_id", data_id)
     )
-    logger.info(f"response is {response}")
-    if "error" in response:
-        logger.error(f"Error setting model {model_id} to active: {response.error}")
+    logger.info(f"Uploaded columnar dataset of training data {data_id} with {manifest['rows']} rows")
+    return columnar_url
+
+
+async def download_columnar_dataset(training_data: dict, directory: str, db: Client) -> bool:
+    """Download the converted dataset of a training data file into a local directory
+    Every column is verified against the hash recorded in the manifest.
+    Args:
+        training_data (dict): training_data row with a columnar_url
+        directory (str): Existing empty directory to write the dataset to
+        db (Client): Supabase client
+    Returns:
+        bool: True if a complete dataset of the current CSV was downloaded
+    """
+    bucket_prefix = f"/storage/v1/object/public/{TableName.TRAINING_DATA_BUCKET}/"
+    prefix = training_data["columnar_url"].split(bucket_prefix, 1)[-1]
+    bucket = str(TableName.TRAINING_DATA_BUCKET)
+    manifest_path = os.path.join(directory, DATASET_MANIFEST_NAME)
+    if await _download_to_file(bucket, f"{prefix}/{DATASET_MANIFEST_NAME}", manifest_path, 0, db) is None:
+        return False
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format_version") != DATASET_FORMAT_VERSION or (
+            training_data.get("sha256") and manifest.get("source_sha256") != training_data["sha256"]):
+        logger.info(f"Columnar dataset of training data {training_data['model_training_data_id']} is stale")
         return False
-    logger.info(f"Model {model_id} set to active successfully")
 
+    specs = list(manifest["columns"].values())
+    downloaded = await asyncio.gather(*(
+        _download_to_file(
+            bucket, f"{prefix}/{spec['file']}", os.path.join(directory, spec["file"]), spec["size_bytes"], db
+        )
+        for spec in specs
+    ))
+    for spec, downloaded_sha256 in zip(specs, downloaded):
+        if downloaded_sha256 != spec["sha256"]:
+            logger.error(f"Column {spec['file']} of {prefix} is missing or corrupted")
+            return False
     return True
+
+
+async def mark_training_data_used(data_id: str, db: Client) -> None:
+    """Flag a training data file as used by a trained model
+    Args:
+        data_id (str): Training data ID
+        db (Client): Supabase client
+    """
+    await execute(
+        db.table(TableName.TRAINING_DATA)
+        .update({"used_status": True})
+        .eq("model_training_data_id", data_id)
+    )
+
+
+async def get_next_model_version(scenario_id: str, db: Client) -> float:
+    """Reserve the version number of the next model of a scenario
+    The version is taken from a counter of the scenario in a single database call,
+    so concurrent training jobs never get the same version.
+    Args:
+        scenario_id (str): Scenario ID
+        db (Client): Supabase client
+    Returns:
+        float: Next version of the scenario
+    Raises:
+        ValueError: If the scenario does not exist
+    """
+    response = await execute(
+        db.rpc(str(TableName.NEXT_MODEL_VERSION), {"p_scenario_id": scenario_id})
+    )
+    if response.data is None:
+        raise ValueError(f"Scenario {scenario_id} not found")
+    return float(response.data)
+
+
+async def save_training_job(job: dict, db: Client) -> None:
+    """Insert or update the row of a training job
+    Args:
+        job (dict): training_jobs row
+        db (Client): Supabase client
+    """
+    await execute(
+        db.table(TableName.TRAINING_JOBS)
+        .upsert(job, on_conflict="training_id")
+    )
+
+
+async def get_training_job(training_id: str, db: Client) -> dict:
+    """Get the row of a training job
+    Args:
+        training_id (str): Training job ID
+        db (Client): Supabase client
+    Returns:
+        dict: training_jobs row, None if the job does not exist
+    """
+    job = await execute(
+        db.table(TableName.TRAINING_JOBS)
+        .select("*")
+        .eq("training_id", training_id)
+    )
+    if not job.data or len(job.data) == 0:
+        return None
+    return job.data[0]
+
+
+async def claim_training_slot(training_id: str, max_concurrency: int, stale_seconds: int, db: Client) -> str:
+    """Move a pending training job to training if a training slot is free.
+    Args:
+        training_id (str): Training job ID
+        max_concurrency (int): Jobs allowed to train at a time over every worker
+        stale_seconds (int): Heartbeat age after which a training job is failed and frees its slot
+        db (Client): Supabase client
+    Returns:
+        str: claimed, busy, cancelled (a cancellation was requested) or missing (the job is not pending)
+    """
+    response = await execute(
+        db.rpc(str(TableName.CLAIM_TRAINING_SLOT), {
+            "p_training_id": training_id,
+            "p_max_concurrency": max_concurrency,
+            "p_stale_seconds": stale_seconds,
+        })
+    )
+    return response.data
+
+
+async def heartbeat_training_job(training_id: str, db: Client) -> Optional[dict]:
+    """Refresh the heartbeat of a training job, keeping its training slot
+    Args:
+        training_id (str): Training job ID
+        db (Client): Supabase client
+    Returns:
+        dict: training_jobs row including cancel_requested, None if the job is no longer training
+    """
+    job = await execute(
+        db.table(TableName.TRAINING_JOBS)
+        .update({"heartbeat_at": datetime.now(timezone.utc).isoformat()})
+        .eq("training_id", training_id)
+        .eq("status", ModelStatus.TRAINING.value)
+    )
+    if not job.data:
+        return None
+    return job.data[0]
+
+
+async def request_training_cancellation(training_id: str, db: Client) -> Optional[dict]:
+    """Flag a pending or training job for cancellation by the worker running it
+    Args:
+        training_id (str): Training job ID
+        db (Client): Supabase client
+    Returns:
+        dict: training_jobs row, None if the job does not exist or already finished
+    """
+    job = await execute(
+        db.table(TableName.TRAINING_JOBS)
+        .update({"cancel_requested": True})
+        .eq("training_id", training_id)
+        .in_("status", [ModelStatus.PENDING.value, ModelStatus.TRAINING.value])
+    )
+    if not job.data:
+        return None
+    return job.data[0]
@@ -42,6 +42,9 @@ class SupabaseConfig:
         # Optional retry configuration
         self.max_retries = int(os.environ.get("SUPABASE_MAX_RETRIES", "3"))
 
+        # Number of client calls that can be in flight at once, see database.db_executor
+        self.pool_size = int(os.environ.get("SUPABASE_POOL_SIZE", "10"))
+
 
 @lru_cache()
 def get_supabase_config() -> SupabaseConfig:
@@ -61,8 +64,11 @@ class SupabaseClientManager:
             config = get_supabase_config()
             logger.info(f"Initializing Supabase client with URL: {config.url}")
             try:
-                
-                cls._instance = create_client(config.url,config.key)
+                options = ClientOptions(
+                    postgrest_client_timeout=config.timeout,
+                    storage_client_timeout=config.timeout,
+                )
+                cls._instance = create_client(config.url, config.key, options=options)
                 logger.info("Supabase client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {str(e)}")
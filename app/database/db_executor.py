@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from database.database import get_supabase_config
+from utility.metrics import DB_CALL_SECONDS
+
+logger = logging.getLogger("db_executor")
+
+# Sentinel for "use the configured timeout", None disables the timeout
+DEFAULT_TIMEOUT = object()
+
+# Operations of the PostgREST request builders by HTTP method
+HTTP_OPERATIONS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+class DatabaseTimeoutError(TimeoutError):
+    """Raised when a database call does not finish within its timeout."""
+
+
+class DatabaseExecutor:
+    """Runs the blocking calls of the synchronous Supabase client off the event loop.
+
+    Calls run on a dedicated pool of max_workers threads, which also bounds the
+    number of requests in flight to Supabase, so database traffic can neither block
+    the event loop nor starve the default executor used for file I/O. Every call is
+    bounded by timeout_seconds, independent calls can be awaited together with gather.
+    """
+
+    def __init__(self, max_workers: int = 10, timeout_seconds: Optional[float] = 10.0):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Statistics
+        self._in_flight = 0
+        self._calls = 0
+        self._timeouts = 0
+        self._errors = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="supabase")
+        return self._executor
+
+    async def run(self, function: Callable, *args, timeout: Any = DEFAULT_TIMEOUT, **kwargs) -> Any:
+        """Runs a blocking client call on the database pool.
+
+        Args:
+            function: Blocking callable, e.g. the execute method of a query or a storage method
+            timeout: Time budget in seconds including the wait for a free thread,
+                defaults to the configured timeout, None waits indefinitely
+
+        Raises:
+            DatabaseTimeoutError: If the call did not finish in time
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout_seconds
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), partial(function, *args, **kwargs))
+        self._calls += 1
+        self._in_flight += 1
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise DatabaseTimeoutError(f"Database call did not finish within {timeout} seconds")
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+    async def execute(self, query: Any, timeout: Any = DEFAULT_TIMEOUT) -> Any:
+        """Executes a query builder of the client, e.g. db.table(...).select(...)."""
+        with DB_CALL_SECONDS.time(*describe_query(query)):
+            return await self.run(query.execute, timeout=timeout)
+
+    async def gather(self, *queries: Any) -> list:
+        """Executes independent queries concurrently and returns their responses in order."""
+        return list(await asyncio.gather(*(self.execute(query) for query in queries)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self._in_flight,
+            "calls": self._calls,
+            "timeouts": self._timeouts,
+            "errors": self._errors,
+        }
+
+    def shutdown(self) -> None:
+        """Shuts down the thread pool, calls still running are not interrupted."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def describe_query(query: Any) -> Tuple[str, str]:
+    """Returns the (table, operation) of a query builder, (function, "rpc") for database functions."""
+    path = str(getattr(query, "path", "")).strip("/")
+    if path.startswith("rpc/"):
+        return path[len("rpc/"):], "rpc"
+    operation = HTTP_OPERATIONS.get(str(getattr(query, "http_method", "")).upper(), "unknown")
+    if operation == "insert" and "merge-duplicates" in str(getattr(query, "headers", {}).get("Prefer", "")):
+        operation = "upsert"
+    return path or "unknown", operation
+
+
+@lru_cache()
+def get_db_executor() -> DatabaseExecutor:
+    """Returns the process-wide database executor configured from the environment."""
+    config = get_supabase_config()
+    return DatabaseExecutor(
+        max_workers=config.pool_size,
+        timeout_seconds=config.timeout if config.timeout > 0 else None,
+    )
+
+
+async def execute(query: Any, timeout: Any = DEFAULT_TIMEOUT) -> Any:
+    """Executes a query builder of the client on the database executor."""
+    return await get_db_executor().execute(query, timeout=timeout)
+
+
+async def run_db(function: Callable, *args, timeout: Any = DEFAULT_TIMEOUT, **kwargs) -> Any:
+    """Runs a blocking client call, e.g. a storage method, on the database executor."""
+    return await get_db_executor().run(function, *args, timeout=timeout, **kwargs)
@@ -0,0 +1,239 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("metadata_cache")
+
+# ("scenarios", *query), ("scenario", scenario_id), ("models", scenario_id, *query)
+# or ("active_model", scenario_id)
+CacheKey = Tuple[Any, ...]
+
+
+def scenarios_key(*query: Any) -> CacheKey:
+    return ("scenarios",) + query
+
+
+def scenario_key(scenario_id: str) -> CacheKey:
+    return ("scenario", scenario_id)
+
+
+def models_key(scenario_id: str, *query: Any) -> CacheKey:
+    return ("models", scenario_id) + query
+
+
+def active_model_key(scenario_id: str) -> CacheKey:
+    return ("active_model", scenario_id)
+
+
+def _belongs_to(key: CacheKey, scenario_id: Optional[str]) -> bool:
+    """True if the entry may change when the models of scenario_id change."""
+    return scenario_id is None or key[0] == "scenarios" or key[1] == scenario_id
+
+
+class MetadataCache:
+    """Read-through TTL cache of scenario and model metadata.
+
+    Listings are loaded from the database on the first lookup and served from memory
+    until they expire after ttl_seconds or are invalidated because a model of the
+    scenario was uploaded or activated. Every page and filter of a listing is an
+    entry of its own, the least recently used entries above max_entries are
+    evicted. Concurrent lookups of the same key share a single query. A load that
+    was started before an invalidation is returned to its callers but not cached,
+    so an invalidation can never be undone by a slow query. Workers on the same host
+    learn about changes through ActivationStamps, the TTL bounds how stale the
+    metadata can get when replicas on other hosts change it.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = 60.0, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+        self._generation = 0
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._expirations = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def etag(value: Any) -> str:
+        """Strong ETag of a metadata value, independent of the key order of its rows."""
+        canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+        return '"' + hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest() + '"'
+
+    def lookup(self, key: CacheKey) -> Tuple[bool, Any]:
+        """Returns (found, value) of a cached entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[1]
+
+    async def get_or_load(self, key: CacheKey, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value of key or loads it once for all concurrent callers.
+
+        Args:
+            key: Cache key
+            load: Coroutine function querying the database on a miss
+
+        Returns:
+            Copy of the value, callers are free to modify it
+        """
+        found, value = self.lookup(key)
+        if not found:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                in_flight = asyncio.ensure_future(self._load(key, load, self._generation))
+                self._in_flight[key] = in_flight
+                in_flight.add_done_callback(lambda done: self._load_done(key, done))
+            else:
+                self._coalesced += 1
+            # A cancelled caller must not cancel the query other callers are waiting for
+            value = await asyncio.shield(in_flight)
+        return copy.deepcopy(value)
+
+    def _load_done(self, key: CacheKey, done: asyncio.Future) -> None:
+        # An invalidation may already have replaced the load of this key
+        if self._in_flight.get(key) is done:
+            del self._in_flight[key]
+
+    async def _load(self, key: CacheKey, load: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        value = await load()
+        # Failures are not cached, the next request retries
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else float('inf')
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def invalidate(self, scenario_id: Optional[str] = None) -> None:
+        """Drops the cached metadata of a scenario and the scenario list, or everything.
+
+        Loads in flight are not cached when they finish, the next lookup queries again.
+        """
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries if _belongs_to(key, scenario_id)]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+        # Later lookups must not join a load that may have read the old metadata
+        for key in [key for key in self._in_flight if _belongs_to(key, scenario_id)]:
+            del self._in_flight[key]
+        logger.info(f"Invalidated cached metadata of {scenario_id or 'all scenarios'}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "in_flight": len(self._in_flight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "coalesced": self._coalesced,
+                "expirations": self._expirations,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+class ActivationStamps:
+    """Per-scenario change stamps shared by the worker processes of a host.
+
+    A worker that activated a model or uploaded one replaces the stamp file of the
+    scenario. Before serving cached metadata of a scenario, workers compare its stamp
+    with the one they saw last, which costs a single stat call, and drop their cached
+    metadata of the scenario once it changed. A scenario a worker has not checked
+    before counts as changed, its metadata may predate the current stamp.
+    """
+
+    SUFFIX = ".stamp"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._seen: Dict[str, Optional[Tuple[int, int]]] = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, scenario_id: str) -> str:
+        return os.path.join(self.directory, f"{scenario_id}{self.SUFFIX}")
+
+    def _read(self, scenario_id: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._path(scenario_id))
+        except OSError:
+            return None
+        # Every bump replaces the file, so the inode changes even within the mtime resolution
+        return stat.st_ino, stat.st_mtime_ns
+
+    def bump(self, scenario_id: str) -> None:
+        """Marks the metadata of a scenario as changed for every worker of the host."""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            os.close(fd)
+            os.replace(tmp_path, self._path(scenario_id))
+        except OSError as e:
+            logger.error(f"Failed to stamp the change of scenario {scenario_id}: {e}")
+            return
+        self._seen[scenario_id] = self._read(scenario_id)
+
+    def changed(self, scenario_id: str) -> bool:
+        """Returns True if the scenario changed since the last call, or was never checked."""
+        stamp = self._read(scenario_id)
+        if scenario_id in self._seen and self._seen[scenario_id] == stamp:
+            return False
+        self._seen[scenario_id] = stamp
+        return True
+
+
+def metadata_cache_enabled() -> bool:
+    """Returns True if scenario and model metadata should be served from the metadata cache."""
+    return os.environ.get("METADATA_CACHE", "true").lower() in ("1", "true", "yes")
+
+
+@lru_cache()
+def get_metadata_cache() -> MetadataCache:
+    """Returns the process-wide metadata cache configured from the environment."""
+    ttl = float(os.environ.get("METADATA_CACHE_TTL_SECONDS", "60"))
+    return MetadataCache(
+        ttl_seconds=ttl if ttl > 0 else None,
+        max_entries=int(os.environ.get("METADATA_CACHE_MAX_ENTRIES", "1000")),
+    )
+
+
+@lru_cache()
+def get_activation_stamps() -> ActivationStamps:
+    """Returns the activation stamps of the host configured from the environment."""
+    return ActivationStamps(
+        directory=os.environ.get(
+            "METADATA_STAMP_DIR", os.path.join(tempfile.gettempdir(), "ml_pipeline_metadata_stamps")
+        ),
+    )
@@ -0,0 +1,140 @@
+-- Brings a database created from an earlier create_tables.sql up to the current schema.
+-- Every statement is idempotent, the script can be run again on an up-to-date database.
+
+-- Categories accepted by the prediction requests.
+-- ADD VALUE cannot run inside a transaction block before PostgreSQL 12.
+ALTER TYPE employment_type ADD VALUE IF NOT EXISTS 'self_employed';
+ALTER TYPE employment_type ADD VALUE IF NOT EXISTS 'retired';
+ALTER TYPE marital_status ADD VALUE IF NOT EXISTS 'widowed';
+ALTER TYPE marital_status ADD VALUE IF NOT EXISTS 'separated';
+
+-- Artifact checksums and sizes of uploaded models
+ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS model_sha256 TEXT;
+ALTER TABLE ml_models ADD COLUMN IF NOT EXISTS model_size_bytes BIGINT;
+
+-- Training data metadata recorded by the streaming upload and the columnar conversion
+ALTER TABLE training_data ADD COLUMN IF NOT EXISTS model_training_data_name TEXT;
+ALTER TABLE training_data ADD COLUMN IF NOT EXISTS sha256 TEXT;
+ALTER TABLE training_data ADD COLUMN IF NOT EXISTS size_bytes BIGINT;
+ALTER TABLE training_data ADD COLUMN IF NOT EXISTS row_count BIGINT;
+ALTER TABLE training_data ADD COLUMN IF NOT EXISTS columnar_URL TEXT;
+
+-- Scenario and model of every logged prediction
+ALTER TABLE prediction_responses ADD COLUMN IF NOT EXISTS scenario_ID UUID REFERENCES scenarios(scenario_ID);
+ALTER TABLE prediction_responses ADD COLUMN IF NOT EXISTS model_ID UUID REFERENCES ml_models(model_ID);
+
+-- Model version counter of every scenario, starting after the models it already has
+ALTER TABLE scenarios ADD COLUMN IF NOT EXISTS last_model_version INT NOT NULL DEFAULT 0;
+UPDATE scenarios s
+    SET last_model_version = (SELECT count(*) FROM scenario_models sm WHERE sm.scenario_ID = s.scenario_ID)
+    WHERE last_model_version = 0;
+
+-- Create training job table, status follows model_status
+CREATE TABLE IF NOT EXISTS training_jobs(
+    training_ID UUID PRIMARY KEY,
+    scenario_ID UUID REFERENCES scenarios(scenario_ID),
+    data_ID UUID REFERENCES training_data(model_training_data_ID),
+    tuned BOOLEAN DEFAULT FALSE,
+    model_ID UUID REFERENCES ml_models(model_ID),
+    status model_status NOT NULL,
+    metrics JSONB,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+ALTER TABLE training_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE training_jobs ADD COLUMN IF NOT EXISTS cancel_requested BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Models of a scenario with their metadata, listed newest first with keyset pagination
+CREATE OR REPLACE VIEW scenario_model_listing AS
+SELECT sm.scenario_ID, sm.model_ID, sm.is_active, sm.activated_on,
+       m.model_name, m.model_version, m.model_state,
+       m.accuracy, m.model_precision, m.recall, m.f1_score, m.model_size_bytes,
+       m.created_at, m.trained_at
+FROM scenario_models sm
+JOIN ml_models m ON m.model_ID = sm.model_ID;
+
+CREATE INDEX IF NOT EXISTS ml_models_created_at_idx ON ml_models (created_at DESC, model_ID DESC);
+
+-- Activate a model of a scenario in a single transaction: flips the active flags,
+-- stamps activated_on and points the scenario at the model.
+-- Returns FALSE without changing anything if the model does not belong to the scenario.
+CREATE OR REPLACE FUNCTION activate_scenario_model(p_scenario_id UUID, p_model_id UUID)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Serialize concurrent activations of the same scenario
+    PERFORM 1 FROM scenarios WHERE scenario_ID = p_scenario_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+    PERFORM 1 FROM scenario_models sm JOIN ml_models m ON m.model_ID = sm.model_ID
+        WHERE sm.scenario_ID = p_scenario_id AND sm.model_ID = p_model_id;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    UPDATE scenario_models
+        SET is_active = (model_ID = p_model_id),
+            activated_on = CASE WHEN model_ID = p_model_id THEN now() ELSE activated_on END
+        WHERE scenario_ID = p_scenario_id AND (is_active OR model_ID = p_model_id);
+    UPDATE scenarios SET current_model_ID = p_model_id WHERE scenario_ID = p_scenario_id;
+    RETURN TRUE;
+END;
+$$;
+
+-- Move a pending training job to training if fewer than p_max_concurrency jobs train,
+-- counted over every worker and replica. Running jobs without a heartbeat for
+-- p_stale_seconds lost their worker and are failed, which frees their slot.
+-- Returns 'claimed', 'busy', 'cancelled' or 'missing' (unknown or no longer pending).
+CREATE OR REPLACE FUNCTION claim_training_slot(p_training_id UUID, p_max_concurrency INT, p_stale_seconds INT)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_cancel_requested BOOLEAN;
+BEGIN
+    -- Serialize claims so two workers cannot take the last slot
+    PERFORM pg_advisory_xact_lock(hashtext('claim_training_slot'));
+
+    SELECT cancel_requested INTO v_cancel_requested
+        FROM training_jobs WHERE training_ID = p_training_id AND status = 'pending';
+    IF NOT FOUND THEN
+        RETURN 'missing';
+    END IF;
+    IF v_cancel_requested THEN
+        RETURN 'cancelled';
+    END IF;
+
+    UPDATE training_jobs
+        SET status = 'failed', error = 'Training worker stopped responding', finished_at = now()
+        WHERE status = 'training' AND heartbeat_at < now() - make_interval(secs => p_stale_seconds);
+    IF (SELECT count(*) FROM training_jobs WHERE status = 'training') >= p_max_concurrency THEN
+        RETURN 'busy';
+    END IF;
+
+    UPDATE training_jobs
+        SET status = 'training', started_at = now(), heartbeat_at = now()
+        WHERE training_ID = p_training_id;
+    RETURN 'claimed';
+END;
+$$;
+
+-- Reserve the next model version of a scenario. Versions come from a per-scenario
+-- counter, the row lock of the update keeps concurrent training jobs from getting the same one.
+-- Returns NULL if the scenario does not exist.
+CREATE OR REPLACE FUNCTION next_model_version(p_scenario_id UUID)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_version INT;
+BEGIN
+    UPDATE scenarios SET last_model_version = last_model_version + 1
+        WHERE scenario_ID = p_scenario_id
+        RETURNING last_model_version INTO v_version;
+    RETURN v_version;
+END;
+$$;
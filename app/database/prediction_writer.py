@@ -0,0 +1,303 @@
+import os
+import glob
+import json
+import uuid
+import asyncio
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from supabase import Client
+
+from database.table_names import TableName
+from database.db_executor import execute
+
+logger = logging.getLogger("prediction_writer")
+
+
+def _process_spill_path(path: str, pid: int) -> str:
+    """Spill file of one worker process, e.g. spill.jsonl -> spill.1234.jsonl."""
+    root, extension = os.path.splitext(path)
+    return f"{root}.{pid}{extension}"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g. PermissionError, the PID belongs to a process of another user
+        return True
+    return True
+
+
+class PredictionWriter:
+    """Persists prediction records to prediction_responses in the background.
+
+    Predictions are put on a bounded in-memory queue without waiting and a worker
+    writes them with one bulk insert per flush_size records, or after flush_interval
+    seconds, whichever comes first. Records that cannot be written (database
+    unavailable, or the queue is full) are appended to a local JSON lines spill file,
+    which is replayed once inserts succeed again. The queue is drained on shutdown.
+
+    Every worker process spills to its own file, named after its PID, and adopts the
+    spill files of processes that are no longer running when it replays. File writes
+    run in a thread, overflow records are handed to a background task so the request
+    handler never touches the disk.
+    """
+
+    def __init__(self, flush_size: int = 500, flush_interval: float = 1.0, max_queue_size: int = 10000,
+                 spill_path: Optional[str] = None, max_spill_bytes: int = 1024 ** 3):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.spill_base_path = spill_path or os.path.join(tempfile.gettempdir(), "ml_pipeline_prediction_spill.jsonl")
+        self.spill_path = _process_spill_path(self.spill_base_path, os.getpid())
+        self.max_spill_bytes = max_spill_bytes
+
+        self._db: Optional[Client] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._spill_lock = threading.Lock()
+        # Records that did not fit in the queue, waiting to be spilled by _spill_overflow
+        self._overflow: List[Dict[str, Any]] = []
+        self._overflow_task: Optional[asyncio.Task] = None
+
+        # Statistics
+        self._written = 0
+        self._batches = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._dropped = 0
+        self._failed_flushes = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self, db: Client) -> None:
+        """Starts the background worker on the running event loop."""
+        if self.running:
+            return
+        self._db = db
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Prediction writer started, flushing every {self.flush_size} records or {self.flush_interval}s")
+
+    def submit(self, scenario_id: str, model_id: str, prediction: int, confidence: float) -> None:
+        """Queues a prediction record without blocking the caller.
+
+        Records submitted while the writer is not running are dropped.
+        """
+        if not self.running:
+            return
+        record = {
+            "prediction_id": str(uuid.uuid4()),
+            "result": bool(prediction),
+            "confidence": float(confidence),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "scenario_id": scenario_id,
+            "model_id": model_id,
+        }
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            # Backpressure: the hot path never waits for the database or the disk
+            if len(self._overflow) >= self.max_queue_size:
+                self._dropped += 1
+                return
+            self._overflow.append(record)
+            if self._overflow_task is None or self._overflow_task.done():
+                self._overflow_task = asyncio.get_running_loop().create_task(self._spill_overflow())
+
+    async def _spill_overflow(self) -> None:
+        """Spills the records that did not fit in the queue, off the event loop."""
+        while self._overflow:
+            records, self._overflow = self._overflow, []
+            await asyncio.to_thread(self._spill, records)
+
+    async def _run(self) -> None:
+        """Collects records into batches and flushes them by size or time until stopped."""
+        loop = asyncio.get_running_loop()
+        await self._replay()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> bool:
+        """Writes a batch with a single insert, spilling it to disk on failure."""
+        try:
+            await execute(self._db.table(TableName.PREDICTION_RESPONSES).insert(batch))
+        except Exception as e:
+            self._failed_flushes += 1
+            self._last_error = str(e)
+            logger.error(f"Failed to write {len(batch)} predictions, spilling them to disk: {str(e)}")
+            await asyncio.to_thread(self._spill, batch)
+            return False
+        self._written += len(batch)
+        self._batches += 1
+        if self._last_error is not None or self._has_spill():
+            # The database is reachable again
+            self._last_error = None
+            await self._replay()
+        return True
+
+    def _has_spill(self) -> bool:
+        try:
+            return os.path.getsize(self.spill_path) > 0
+        except OSError:
+            return False
+
+    def _spill(self, records: List[Dict[str, Any]]) -> None:
+        """Appends records to the spill file, dropping them once it exceeds max_spill_bytes."""
+        with self._spill_lock:
+            try:
+                if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) >= self.max_spill_bytes:
+                    self._dropped += len(records)
+                    logger.error(f"Prediction spill file is full, dropped {len(records)} predictions")
+                    return
+                with open(self.spill_path, 'a') as spill_file:
+                    spill_file.writelines(json.dumps(record) + "\n" for record in records)
+                self._spilled += len(records)
+            except OSError as e:
+                self._dropped += len(records)
+                logger.error(f"Failed to spill {len(records)} predictions: {str(e)}")
+
+    def _orphaned_spills(self) -> List[str]:
+        """Spill files of worker processes that are no longer running."""
+        root, extension = os.path.splitext(self.spill_base_path)
+        orphans = []
+        for path in glob.glob(f"{glob.escape(root)}.*{glob.escape(extension)}"):
+            pid = path[len(root) + 1:len(path) - len(extension)]
+            if pid.isdigit() and int(pid) != os.getpid() and not _process_alive(int(pid)):
+                orphans.append(path)
+        return orphans
+
+    def _claim_spills(self) -> List[str]:
+        """Moves the own and the orphaned spill files aside for replay, new spills go to a fresh file."""
+        with self._spill_lock:
+            sources = ([self.spill_path] if self._has_spill() else []) + self._orphaned_spills()
+            claimed = []
+            for source in sources:
+                replay_path = f"{self.spill_path}.{uuid.uuid4().hex}.replay"
+                try:
+                    os.replace(source, replay_path)
+                except FileNotFoundError:
+                    # Another worker adopted the orphan first
+                    continue
+                claimed.append(replay_path)
+            return claimed
+
+    async def _replay(self) -> None:
+        """Writes spilled records back to the database, keeping whatever still fails."""
+        replay_paths = await asyncio.to_thread(self._claim_spills)
+        if not replay_paths:
+            return
+
+        def read_records() -> List[Dict[str, Any]]:
+            records = []
+            for replay_path in replay_paths:
+                with open(replay_path) as replay_file:
+                    records.extend(json.loads(line) for line in replay_file if line.strip())
+            return records
+
+        records = await asyncio.to_thread(read_records)
+        logger.info(f"Replaying {len(records)} spilled predictions")
+        for start in range(0, len(records), self.flush_size):
+            chunk = records[start:start + self.flush_size]
+            try:
+                # Upsert, a chunk may have been written before the connection failed
+                await execute(
+                    self._db.table(TableName.PREDICTION_RESPONSES)
+                    .upsert(chunk, on_conflict="prediction_id")
+                )
+            except Exception as e:
+                self._last_error = str(e)
+                logger.error(f"Replay of spilled predictions failed: {str(e)}")
+                await asyncio.to_thread(self._spill, records[start:])
+                break
+            self._replayed += len(chunk)
+        for replay_path in replay_paths:
+            os.remove(replay_path)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flushes every queued record and stops the worker.
+
+        Records still queued after timeout seconds are spilled to disk.
+        """
+        if not self.running:
+            return
+        worker, self._worker = self._worker, None
+        try:
+            # The sentinel is queued behind every pending record
+            await asyncio.wait_for(self._queue.put(None), timeout)
+            await asyncio.wait_for(asyncio.shield(worker), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Timed out flushing predictions on shutdown, spilling the rest to disk")
+            worker.cancel()
+            pending = []
+            while not self._queue.empty():
+                record = self._queue.get_nowait()
+                if record is not None:
+                    pending.append(record)
+            await asyncio.to_thread(self._spill, pending)
+        if self._overflow_task is not None:
+            await self._overflow_task
+        logger.info(f"Prediction writer stopped, {self._written} predictions written")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth and write counters."""
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "flush_size": self.flush_size,
+            "flush_interval_seconds": self.flush_interval,
+            "written": self._written,
+            "batches": self._batches,
+            "spilled": self._spilled,
+            "replayed": self._replayed,
+            "dropped": self._dropped,
+            "failed_flushes": self._failed_flushes,
+            "pending_spill": self._has_spill(),
+            "last_error": self._last_error,
+        }
+
+
+def prediction_logging_enabled() -> bool:
+    """Returns True if predictions should be persisted to prediction_responses."""
+    return os.environ.get("PREDICTION_LOGGING", "true").lower() in ("1", "true", "yes")
+
+
+@lru_cache()
+def get_prediction_writer() -> PredictionWriter:
+    """Returns the process-wide prediction writer configured from the environment."""
+    return PredictionWriter(
+        flush_size=int(os.environ.get("PREDICTION_FLUSH_SIZE", "500")),
+        flush_interval=float(os.environ.get("PREDICTION_FLUSH_INTERVAL_MS", "1000")) / 1000,
+        max_queue_size=int(os.environ.get("PREDICTION_QUEUE_SIZE", "10000")),
+        spill_path=os.environ.get("PREDICTION_SPILL_PATH"),
+        max_spill_bytes=int(os.environ.get("PREDICTION_SPILL_MAX_BYTES", str(1024 ** 3))),
+    )
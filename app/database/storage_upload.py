@@ -0,0 +1,241 @@
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional
+
+import httpx
+from supabase import Client
+
+from database.database import get_supabase_config
+from database.db_executor import run_db
+from utility.metrics import STORAGE_DOWNLOAD_BYTES, STORAGE_DOWNLOAD_SECONDS
+
+logger = logging.getLogger("storage_upload")
+
+# Supabase Storage expects every resumable upload chunk except the last to be exactly 6 MiB
+CHUNK_SIZE = 6 * 1024 * 1024
+TUS_VERSION = "1.0.0"
+
+
+@dataclass
+class UploadSummary:
+    """Facts about an uploaded file computed while streaming it."""
+    size_bytes: int
+    sha256: str
+    row_count: int
+
+
+class StreamingDigest:
+    """SHA-256 and CSV row count of a stream, updated chunk by chunk.
+
+    Rows are counted as newline terminated lines (plus a final unterminated line)
+    minus the header line. Bytes that are read again after a resumed upload are
+    only accounted for once.
+    """
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self._position = 0
+        self._lines = 0
+        self._last_byte = b""
+
+    def update(self, offset: int, chunk: bytes) -> None:
+        """Accounts for chunk, which starts at offset in the stream."""
+        skip = max(self._position - offset, 0)
+        if skip >= len(chunk):
+            return
+        new_bytes = chunk[skip:] if skip else chunk
+        self._sha256.update(new_bytes)
+        self._lines += new_bytes.count(b"\n")
+        self._last_byte = chunk[-1:]
+        self._position = offset + len(chunk)
+
+    def summary(self) -> UploadSummary:
+        lines = self._lines + (1 if self._position and self._last_byte != b"\n" else 0)
+        return UploadSummary(
+            size_bytes=self._position, sha256=self._sha256.hexdigest(), row_count=max(lines - 1, 0)
+        )
+
+
+class ResumableUploader:
+    """Client of the Supabase Storage resumable (TUS) upload endpoint.
+
+    Every chunk of chunk_size bytes is sent as one PATCH request whose body is
+    streamed from the file in read_size pieces, so memory does not depend on the
+    file size. A failed chunk is resumed from the offset the server acknowledged,
+    up to max_retries times in a row.
+    """
+
+    def __init__(self, base_url: str, api_key: str, chunk_size: int = CHUNK_SIZE, read_size: int = 1024 * 1024,
+                 max_retries: int = 3, timeout: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.endpoint = f"{base_url.rstrip('/')}/storage/v1/upload/resumable"
+        self.chunk_size = chunk_size
+        self.read_size = min(read_size, chunk_size)
+        self.max_retries = max_retries
+        self._client_options: Dict[str, Any] = {
+            "headers": {
+                "Authorization": f"Bearer {api_key}",
+                "apikey": api_key,
+                "Tus-Resumable": TUS_VERSION,
+            },
+            "timeout": timeout,
+            "transport": transport,
+        }
+
+    @staticmethod
+    def _metadata(bucket: str, object_name: str, content_type: str) -> str:
+        fields = {"bucketName": bucket, "objectName": object_name, "contentType": content_type}
+        return ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in fields.items())
+
+    async def _chunk_body(self, source: BinaryIO, offset: int, length: int,
+                          digest: StreamingDigest) -> AsyncIterator[bytes]:
+        """Streams length bytes of source starting at offset, updating the digest on the way."""
+        await asyncio.to_thread(source.seek, offset)
+        buffer = bytearray(self.read_size)
+        position = offset
+        while position < offset + length:
+            view = memoryview(buffer)[:min(self.read_size, offset + length - position)]
+            read = await asyncio.to_thread(source.readinto, view)
+            if not read:
+                raise IOError(f"Upload source ended at {position} bytes")
+            piece = bytes(view[:read])
+            digest.update(position, piece)
+            position += read
+            yield piece
+
+    async def upload(self, source: BinaryIO, bucket: str, object_name: str, size: int,
+                     content_type: str = "text/csv", upsert: bool = False) -> UploadSummary:
+        """Streams a file to storage.
+
+        Args:
+            source: Seekable binary file
+            bucket: Storage bucket
+            object_name: Path of the object inside the bucket
+            size: Total size of the file in bytes
+            content_type: Content type stored with the object
+            upsert: Overwrite an existing object
+
+        Returns:
+            Size, SHA-256 and row count of the uploaded file
+
+        Raises:
+            httpx.HTTPError: If a chunk still fails after max_retries retries
+        """
+        digest = StreamingDigest()
+        async with httpx.AsyncClient(**self._client_options) as client:
+            response = await client.post(self.endpoint, headers={
+                "Upload-Length": str(size),
+                "Upload-Metadata": self._metadata(bucket, object_name, content_type),
+                "x-upsert": "true" if upsert else "false",
+            })
+            response.raise_for_status()
+            upload_url = httpx.URL(self.endpoint).join(response.headers["Location"])
+
+            offset = 0
+            retries = 0
+            while offset < size:
+                length = min(self.chunk_size, size - offset)
+                try:
+                    response = await client.patch(
+                        upload_url,
+                        content=self._chunk_body(source, offset, length, digest),
+                        headers={
+                            "Upload-Offset": str(offset),
+                            "Content-Length": str(length),
+                            "Content-Type": "application/offset+octet-stream",
+                        },
+                    )
+                    response.raise_for_status()
+                    offset = int(response.headers["Upload-Offset"])
+                    retries = 0
+                except httpx.HTTPError as e:
+                    retries += 1
+                    if retries > self.max_retries:
+                        raise
+                    logger.warning(f"Chunk at offset {offset} of {object_name} failed ({e}), resuming")
+                    await asyncio.sleep(min(2 ** retries * 0.1, 5))
+                    # Continue from the offset the server acknowledged
+                    response = await client.head(upload_url)
+                    response.raise_for_status()
+                    offset = int(response.headers["Upload-Offset"])
+        logger.info(f"Uploaded {size} bytes to {bucket}/{object_name} in {self.chunk_size} byte chunks")
+        return digest.summary()
+
+
+async def upload_file_streaming(source: BinaryIO, bucket: str, object_name: str, db: Client,
+                                content_type: str = "text/csv",
+                                uploader: Optional[ResumableUploader] = None) -> UploadSummary:
+    """Uploads a file to storage with memory bounded by one chunk.
+
+    Files that fit in a single chunk use one regular upload request, larger files
+    go through the resumable upload endpoint.
+
+    Args:
+        source: Seekable binary file, e.g. the spooled file of an UploadFile
+        bucket: Storage bucket
+        object_name: Path of the object inside the bucket
+        db: Supabase client, used for single chunk uploads
+        content_type: Content type stored with the object
+        uploader: Resumable uploader, configured from the Supabase settings by default
+
+    Returns:
+        Size, SHA-256 and row count of the uploaded file
+    """
+    size = await asyncio.to_thread(source.seek, 0, 2)
+    await asyncio.to_thread(source.seek, 0)
+
+    if size <= CHUNK_SIZE:
+        content = await asyncio.to_thread(source.read)
+        digest = StreamingDigest()
+        digest.update(0, content)
+        storage_response = await run_db(
+            db.storage.from_(bucket).upload, object_name, content, {"content-type": content_type}, timeout=None
+        )
+        if not storage_response:
+            raise IOError(f"Failed to upload {object_name} to storage")
+        return digest.summary()
+
+    if uploader is None:
+        config = get_supabase_config()
+        uploader = ResumableUploader(config.url, config.key, max_retries=config.max_retries)
+    return await uploader.upload(source, bucket, object_name, size, content_type)
+
+
+async def download_file_streaming(bucket: str, object_name: str, destination: BinaryIO,
+                                  transport: Optional[httpx.AsyncBaseTransport] = None) -> UploadSummary:
+    """Downloads a file from storage to a local file with memory bounded by one chunk.
+
+    Args:
+        bucket: Storage bucket
+        object_name: Path of the object inside the bucket
+        destination: Binary file the object is written to
+        transport: HTTP transport, the default network transport if None
+
+    Returns:
+        Size, SHA-256 and row count of the downloaded file
+
+    Raises:
+        httpx.HTTPError: If the download fails
+    """
+    config = get_supabase_config()
+    url = f"{config.url.rstrip('/')}/storage/v1/object/{bucket}/{object_name}"
+    headers = {"Authorization": f"Bearer {config.key}", "apikey": config.key}
+    digest = StreamingDigest()
+    started = time.perf_counter()
+    async with httpx.AsyncClient(headers=headers, timeout=config.timeout, transport=transport) as client:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            offset = 0
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                digest.update(offset, chunk)
+                await asyncio.to_thread(destination.write, chunk)
+                offset += len(chunk)
+    summary = digest.summary()
+    STORAGE_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, str(bucket))
+    STORAGE_DOWNLOAD_BYTES.observe(summary.size_bytes, str(bucket))
+    logger.info(f"Downloaded {summary.size_bytes} bytes from {bucket}/{object_name}")
+    return summary
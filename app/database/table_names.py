@@ -10,6 +10,12 @@ class TableName(str, Enum):
     PREDICTION_RESPONSES = "prediction_responses",
     TRAINING_DATA = "training_data",
     APPLICANTS = "applicants",
+    TRAINING_JOBS = "training_jobs",
+    SCENARIO_MODEL_LISTING = "scenario_model_listing",
+    # Database functions called through RPC
+    ACTIVATE_SCENARIO_MODEL = "activate_scenario_model",
+    CLAIM_TRAINING_SLOT = "claim_training_slot",
+    NEXT_MODEL_VERSION = "next_model_version",
     
     def __str__(self) -> str:
         return self.value
\ No newline at end of file
@@ -1,10 +1,65 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from routes.crud import router as crud_router
 from routes.inference import router as inference_router
 from routes.training import router as training_router
+from routes.health import router as health_router
+from routes.applicants import router as applicants_router
+from routes.metrics import router as metrics_router, RequestMetricsMiddleware
+from database.database import get_supabase_client, SupabaseClientManager
+from database.db_executor import get_db_executor
+from database.prediction_writer import get_prediction_writer, prediction_logging_enabled
+from utility.inference_pool import get_inference_pool
+from utility.inference_scheduler import get_inference_scheduler
+from utility.training_engine import get_training_engine
+from utility.model_preloader import preload_active_models, model_preload_enabled, readiness
+
+
+async def preload_models():
+    """Load all active scenario models in the background while the app starts serving."""
+    try:
+        async with get_supabase_client() as supabase:
+            await preload_active_models(supabase)
+    except Exception as e:
+        logging.error(f"Could not preload models: {str(e)}")
+        readiness.error = str(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spawn inference workers before the first request
+    await asyncio.to_thread(get_inference_pool().start)
+
+    if prediction_logging_enabled():
+        try:
+            get_prediction_writer().start(SupabaseClientManager.get_client())
+        except Exception as e:
+            logging.error(f"Prediction logging disabled, no database client: {str(e)}")
+
+    preload_task = None
+    if model_preload_enabled():
+        preload_task = asyncio.create_task(preload_models())
+    else:
+        readiness.ready = True
+
+    yield
+
+    if preload_task is not None and not preload_task.done():
+        preload_task.cancel()
+    await get_inference_scheduler().stop()
+    # Terminate training processes, their jobs are recorded as failed
+    await get_training_engine().shutdown()
+    # Write out every queued prediction before the process exits
+    await get_prediction_writer().stop()
+    get_db_executor().shutdown()
+    get_inference_pool().shutdown()
+
 
 # Initialize FastAPI app
-app = FastAPI(title="ML pipeline API", version="1.0.0")
+app = FastAPI(title="ML pipeline API", version="1.0.0", lifespan=lifespan)
 
 #add crud routes
 app.include_router(crud_router)
@@ -15,8 +70,16 @@ app.include_router(training_router)
 #add  inference routes
 app.include_router(inference_router)
 
+#add health check routes
+app.include_router(health_router)
+
+#add applicant ingestion routes
+app.include_router(applicants_router)
+
+#add prometheus metrics route and request latency recording
+app.include_router(metrics_router)
+app.add_middleware(RequestMetricsMiddleware)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
-
-    
\ No newline at end of file
@@ -1,18 +1,22 @@
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 from enum import Enum
-from typing import  Optional
+from typing import  Optional, List, Dict, Any
 
 
 class EmploymentType(str, Enum):
     FULL = "full_time"
     PART = "part_time"
+    SELF_EMPLOYED = "self_employed"
     UNEMPLOYED = "unemployed"
+    RETIRED = "retired"
     
 class MaritalStatus(str, Enum):
     SINGLE = "single"
     MARRIED = "married"
-    DIVORCED = "divorced" 
+    DIVORCED = "divorced"
+    WIDOWED = "widowed"
+    SEPARATED = "separated"
 
 class DeviceType(str, Enum):
     DESKOP = "desktop"
@@ -68,10 +72,11 @@ class MLModel(BaseModel):
     
 # Additional models for the API
 class Scenario(BaseModel):
-    scenario_id: str
-    scenario_name: str
-    description: str
-    current_model_id: Optional[MLModel] = None
+    # Listings may project a subset of the columns
+    scenario_id: Optional[str] = None
+    scenario_name: Optional[str] = None
+    description: Optional[str] = None
+    current_model_id: Optional[str] = None
     
     
 class ScenarioDetail(BaseModel):
@@ -94,6 +99,36 @@ class TrainingResponse(BaseModel):
     status: str
     timestamp: datetime
     
+class TrainingJobStatus(BaseModel):
+    training_id: str
+    scenario_id: str
+    data_id: str
+    tuned: bool = False
+    status: ModelStatus
+    model_id: Optional[str] = None
+    metrics: Optional[Dict[str, float]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+class ApplicantReject(BaseModel):
+    row: int
+    user_id: Optional[str] = None
+    errors: List[str]
+
+class ApplicantIngestReport(BaseModel):
+    rows: int = 0
+    written: int = 0
+    rejected: int = 0
+    duplicates: int = 0
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    error: Optional[str] = None
+    rejects: List[ApplicantReject] = []
+    rejects_truncated: bool = False
+    
 class ModelActivationResponse(BaseModel):
     status: str
     timestamp: datetime
@@ -101,6 +136,21 @@ class ModelActivationResponse(BaseModel):
 
 
 
+# Categorical vocabularies accepted by TaxFilingPredictionRequest
+EMPLOYMENT_TYPES = ['full_time', 'part_time', 'self_employed', 'unemployed', 'retired']
+MARITAL_STATUSES = ['single', 'married', 'divorced', 'widowed', 'separated']
+DEVICE_TYPES = ['mobile', 'desktop', 'tablet']
+REFERRAL_SOURCES = ['friend_referral', 'organic_search', 'social_media_ad',
+                    'email_campaign', 'affiliate']
+
+CATEGORICAL_VOCABULARIES = {
+    'employment_type': EMPLOYMENT_TYPES,
+    'marital_status': MARITAL_STATUSES,
+    'device_type': DEVICE_TYPES,
+    'referral_source': REFERRAL_SOURCES,
+}
+
+
 class TaxFilingPredictionRequest(BaseModel):
     """Request schema for tax filing completion prediction."""
     age: int = Field(..., ge=18, le=120)
@@ -117,7 +167,7 @@ class TaxFilingPredictionRequest(BaseModel):
     @field_validator('employment_type')
     @classmethod
     def validate_employment(cls, v):
-        valid_types = ['full_time', 'part_time', 'self_employed', 'unemployed', 'retired']
+        valid_types = EMPLOYMENT_TYPES
         if v.lower() not in valid_types:
             raise ValueError(f"employment_type must be one of {valid_types}")
         return v.lower()
@@ -125,7 +175,7 @@ class TaxFilingPredictionRequest(BaseModel):
     @field_validator('marital_status')
     @classmethod
     def validate_marital(cls, v):
-        valid_statuses = ['single', 'married', 'divorced', 'widowed', 'separated']
+        valid_statuses = MARITAL_STATUSES
         if v.lower() not in valid_statuses:
             raise ValueError(f"marital_status must be one of {valid_statuses}")
         return v.lower()
@@ -133,7 +183,7 @@ class TaxFilingPredictionRequest(BaseModel):
     @field_validator('device_type')
     @classmethod
     def validate_device(cls, v):
-        valid_devices = ['mobile', 'desktop', 'tablet']
+        valid_devices = DEVICE_TYPES
         if v.lower() not in valid_devices:
             raise ValueError(f"device_type must be one of {valid_devices}")
         return v.lower()
@@ -141,8 +191,7 @@ class TaxFilingPredictionRequest(BaseModel):
     @field_validator('referral_source')
     @classmethod
     def validate_referral(cls, v):
-        valid_sources = ['friend_referral', 'organic_search', 'social_media_ad', 
-                         'email_campaign', 'affiliate']
+        valid_sources = REFERRAL_SOURCES
         if v.lower() not in valid_sources:
             raise ValueError(f"referral_source must be one of {valid_sources}")
         return v.lower()
@@ -152,4 +201,25 @@ class TaxFilingPredictionResponse(BaseModel):
     """Response schema for tax filing completion prediction."""
     will_complete_filing: bool
     confidence_score: float
-    
\ No newline at end of file
+
+
+class TaxFilingBatchPredictionRequest(BaseModel):
+    """Request schema for batch tax filing completion prediction.
+
+    Records are validated one by one against TaxFilingPredictionRequest so that
+    a single malformed row is reported back instead of rejecting the whole batch.
+    """
+    records: List[Dict[str, Any]] = Field(..., min_length=1)
+
+
+class TaxFilingBatchPredictionResult(BaseModel):
+    """Prediction result or validation error for a single batch record."""
+    index: int
+    will_complete_filing: Optional[bool] = None
+    confidence_score: Optional[float] = None
+    error: Optional[str] = None
+
+
+class TaxFilingBatchPredictionResponse(BaseModel):
+    """Response schema for batch tax filing completion prediction, in request order."""
+    results: List[TaxFilingBatchPredictionResult]
@@ -0,0 +1,49 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
+from supabase import Client
+
+from models.models import ApplicantIngestReport
+from database.database import get_db
+from database.applicant_ingest import (
+    ApplicantIngestor, get_applicant_ingestor, format_for_filename, CSV_FORMAT, NDJSON_FORMAT
+)
+from utility.logging_setup import setup_logging
+
+router = APIRouter()
+setup_logging()
+logger = logging.getLogger("router_applicants")
+
+
+@router.post("/v1/applicants/bulk", response_model=ApplicantIngestReport)
+async def bulk_ingest_applicants(
+    file: UploadFile = File(...),
+    input_format: Optional[str] = Query(None, alias="format", pattern=f"^({CSV_FORMAT}|{NDJSON_FORMAT})$",
+                                        description="csv or ndjson, by default derived from the file name"),
+    batch_size: Optional[int] = Query(None, ge=1, le=50000, description="Rows per upsert"),
+    parallelism: Optional[int] = Query(None, ge=1, le=32, description="Upserts in flight"),
+    supabase: Client = Depends(get_db),
+):
+    """Load applicants from a CSV (with header row) or NDJSON file into the applicants table
+    Rows are validated in chunks and upserted on user_id in batches, invalid rows are
+    reported back with their row number instead of failing the whole load.
+    Args:
+        file (UploadFile): CSV or NDJSON file
+        supabase (Client): Supabase client
+    Returns:
+        ApplicantIngestReport: Row counts and the rejected rows
+    Raises:
+        HTTPException: 400 If the file could not be read, nothing is written in that case
+    """
+    defaults = get_applicant_ingestor()
+    ingestor = ApplicantIngestor(
+        batch_size=batch_size or defaults.batch_size,
+        parallelism=parallelism or defaults.parallelism,
+        max_reported_rejects=defaults.max_reported_rejects,
+    )
+    logger.info(f"POST /v1/applicants/bulk - Ingesting applicants from {file.filename}")
+    report = await ingestor.ingest(file.file, input_format or format_for_filename(file.filename or ""), supabase)
+    if report.error and report.rows == 0:
+        raise HTTPException(status_code=400, detail=report.error)
+    return report
@@ -4,16 +4,25 @@ from datetime import datetime
 import pickle
 import logging
 from typing import io, BinaryIO, Any, Optional
-import io
 
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Body, Form
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Body, Form, Request, Response, Query
 from supabase import Client
 
 from models.models import Scenario, ModelStatus, ModelStatistics
 from database.database import get_db
-from database.crud import get_scenarios, update_active_model, get_models, upload_new_model
+from database.crud import (
+    get_scenarios, update_active_model, rollback_active_model, get_models, upload_new_model, Page,
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from utility.model_loader import ModelLoader, HISTORY_DEPTH
+from utility.model_registry import ModelRegistry
 from utility.logging_setup import setup_logging
 from database.table_names import TableName
+from database.storage_upload import upload_file_streaming
+from database.db_executor import execute, get_db_executor
+from database.metadata_cache import MetadataCache, get_metadata_cache
+from utility.training_dataset import dataset_conversion_enabled
+from utility.training_engine import get_training_engine
 
 
 
@@ -23,6 +32,44 @@ logger = logging.getLogger("router_crud")
 logging.info("logging started for CRUD router")
 
 
+def _not_modified(request: Request, response: Response, data: Any) -> Optional[Response]:
+    """Tag a metadata response with its ETag, returns a 304 response if the client already has it
+    Args:
+        request (Request): Request with an optional If-None-Match header
+        response (Response): Response the headers are set on
+        data (Any): Response body
+    Returns:
+        Response: 304 Not Modified response, None if the body must be sent
+    """
+    etag = MetadataCache.etag(data)
+    # Clients may cache the body but must revalidate it on every use
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in client_tags or "*" in client_tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
+
+
+def _page_response(request: Request, response: Response, page: Page) -> Any:
+    """Body of a listing page, the cursor of the next page is sent in the X-Next-Cursor header
+    Returns:
+        Any: Rows of the page, or a 304 response if the client already has the page
+    """
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return _not_modified(request, response, [page.rows, page.next_cursor]) or page.rows
+
+
+def _split_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma separated fields query parameter"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
 @router.get("/")
 def read_root():
     return {
@@ -31,29 +78,39 @@ def read_root():
 
 
 # GET /v1/scenarios
-@router.get("/v1/scenarios", response_model=List[Scenario])
-async def get_scenarios_list(supabase: Client = Depends(get_db)):
-    """Get scenarios list from the database and return as JSON response
+@router.get("/v1/scenarios", response_model=List[Scenario], response_model_exclude_unset=True)
+async def get_scenarios_list(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return"),
+    supabase: Client = Depends(get_db),
+):
+    """Get a page of the scenarios list from the database and return as JSON response
+    Scenarios are ordered by ID, the cursor of the next page is returned in the
+    X-Next-Cursor header. The page is served from the metadata cache and tagged with an
+    ETag, a request with a matching If-None-Match header gets an empty 304 response.
     Returns:
         List[Scenario]: List of scenarios from the database
     Raises:
         HTTPException: 500 If there is an error with the database connection
+        HTTPException: 400 If the cursor or a field is invalid
         HTTPException: 404 If no scenarios are found in the database
 
     """
-    print("GET /v1/scenarios - Returning list of available scenarios")
     try:
-        scenarios = await get_scenarios(supabase)
-        if scenarios == None:
-            raise HTTPException(status_code=404, detail="No Scenarios found")
+        scenarios = await get_scenarios(supabase, limit=limit, cursor=cursor, fields=_split_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}",
         )
-    scenarios_data = scenarios
-    print(scenarios_data)
-    return scenarios_data
+    if not scenarios.rows and cursor is None:
+        raise HTTPException(status_code=404, detail="No Scenarios found")
+    return _page_response(request, response, scenarios)
 
 
 @router.post("/v1/scenarios/{scenario_id}/train/training_data")
@@ -75,15 +132,11 @@ async def upload_training_data_file(
         if not file.filename.endswith(".csv"):
             raise HTTPException(status_code=400, detail="Only CSV files are allowed.")
         file_uuid = str(uuid.uuid4())
-        content = await file.read()
         file_path = f"{file_uuid}/{file.filename}"
-        storage_response = supabase.storage.from_(TableName.TRAINING_DATA_BUCKET).upload(
-            file_path, content
+        # Stream the file in fixed-size chunks, hashing and counting rows on the way
+        upload_summary = await upload_file_streaming(
+            file.file, str(TableName.TRAINING_DATA_BUCKET), file_path, supabase
         )
-        if not storage_response:
-            raise HTTPException(
-                status_code=500, detail="Failed to upload file to storage."
-            )
 
         file_url = f"/storage/v1/object/public/{TableName.TRAINING_DATA_BUCKET}/{file_path}"
         data = {
@@ -92,17 +145,26 @@ async def upload_training_data_file(
             "model_training_data_name": file.filename,
             "used_status": False,
             "created_at": datetime.now().isoformat(),
+            "sha256": upload_summary.sha256,
+            "size_bytes": upload_summary.size_bytes,
+            "row_count": upload_summary.row_count,
         }
 
-        db_response = supabase.table("training_data").insert(data).execute()
+        db_response = await execute(supabase.table("training_data").insert(data))
         if not db_response:
             raise HTTPException(
                 status_code=500, detail="Failed to insert file metadata into database."
             )
+        if dataset_conversion_enabled():
+            # Convert to the columnar training format while nobody waits for it yet
+            get_training_engine().prepare_dataset(data, supabase)
         return {
             "message": "File uploaded successfully",
             "file_id": file_uuid,
             "file_url": file_url,
+            "sha256": upload_summary.sha256,
+            "size_bytes": upload_summary.size_bytes,
+            "row_count": upload_summary.row_count,
         }
 
     except Exception as e:
@@ -110,6 +172,7 @@ async def upload_training_data_file(
 
 @router.post("/v1/scenarios/{scenario_id}/models/model")
 async def upload_model(
+    scenario_id: str,
     model_name: str = Form(...),
     file: UploadFile = File(...),
     supabase: Client = Depends(get_db),
@@ -141,16 +204,16 @@ async def upload_model(
                 status_code = 400, detail="Only pickle models are currently supported."
             )
         model_id = str(uuid.uuid4()) # assign a unique UUID to the model
-        model_content = await file.read()
-        model_file = io.BytesIO(model_content)
 
+        # Stream the spooled request file straight to storage instead of reading it into memory
         upload_result = await upload_new_model(
-                file = model_file,
+                file = file.file,
                 file_name = file.filename,
                 model_name = model_name,
                 model_id = model_id,
                 model_version = model_version,
                 model_performance = model_performance,
+                scenario_id = scenario_id,
                 db = supabase)
         if not upload_result:
             raise HTTPException(
@@ -168,8 +231,24 @@ async def upload_model(
 
 
 @router.get("/v1/scenarios/{scenario_id}/models")
-async def get_scenario_models(scenario_id: str, supabase: Client = Depends(get_db)):
-    """Get models for a selected scenario from the database and return as JSON response
+async def get_scenario_models(
+    scenario_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return"),
+    active: Optional[bool] = Query(None, description="Only active or only inactive models"),
+    state: Optional[ModelStatus] = Query(None, description="Only models in this state"),
+    created_after: Optional[datetime] = Query(None, description="Only models created at or after this time"),
+    created_before: Optional[datetime] = Query(None, description="Only models created before this time"),
+    supabase: Client = Depends(get_db),
+):
+    """Get a page of the models of a selected scenario from the database and return as JSON response
+    Models are filtered by the database and ordered newest first, the cursor of the next
+    page is returned in the X-Next-Cursor header. The page is served from the metadata
+    cache and tagged with an ETag, a request with a matching If-None-Match header gets
+    an empty 304 response.
     Args:
         scenario_id (str): Scenario ID
         supabase (Client): Supabase client
@@ -177,18 +256,22 @@ async def get_scenario_models(scenario_id: str, supabase: Client = Depends(get_d
         List[dict]: List of models for the selected scenario
     Raises:
         HTTPException: 500 If there is an error with the database connection
+        HTTPException: 400 If the cursor or a field is invalid
         HTTPException: 404 If the scenario does not exist
     """
     try:
-        scenario_data = await get_models(scenario_id, supabase)
-        if not scenario_data:
-            raise HTTPException(status_code=404, detail="Scenario not found")
-        scenario_models = supabase.table("scenario_models").select("*").eq("scenario_id", scenario_id).execute()
-        if not scenario_models.data or len(scenario_models.data) == 0:
-            raise HTTPException(status_code=404, detail="No models found for the assigned scenario")
-        return scenario_models.data
+        scenario_models = await get_models(
+            scenario_id, supabase, limit=limit, cursor=cursor, fields=_split_fields(fields), active=active,
+            state=state, created_after=created_after, created_before=created_before,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    unfiltered = cursor is None and active is None and state is None and created_after is None and created_before is None
+    if not scenario_models.rows and unfiltered:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return _page_response(request, response, scenario_models)
 
 
 
@@ -211,4 +294,58 @@ async def set_active_model(scenario_id: str, model_id: str, supabase: Client = D
         return {"message": "Model activated successfully"}
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/v1/scenarios/{scenario_id}/models/history")
+async def get_model_history(scenario_id: str):
+    """Get the previously active models a scenario can be rolled back to
+    Returns:
+        dict: Active model ID and the model IDs in the history, most recent first
+    """
+    loader = ModelLoader()
+    return {
+        "scenario_id": scenario_id,
+        "active_model_ID": ModelRegistry().active_model_id(scenario_id),
+        "history": loader.history(scenario_id),
+        "max_depth": HISTORY_DEPTH,
+    }
+
+
+@router.post("/v1/scenarios/{scenario_id}/models/rollback")
+async def rollback_model(scenario_id: str, steps: int = 1, supabase: Client = Depends(get_db)):
+    """ Roll a scenario back to the model that was active steps activations ago.
+        The previous model is rehydrated from its artifact on local disk.
+    Returns:
+        dict: Model ID that is active after the rollback
+    Raises:
+        HTTPException: 404 If the history of the scenario is not deep enough
+        HTTPException: 500 If the previous model could not be loaded or activated
+    """
+    if ModelLoader().rollback_target(scenario_id, steps) is None:
+        raise HTTPException(status_code=404, detail=f"No model available {steps} versions back")
+    try:
+        model_id = await rollback_active_model(scenario_id, steps, supabase)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if model_id is None:
+        raise HTTPException(status_code=500, detail="Rollback failed")
+    return {"message": "Model rolled back successfully", "active_model_ID": model_id}
+
+
+@router.get("/v1/database/stats")
+async def get_database_stats():
+    """Get the statistics of the database executor
+    Returns:
+        dict: Pool size, timeout and the number of calls in flight, finished, timed out and failed
+    """
+    return get_db_executor().stats()
+
+
+@router.get("/v1/database/cache/stats")
+async def get_metadata_cache_stats():
+    """Get size and hit/miss statistics of the scenario and model metadata cache
+    Returns:
+        dict: Metadata cache statistics
+    """
+    return get_metadata_cache().stats()
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from utility.model_preloader import readiness
+
+router = APIRouter()
+
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe, the worker is up and serving requests."""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness_probe():
+    """Readiness probe, succeeds once the preload attempted the active model of every scenario.
+    Returns:
+        dict: Preload status with the scenarios whose model failed to load, HTTP 503 while models are loading
+    """
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.as_dict(),
+    )
@@ -1,20 +1,35 @@
 import os
 import uuid
+import logging
 from datetime import datetime
 
 from fastapi import APIRouter, HTTPException, Path, Depends, status
+from pydantic import ValidationError
 from supabase import Client
 
 from models.models import  PredictionRequest, PredictionResponse, TaxFilingPredictionResponse, TaxFilingPredictionRequest
+from models.models import TaxFilingBatchPredictionRequest, TaxFilingBatchPredictionResponse, TaxFilingBatchPredictionResult
 from database.database import get_db
 from utility.model_executor import ModelExecutor
 from utility.logging_setup import setup_logging
 from utility.model_loader import ModelLoader
+from utility.model_registry import ModelRegistry, RegisteredModel
+from utility.artifact_cache import get_artifact_cache
+from database.crud import get_active_model
+from database.prediction_writer import get_prediction_writer
+from utility.inference_scheduler import get_inference_scheduler, micro_batching_enabled, SchedulerOverloadedError
+from utility.inference_pool import get_inference_pool, InferenceTimeoutError
+from utility.prediction_cache import get_prediction_cache, prediction_cache_enabled
+from utility.metrics import INFERENCE_STAGE_SECONDS
 
 
-logging = setup_logging()
+setup_logging()
+logger = logging.getLogger("router_inference")
 router = APIRouter()
 
+# Upper bound on records accepted by a single batch prediction request
+MAX_BATCH_RECORDS = int(os.environ.get("INFERENCE_MAX_BATCH_RECORDS", "10000"))
+
 # # POST /v1/scenarios/{scenario_ID}/predict
 # @router.post("/v1/scenarios/{scenario_ID}/predict", response_model=PredictionResponse)
 # async def predict(
@@ -46,12 +61,35 @@ router = APIRouter()
 #     )
 
 
+async def resolve_active_model(scenario_id: str, db: Client) -> RegisteredModel:
+    """Get the active model of a scenario, loading it on demand.
+    
+    Raises:
+        HTTPException: 404 If the scenario has no active model
+        HTTPException: 500 If the model cannot be loaded
+    """
+    try:
+        with INFERENCE_STAGE_SECONDS.time("resolve_model"):
+            loaded_model = await get_active_model(scenario_id, db)
+    except Exception as e:
+        logger.error(f"Error loading active model for scenario {scenario_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
+    if loaded_model is None:
+        raise HTTPException(status_code=404, detail="No active model for this scenario")
+    return loaded_model
+
+
 @router.post("/v1/scenarios/{scenario_ID}/predict", response_model=TaxFilingPredictionResponse)
-async def predict_tax_filing_completion(request: TaxFilingPredictionRequest):
+async def predict_tax_filing_completion(
+    request: TaxFilingPredictionRequest,
+    scenario_ID: str = Path(..., description="The ID of the scenario"),
+    db: Client = Depends(get_db),
+):
     """Predict whether a user will complete their tax filing.
     
     Args:
         request: User tax data for prediction
+        scenario_ID: Scenario whose active model is used
         
     Returns:
         Prediction result with confidence score
@@ -59,12 +97,27 @@ async def predict_tax_filing_completion(request: TaxFilingPredictionRequest):
     Raises:
         HTTPException: If prediction fails
     """
+    loaded_model = await resolve_active_model(scenario_ID, db)
     try:
         # Convert Pydantic model to dictionary
         input_data = request.model_dump()  # Using model_dump() instead of dict()
         
-        # Execute inference
-        prediction, confidence = ModelExecutor.execute_inference(input_data)
+        async def run_inference():
+            # Execute inference, coalescing concurrent requests into micro-batches when enabled
+            if micro_batching_enabled():
+                return await get_inference_scheduler().submit(loaded_model, input_data)
+            return (await get_inference_pool().run_batch(loaded_model, [input_data]))[0]
+
+        if prediction_cache_enabled():
+            # Identical requests to the same model version share one cached or in-flight prediction
+            prediction, confidence = await get_prediction_cache().get_or_compute(
+                loaded_model, input_data, run_inference
+            )
+        else:
+            prediction, confidence = await run_inference()
+
+        # Audit record, written in the background
+        get_prediction_writer().submit(scenario_ID, loaded_model.model_id, prediction, confidence)
         
         # Return response
         return TaxFilingPredictionResponse(
@@ -75,10 +128,142 @@ async def predict_tax_filing_completion(request: TaxFilingPredictionRequest):
     except ValueError as e:
         # Input validation error
         raise HTTPException(status_code=422, detail=str(e))
+    except SchedulerOverloadedError as e:
+        # Too many requests waiting for a micro-batch
+        raise HTTPException(status_code=503, detail=str(e))
+    except InferenceTimeoutError as e:
+        # Prediction did not finish within the configured timeout
+        raise HTTPException(status_code=504, detail=str(e))
     except RuntimeError as e:
         # Model execution error
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         # Unexpected error
-        logging.error(f"Unexpected error in prediction endpoint: {str(e)}")
+        logger.error(f"Unexpected error in prediction endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/v1/scenarios/{scenario_ID}/predict/batch", response_model=TaxFilingBatchPredictionResponse)
+async def predict_tax_filing_completion_batch(
+    request: TaxFilingBatchPredictionRequest,
+    scenario_ID: str = Path(..., description="The ID of the scenario"),
+    db: Client = Depends(get_db),
+):
+    """Predict tax filing completion for a batch of users with a single model call.
+    
+    Args:
+        request: Batch of user tax data records
+        scenario_ID: Scenario whose active model is used
+        
+    Returns:
+        Per-record prediction results or validation errors, in request order
+        
+    Raises:
+        HTTPException: 404 If the scenario has no active model
+        HTTPException: 413 If the batch exceeds INFERENCE_MAX_BATCH_RECORDS
+        HTTPException: 500 If prediction fails
+        HTTPException: 504 If prediction does not finish within INFERENCE_TIMEOUT_SECONDS
+    """
+    if len(request.records) > MAX_BATCH_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch size {len(request.records)} exceeds the limit of {MAX_BATCH_RECORDS} records",
+        )
+
+    results = [TaxFilingBatchPredictionResult(index=index) for index in range(len(request.records))]
+    valid_indices = []
+    valid_records = []
+    with INFERENCE_STAGE_SECONDS.time("validate"):
+        for index, record in enumerate(request.records):
+            try:
+                valid_records.append(TaxFilingPredictionRequest.model_validate(record).model_dump())
+                valid_indices.append(index)
+            except ValidationError as e:
+                results[index].error = "; ".join(
+                    f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()
+                )
+
+    if valid_records:
+        loaded_model = await resolve_active_model(scenario_ID, db)
+        predictions = [None] * len(valid_records)
+        cache_keys = []
+        if prediction_cache_enabled():
+            cache = get_prediction_cache()
+            cache_keys = [cache.key(loaded_model, record) for record in valid_records]
+            predictions = [cache.lookup(key) for key in cache_keys]
+        missing = [position for position, prediction in enumerate(predictions) if prediction is None]
+        try:
+            if missing:
+                computed = await get_inference_pool().run_batch(
+                    loaded_model, [valid_records[position] for position in missing]
+                )
+                for position, prediction in zip(missing, computed):
+                    predictions[position] = prediction
+                    if cache_keys:
+                        cache.store(cache_keys[position], prediction)
+        except InferenceTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            logger.error(f"Unexpected error in batch prediction endpoint: {str(e)}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+        writer = get_prediction_writer()
+        for index, (prediction, confidence) in zip(valid_indices, predictions):
+            results[index].will_complete_filing = bool(prediction)
+            results[index].confidence_score = confidence
+            writer.submit(scenario_ID, loaded_model.model_id, prediction, confidence)
+
+    return TaxFilingBatchPredictionResponse(results=results)
+
+
+
+@router.get("/v1/inference/scheduler/stats")
+async def get_inference_scheduler_stats():
+    """Get queue depth and micro-batch size statistics of the inference scheduler.
+    
+    Returns:
+        dict: Scheduler statistics
+    """
+    return get_inference_scheduler().stats()
+
+
+@router.get("/v1/inference/cache/stats")
+async def get_prediction_cache_stats():
+    """Get size and hit/miss statistics of the prediction cache.
+    
+    Returns:
+        dict: Prediction cache statistics
+    """
+    return get_prediction_cache().stats()
+
+
+@router.get("/v1/inference/predictions/writer/stats")
+async def get_prediction_writer_stats():
+    """Get queue depth and write statistics of the background prediction writer.
+    
+    Returns:
+        dict: Prediction writer statistics
+    """
+    return get_prediction_writer().stats()
+
+
+@router.get("/v1/models/registry")
+async def get_model_registry_stats():
+    """Get the memory budget of the model registry and the resident size of every loaded model.
+    
+    Returns:
+        dict: Registry statistics
+    """
+    return ModelRegistry().stats()
+
+
+@router.get("/v1/models/cache")
+async def get_model_artifact_cache_stats():
+    """Get size and hit/miss statistics of the local model artifact cache.
+    
+    Returns:
+        dict: Artifact cache statistics
+    """
+    return get_artifact_cache().stats()
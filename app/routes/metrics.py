@@ -0,0 +1,58 @@
+import time
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from utility.metrics import REGISTRY, METRICS_ENABLED, HTTP_REQUEST_SECONDS
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request.
+
+    Requests are labelled with the route template instead of the raw path, so
+    scenario and model IDs do not create a series each. Unlike BaseHTTPMiddleware
+    it neither buffers nor re-wraps the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route, str(status_code))
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Hot path latency histograms and the active model of every scenario in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: Prometheus exposition format 0.0.4
+
+    Raises:
+        HTTPException: 404 If metrics are disabled with METRICS=false
+    """
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,28 +1,131 @@
 import os
 import uuid
-from typing import List
+import asyncio
+import logging
+from typing import List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, Path, Depends, status
+from fastapi import APIRouter, HTTPException, Path, Query, Depends, Response, status
 from supabase import Client
 from dotenv import load_dotenv
 
 from models.models import Scenario, MLModel, ModelStatus, ModelStatistics, Status, PredictionRequest, PredictionResponse, TrainingResponse, ScenarioDetail, ModelActivationResponse, Applicant
+from models.models import TrainingJobStatus
 from database.database import get_db
+from database.crud import get_training_data, get_training_job, request_training_cancellation
+from utility.training_engine import get_training_engine, TrainingCancelledError
 
 router = APIRouter()
+logger = logging.getLogger("router_training")
 
 # POST /v1/scenarios/{scenario_ID}/train/{data_ID}
-@router.post("/v1/scenarios/{scenario_ID}/train/{data_ID}", response_model=TrainingResponse, )
+@router.post("/v1/scenarios/{scenario_ID}/train/{data_ID}", response_model=TrainingResponse, status_code=status.HTTP_202_ACCEPTED)
 async def train_with_data_id(
     scenario_ID: str = Path(..., description="The ID of the scenario"),
-    data_ID: str = Path(..., description="The ID of the training data")
+    data_ID: str = Path(..., description="The ID of the training data"),
+    tune: Optional[bool] = Query(None, description="Tune the model parameters, defaults to TRAINING_TUNE"),
+    db: Client = Depends(get_db),
 ):
-    print(f"POST /v1/scenarios/{scenario_ID}/train/{data_ID} - Training model with existing dataset")
+    """Start a background training job on an uploaded training data file.
     
-    # In a real application, this would retrieve the specified dataset and initiate a training job
+    The trained model is uploaded as an inactive model of the scenario, poll
+    GET /v1/training/{training_ID} for its status. Tuned jobs pick the best of
+    several model configurations by cross-validation.
+    
+    Raises:
+        HTTPException: 404 If the training data does not exist
+        HTTPException: 500 If the training data cannot be looked up
+    """
+    logger.info(f"POST /v1/scenarios/{scenario_ID}/train/{data_ID} - Training model with existing dataset")
+    try:
+        training_data = await get_training_data(data_ID, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if training_data is None:
+        raise HTTPException(status_code=404, detail="Training data not found")
+
+    job = get_training_engine().submit(scenario_ID, training_data, db, tune=tune)
     return TrainingResponse(
-        training_ID=str(uuid.uuid4()),
-        status="training_started",
-        timestamp=datetime.now()
-    )
\ No newline at end of file
+        training_ID=job.training_id,
+        status=job.status.value,
+        timestamp=job.created_at
+    )
+
+
+# GET /v1/training/{training_ID}
+@router.get("/v1/training/{training_ID}", response_model=TrainingJobStatus)
+async def get_training_status(
+    training_ID: str = Path(..., description="The ID of the training job"),
+    db: Client = Depends(get_db),
+):
+    """Get the status, metrics and trained model of a training job.
+    
+    Raises:
+        HTTPException: 404 If the training job does not exist
+    """
+    job = get_training_engine().get(training_ID)
+    if job is not None:
+        return TrainingJobStatus(**job.to_row())
+    # Jobs of earlier runs are only recorded in the database
+    try:
+        row = await get_training_job(training_ID, db)
+    except Exception as e:
+        logger.error(f"Error looking up training job {training_ID}: {str(e)}")
+        row = None
+    if row is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return TrainingJobStatus(**row)
+
+
+# POST /v1/training/{training_ID}/cancel
+@router.post("/v1/training/{training_ID}/cancel", response_model=TrainingJobStatus)
+async def cancel_training(
+    response: Response,
+    training_ID: str = Path(..., description="The ID of the training job"),
+    db: Client = Depends(get_db),
+):
+    """Cancel a pending or running training job.
+    
+    Jobs of this worker are cancelled right away. Jobs of other workers are flagged
+    in the database and answered with 202, the worker running the job stops it
+    with its next slot claim or heartbeat unless it is uploading its model.
+    
+    Raises:
+        HTTPException: 404 If the training job does not exist
+        HTTPException: 409 If the job already finished or is uploading its model
+        HTTPException: 500 If the cancellation cannot be recorded
+    """
+    engine = get_training_engine()
+    try:
+        job = engine.cancel(training_ID)
+    except TrainingCancelledError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is not None:
+        # Wait for the job to record its cancellation
+        await asyncio.wait([job.task])
+        return TrainingJobStatus(**job.to_row())
+
+    try:
+        row = await request_training_cancellation(training_ID, db)
+        if row is None:
+            row = await get_training_job(training_ID, db)
+            if row is None:
+                raise HTTPException(status_code=404, detail="Training job not found")
+            raise HTTPException(status_code=409, detail=f"Training job {training_ID} can no longer be cancelled")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cancelling training job {training_ID}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    response.status_code = status.HTTP_202_ACCEPTED
+    return TrainingJobStatus(**row)
+
+
+@router.get("/v1/training/engine/stats")
+async def get_training_engine_stats():
+    """Get the concurrency limit and job counts of the training engine.
+    
+    Returns:
+        dict: Training engine statistics
+    """
+    return get_training_engine().stats()
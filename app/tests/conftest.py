@@ -0,0 +1,18 @@
+"""Shared setup of the test suite, run from the app directory:
+
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+# Modules are imported like in the app, relative to the app directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholder configuration, tests never reach a real database
+os.environ.setdefault("SUPABASE_DB_HOST", "http://tests.invalid")
+os.environ.setdefault("SUPABASE_DB_KEY", "tests")
+os.environ.setdefault("MODEL_PRELOAD", "false")
+os.environ.setdefault("MODEL_CACHE_DIR", tempfile.mkdtemp(prefix="ml_pipeline_tests_models_"))
+os.environ.setdefault("DATASET_CACHE_DIR", tempfile.mkdtemp(prefix="ml_pipeline_tests_datasets_"))
+os.environ.setdefault("METADATA_STAMP_DIR", tempfile.mkdtemp(prefix="ml_pipeline_tests_stamps_"))
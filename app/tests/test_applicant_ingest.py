@@ -0,0 +1,163 @@
+import io
+import json
+import uuid
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.models import ApplicantIngestReport
+from database.applicant_ingest import (
+    APPLICANT_COLUMNS, CSV_FORMAT, NDJSON_FORMAT, ApplicantIngestor, is_row_error, validate_applicants
+)
+
+
+class CodedError(Exception):
+    """Stand-in for a PostgREST APIError carrying a SQLSTATE or PGRST code."""
+
+    def __init__(self, message: str, code):
+        super().__init__(message)
+        self.code = code
+
+
+class RecordingDB:
+    """Client answering every applicants upsert with handler(records)."""
+
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.upserts = []
+
+    def table(self, name):
+        return self
+
+    def upsert(self, records, on_conflict):
+        self.upserts.append(list(records))
+        return self
+
+    def execute(self):
+        if self.handler is not None:
+            self.handler(self.upserts[-1])
+
+
+def _applicant(**overrides):
+    applicant = {
+        "user_id": str(uuid.uuid4()), "age": "35", "number_of_sessions": "4", "income": "52000.5",
+        "time_spent_on_platform": "31.5", "fields_filled_percentage": "80", "previous_year_filing": "true",
+        "completed_filing": "0", "employment_type": "Full_Time", "marital_status": "single",
+        "device_type": "mobile", "referral_source": "organic_search",
+    }
+    applicant.update(overrides)
+    return applicant
+
+
+def _csv(applicants) -> io.BytesIO:
+    return io.BytesIO(pd.DataFrame(applicants, columns=APPLICANT_COLUMNS).to_csv(index=False).encode())
+
+
+def _ingest(source, input_format, db, batch_size=100):
+    return asyncio.run(ApplicantIngestor(batch_size=batch_size, parallelism=4).ingest(source, input_format, db))
+
+
+def test_valid_rows_are_converted():
+    frame = pd.DataFrame([_applicant()], columns=APPLICANT_COLUMNS)
+
+    records, rows, rejects = validate_applicants(frame, np.array([1]))
+
+    assert rejects == []
+    assert rows.tolist() == [1]
+    assert records[0]["age"] == 35 and records[0]["income"] == 52000.5
+    assert records[0]["previous_year_filing"] and not records[0]["completed_filing"]
+    assert records[0]["employment_type"] == "full_time"
+
+
+def test_invalid_rows_are_rejected_with_every_error():
+    applicants = [
+        _applicant(),
+        _applicant(user_id="not-a-uuid", age="35.5"),
+        _applicant(income="lots", employment_type="astronaut", referral_source=" "),
+    ]
+    frame = pd.DataFrame(applicants, columns=APPLICANT_COLUMNS)
+
+    records, rows, rejects = validate_applicants(frame, np.array([1, 2, 3]))
+
+    assert rows.tolist() == [1]
+    assert [reject.row for reject in rejects] == [2, 3]
+    assert rejects[0].user_id == "not-a-uuid"
+    assert rejects[0].errors == ["user_id must be a UUID", "age must be an integer"]
+    assert len(rejects[1].errors) == 3
+    assert rejects[1].errors[0] == "income must be a number"
+
+
+def test_duplicates_keep_the_last_row():
+    user_id = str(uuid.uuid4())
+    records = [{"user_id": user_id, "age": 30}, {"user_id": str(uuid.uuid4()), "age": 40},
+               {"user_id": user_id, "age": 50}]
+    report = ApplicantIngestReport()
+
+    kept, rows = ApplicantIngestor._deduplicate(report, records, np.array([1, 2, 3]))
+
+    assert [record["age"] for record in kept] == [40, 50]
+    assert rows.tolist() == [2, 3]
+    assert report.duplicates == 1
+
+
+def test_ndjson_rejects_malformed_lines():
+    lines = [json.dumps(_applicant()), "{not json", "[1, 2]", "", json.dumps(_applicant(age="x"))]
+    db = RecordingDB()
+
+    report = _ingest(io.BytesIO("\n".join(lines).encode()), NDJSON_FORMAT, db)
+
+    assert report.written == 1
+    assert sorted(reject.row for reject in report.rejects) == [2, 3, 5]
+
+
+@pytest.mark.parametrize("code, row_error", [
+    ("23505", True), ("22P02", True), ("42501", False), ("PGRST301", False), (None, False),
+])
+def test_row_errors_are_told_apart(code, row_error):
+    assert is_row_error(CodedError("error", code)) is row_error
+
+
+def test_row_errors_are_isolated_by_bisection():
+    applicants = [_applicant() for _ in range(64)]
+    bad = {applicants[5]["user_id"], applicants[40]["user_id"]}
+
+    def handler(records):
+        if any(record["user_id"] in bad for record in records):
+            raise CodedError("null value in column violates not-null constraint", "23502")
+
+    report = _ingest(_csv(applicants), CSV_FORMAT, RecordingDB(handler), batch_size=32)
+
+    assert report.written == 62
+    assert sorted(reject.row for reject in report.rejects) == [6, 41]
+    assert report.error is None
+
+
+def test_request_errors_abort_the_load():
+    def handler(records):
+        raise CodedError("permission denied for table applicants", "42501")
+
+    db = RecordingDB(handler)
+
+    report = _ingest(_csv([_applicant() for _ in range(1000)]), CSV_FORMAT, db, batch_size=100)
+
+    # No bisection and no further batches once the database refused the first ones
+    assert len(db.upserts) <= 4
+    assert report.written == 0
+    assert report.rejected == report.rows
+    assert "permission denied" in report.error
+
+
+def test_every_vocabulary_value_is_accepted():
+    applicants = [_applicant(employment_type="retired", marital_status="widowed"),
+                  _applicant(employment_type="self_employed", marital_status="separated")]
+    db = RecordingDB()
+
+    report = _ingest(_csv(applicants), CSV_FORMAT, db)
+
+    assert report.rejects == []
+    assert report.written == 2
+    assert [(record["employment_type"], record["marital_status"]) for record in db.upserts[0]] == [
+        ("retired", "widowed"), ("self_employed", "separated"),
+    ]
@@ -0,0 +1,29 @@
+import os
+
+from utility.artifact_cache import ArtifactCache
+
+
+def test_open_artifact_survives_eviction(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=150)
+    cache.put("model-a", b"a" * 100)
+
+    artifact_file = cache.open("model-a")
+    # Storing a second artifact evicts the first one while it is still open
+    cache.put("model-b", b"b" * 100)
+
+    with artifact_file:
+        assert not cache.contains("model-a")
+        assert artifact_file.read() == b"a" * 100
+    assert cache.open("model-a") is None
+
+
+def test_corrupted_artifact_is_a_miss(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=1024)
+    cache.put("model-a", b"model")
+    (path,) = [os.path.join(tmp_path, name) for name in os.listdir(tmp_path)]
+    with open(path, 'wb') as artifact_file:
+        artifact_file.write(b"tampered")
+
+    assert cache.open("model-a") is None
+    assert not cache.contains("model-a")
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,68 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from database.db_executor import DatabaseExecutor, DatabaseTimeoutError, describe_query
+
+
+def test_slow_call_times_out():
+    executor = DatabaseExecutor(max_workers=2, timeout_seconds=0.05)
+
+    with pytest.raises(DatabaseTimeoutError):
+        asyncio.run(executor.run(time.sleep, 0.5))
+
+    assert executor.stats()["timeouts"] == 1
+    assert executor.stats()["in_flight"] == 0
+    executor.shutdown()
+
+
+def test_wait_for_a_free_thread_counts_against_the_timeout():
+    executor = DatabaseExecutor(max_workers=1, timeout_seconds=None)
+    release = threading.Event()
+
+    async def queued_behind_a_slow_call():
+        blocking = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(DatabaseTimeoutError):
+                await executor.run(lambda: "fast", timeout=0.05)
+        finally:
+            release.set()
+        return await blocking
+
+    assert asyncio.run(queued_behind_a_slow_call()) is True
+    executor.shutdown()
+
+
+def test_call_without_timeout_waits():
+    executor = DatabaseExecutor(max_workers=1, timeout_seconds=0.01)
+
+    assert asyncio.run(executor.run(lambda: time.sleep(0.05) or "done", timeout=None)) == "done"
+    executor.shutdown()
+
+
+def test_errors_are_raised_and_counted():
+    executor = DatabaseExecutor(max_workers=1)
+
+    def fail():
+        raise ConnectionError("connection refused")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(executor.run(fail))
+
+    assert executor.stats()["errors"] == 1 and executor.stats()["timeouts"] == 0
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("query, expected", [
+    (SimpleNamespace(path="/ml_models", http_method="GET"), ("ml_models", "select")),
+    (SimpleNamespace(path="/training_jobs", http_method="POST",
+                     headers={"Prefer": "resolution=merge-duplicates"}), ("training_jobs", "upsert")),
+    (SimpleNamespace(path="/rpc/activate_scenario_model", http_method="POST"), ("activate_scenario_model", "rpc")),
+    (object(), ("unknown", "unknown")),
+])
+def test_queries_are_described_by_table_and_operation(query, expected):
+    assert describe_query(query) == expected
@@ -0,0 +1,64 @@
+import io
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.run import synthetic_records, train_model
+from utility.inference_pool import PROCESS_MODE, InferencePool
+from utility.model_loader import ModelLoader
+
+
+@pytest.fixture(scope="module")
+def candidates():
+    blob = train_model(synthetic_records(300, seed=0), seed=0)
+    loader = ModelLoader()
+    return [loader.build_candidate(io.BytesIO(blob), "scenario", f"model-{index}") for index in range(4)]
+
+
+def test_publish_is_shared_and_reused(candidates):
+    pool = InferencePool(mode=PROCESS_MODE, worker_max_models=1)
+
+    async def publish():
+        paths = await asyncio.gather(*(pool._publish_model(candidates[0]) for _ in range(5)))
+        return paths, await pool._publish_model(candidates[0])
+
+    paths, again = asyncio.run(publish())
+
+    assert len(set(paths)) == 1 and again == paths[0]
+    assert os.path.exists(again)
+    pool.shutdown()
+    assert not os.path.exists(again)
+
+
+def test_cold_file_is_kept_until_its_task_finished(candidates):
+    pool = InferencePool(mode=PROCESS_MODE, worker_max_models=1)
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+
+    def read(path):
+        release.wait(5)
+        with open(path, 'rb') as model_file:
+            return len(model_file.read())
+
+    async def scenario():
+        first = await pool._publish_model(candidates[0])
+        task = pool._submit(executor, read, first)
+        # Pushes the first file out of the 2 * worker_max_models published files
+        for candidate in candidates[1:]:
+            await pool._publish_model(candidate)
+        retired_while_running = os.path.exists(first)
+        release.set()
+        size = await task
+        # The release is scheduled on the loop by the executor thread
+        await asyncio.sleep(0.05)
+        return first, retired_while_running, size
+
+    first, retired_while_running, size = asyncio.run(scenario())
+
+    assert retired_while_running and size > 0
+    assert not os.path.exists(first)
+    executor.shutdown()
+    pool.shutdown()
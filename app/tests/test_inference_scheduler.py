@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+from utility.inference_scheduler import InferenceScheduler, SchedulerOverloadedError
+
+MODEL_A = SimpleNamespace(key=("scenario-a", "model-a"))
+MODEL_B = SimpleNamespace(key=("scenario-b", "model-b"))
+
+
+class RecordingPool:
+    """Inference pool answering every record with (record["x"], 1.0) after delay seconds."""
+
+    mode = "test"
+    timeout_seconds = 5.0
+
+    def __init__(self, max_workers=4, delay=0.0):
+        self.max_workers = max_workers
+        self.delay = delay
+        self.batches = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def run_batch(self, loaded_model, records):
+        self.batches.append((loaded_model.key, [record["x"] for record in records]))
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return [(record["x"], 1.0) for record in records]
+
+
+def test_concurrent_requests_are_batched():
+    pool = RecordingPool()
+    scheduler = InferenceScheduler(pool, max_batch_size=4, max_wait_ms=5)
+
+    async def predict():
+        results = await asyncio.gather(*(scheduler.submit(MODEL_A, {"x": x}) for x in range(10)))
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(predict())
+
+    assert results == [(x, 1.0) for x in range(10)]
+    assert [len(records) for _, records in pool.batches] == [4, 4, 2]
+    assert scheduler.stats()["batch_size_histogram"] == {2: 1, 4: 2}
+
+
+def test_batch_is_split_by_model():
+    pool = RecordingPool()
+    scheduler = InferenceScheduler(pool, max_batch_size=8, max_wait_ms=5)
+    models = [MODEL_A, MODEL_B, MODEL_A, MODEL_B, MODEL_A]
+
+    async def predict():
+        results = await asyncio.gather(*(scheduler.submit(model, {"x": x}) for x, model in enumerate(models)))
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(predict())
+
+    assert results == [(x, 1.0) for x in range(5)]
+    assert sorted(pool.batches) == [(MODEL_A.key, [0, 2, 4]), (MODEL_B.key, [1, 3])]
+    assert scheduler.stats()["batches_executed"] == 1
+
+
+def test_batches_in_flight_are_capped_by_the_pool_workers():
+    pool = RecordingPool(max_workers=2, delay=0.02)
+    scheduler = InferenceScheduler(pool, max_batch_size=1, max_wait_ms=0)
+
+    async def predict():
+        await asyncio.gather(*(scheduler.submit(MODEL_A, {"x": x}) for x in range(6)))
+        await scheduler.stop()
+
+    asyncio.run(predict())
+
+    assert len(pool.batches) == 6
+    assert pool.peak_in_flight == 2
+
+
+def test_requests_accumulate_while_workers_are_busy():
+    pool = RecordingPool(max_workers=1, delay=0.05)
+    scheduler = InferenceScheduler(pool, max_batch_size=32, max_wait_ms=0)
+
+    async def predict():
+        first = asyncio.ensure_future(scheduler.submit(MODEL_A, {"x": 0}))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(first, *(scheduler.submit(MODEL_A, {"x": x}) for x in range(1, 6)))
+        await scheduler.stop()
+
+    asyncio.run(predict())
+
+    assert [records for _, records in pool.batches] == [[0], [1, 2, 3, 4, 5]]
+
+
+def test_full_queue_rejects_requests():
+    pool = RecordingPool(max_workers=1, delay=0.05)
+    scheduler = InferenceScheduler(pool, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+
+    async def predict():
+        results = await asyncio.gather(
+            *(scheduler.submit(MODEL_A, {"x": x}) for x in range(3)), return_exceptions=True
+        )
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(predict())
+
+    assert results[:2] == [(0, 1.0), (1, 1.0)]
+    assert isinstance(results[2], SchedulerOverloadedError)
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabase
+from database.crud import (
+    MODEL_KEY_COLUMNS, MODEL_KEY_PARSERS, SCENARIO_KEY_PARSERS, _page, decode_cursor, encode_cursor, get_models
+)
+from database.metadata_cache import MetadataCache, models_key, scenarios_key
+
+SCENARIO_ID = str(uuid.UUID(int=1000))
+
+
+def _raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.fixture
+def db():
+    """FakeSupabase with 25 models of SCENARIO_ID, three per creation time."""
+    db = FakeSupabase(latency_seconds=0, jitter_seconds=0)
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(25):
+        model_id = str(uuid.UUID(int=index + 1))
+        db.tables.setdefault("ml_models", []).append({
+            "model_id": model_id, "model_name": f"model-{index}", "model_state": "inactive",
+            "created_at": (created + timedelta(days=index // 3)).isoformat(),
+        })
+        db.tables.setdefault("scenario_models", []).append({
+            "scenario_id": SCENARIO_ID, "model_id": model_id, "is_active": False, "activated_on": None,
+        })
+    return db
+
+
+def test_model_cursor_round_trip():
+    created_at = datetime(2024, 3, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+    model_id = uuid.uuid4()
+
+    values = decode_cursor(encode_cursor([created_at.isoformat(), str(model_id)]), MODEL_KEY_PARSERS)
+
+    assert values == [created_at, model_id]
+
+
+def test_scenario_cursor_round_trip():
+    scenario_id = uuid.uuid4()
+
+    assert decode_cursor(encode_cursor([str(scenario_id)]), SCENARIO_KEY_PARSERS) == [scenario_id]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !",
+    _raw_cursor({"created_at": "2024-01-01T00:00:00+00:00"}),
+    _raw_cursor(["2024-01-01T00:00:00+00:00"]),
+    _raw_cursor(["2024-01-01T00:00:00+00:00", 1]),
+    _raw_cursor(["yesterday", str(uuid.UUID(int=1))]),
+    # Without an offset the database would read the timestamp in its session time zone
+    _raw_cursor(["2024-01-01T00:00:00", str(uuid.UUID(int=1))]),
+    _raw_cursor(["2024-01-01T00:00:00+00:00", "1"]),
+    # Filter syntax smuggled into either value
+    _raw_cursor(['2024-01-01T00:00:00+00:00",model_id.gt."0', str(uuid.UUID(int=1))]),
+    _raw_cursor(["2024-01-01T00:00:00+00:00", "0),model_id.gt.(0"]),
+])
+def test_invalid_model_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, MODEL_KEY_PARSERS)
+
+
+def test_page_cuts_extra_row_into_cursor():
+    rows = [{"model_id": str(uuid.UUID(int=index)), "created_at": f"2024-01-0{index}T00:00:00+00:00",
+             "model_name": f"model-{index}"} for index in range(1, 4)]
+
+    page = _page(rows, 2, ["model_name"], MODEL_KEY_COLUMNS)
+
+    assert page.rows == [{"model_name": "model-1"}, {"model_name": "model-2"}]
+    assert decode_cursor(page.next_cursor, MODEL_KEY_PARSERS) == [
+        datetime(2024, 1, 2, tzinfo=timezone.utc), uuid.UUID(int=2),
+    ]
+
+
+def test_last_page_has_no_cursor():
+    rows = [{"model_id": str(uuid.UUID(int=1)), "created_at": "2024-01-01T00:00:00+00:00"}]
+
+    assert _page(rows, 2, ["model_id"], MODEL_KEY_COLUMNS).next_cursor is None
+
+
+def test_model_pages_cover_every_model_once(db, monkeypatch):
+    monkeypatch.setenv("METADATA_CACHE", "false")
+
+    async def walk():
+        rows, cursor, pages = [], None, 0
+        while True:
+            page = await get_models(SCENARIO_ID, db, limit=10, cursor=cursor, fields=["model_id", "created_at"])
+            rows.extend(page.rows)
+            pages += 1
+            cursor = page.next_cursor
+            if cursor is None:
+                return rows, pages
+
+    rows, pages = asyncio.run(walk())
+
+    assert pages == 3
+    assert len({row["model_id"] for row in rows}) == 25
+    assert rows == sorted(rows, key=lambda row: (row["created_at"], row["model_id"]), reverse=True)
+
+
+def test_metadata_cache_coalesces_loads():
+    cache = MetadataCache(ttl_seconds=60)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [{"scenario_id": SCENARIO_ID}]
+
+    async def lookups():
+        return await asyncio.gather(*(cache.get_or_load(scenarios_key(), load) for _ in range(10)))
+
+    results = asyncio.run(lookups())
+
+    assert len(calls) == 1
+    assert all(result == [{"scenario_id": SCENARIO_ID}] for result in results)
+
+
+def test_load_in_flight_during_invalidation_is_not_cached():
+    cache = MetadataCache(ttl_seconds=60)
+    key = models_key(SCENARIO_ID)
+    versions = iter(["before", "after"])
+    started = None
+
+    async def load():
+        started.set()
+        await asyncio.sleep(0.01)
+        return next(versions)
+
+    async def scenario():
+        nonlocal started
+        started = asyncio.Event()
+        first = asyncio.create_task(cache.get_or_load(key, load))
+        await started.wait()
+        cache.invalidate(SCENARIO_ID)
+        return await first, await cache.get_or_load(key, load), await cache.get_or_load(key, load)
+
+    first, second, third = asyncio.run(scenario())
+
+    # The slow load still answers its caller, but the next lookup queries again
+    assert (first, second, third) == ("before", "after", "after")
+    assert cache.lookup(key) == (True, "after")
+
+
+def test_invalidation_keeps_other_scenarios():
+    cache = MetadataCache(ttl_seconds=60)
+    other = str(uuid.UUID(int=2000))
+
+    async def fill():
+        for scenario_id in (SCENARIO_ID, other):
+            await cache.get_or_load(models_key(scenario_id), lambda: asyncio.sleep(0, result=scenario_id))
+
+    asyncio.run(fill())
+    cache.invalidate(SCENARIO_ID)
+
+    assert cache.lookup(models_key(SCENARIO_ID)) == (False, None)
+    assert cache.lookup(models_key(other)) == (True, other)
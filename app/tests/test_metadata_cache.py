@@ -0,0 +1,143 @@
+import time
+import asyncio
+
+import pytest
+
+from database.crud import _cached, invalidate_metadata
+from database.metadata_cache import (
+    ActivationStamps, MetadataCache, active_model_key, get_activation_stamps, get_metadata_cache, models_key,
+    scenario_key, scenarios_key
+)
+
+
+def _load(value):
+    async def load():
+        return value
+    return load
+
+
+def test_entries_expire_after_the_ttl():
+    cache = MetadataCache(ttl_seconds=0.01)
+    asyncio.run(cache.get_or_load(scenarios_key(), _load(["scenario"])))
+
+    assert cache.lookup(scenarios_key()) == (True, ["scenario"])
+    time.sleep(0.02)
+    assert cache.lookup(scenarios_key()) == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = MetadataCache(max_entries=2)
+
+    async def fill():
+        await cache.get_or_load(scenario_key("a"), _load("a"))
+        await cache.get_or_load(scenario_key("b"), _load("b"))
+        await cache.get_or_load(scenario_key("a"), _load("unused"))
+        await cache.get_or_load(scenario_key("c"), _load("c"))
+
+    asyncio.run(fill())
+
+    assert cache.lookup(scenario_key("b")) == (False, None)
+    assert cache.lookup(scenario_key("a")) == (True, "a")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_callers_get_copies():
+    cache = MetadataCache()
+    first = asyncio.run(cache.get_or_load(models_key("a"), _load([{"model_id": "m1"}])))
+
+    first.append({"model_id": "changed"})
+
+    assert cache.lookup(models_key("a")) == (True, [{"model_id": "m1"}])
+
+
+def test_failed_loads_are_not_cached():
+    cache = MetadataCache()
+
+    async def fail():
+        raise ConnectionError("database unavailable")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(cache.get_or_load(scenario_key("a"), fail))
+
+    assert cache.lookup(scenario_key("a")) == (False, None)
+    assert asyncio.run(cache.get_or_load(scenario_key("a"), _load("a"))) == "a"
+
+
+def test_invalidating_a_scenario_drops_the_scenario_list():
+    cache = MetadataCache()
+
+    async def fill():
+        for key in (scenarios_key(), scenario_key("a"), models_key("a", 10), scenario_key("b")):
+            await cache.get_or_load(key, _load(key))
+
+    asyncio.run(fill())
+    cache.invalidate("a")
+
+    assert [cache.lookup(key)[0] for key in (scenarios_key(), scenario_key("a"), models_key("a", 10))] == [
+        False, False, False,
+    ]
+    assert cache.lookup(scenario_key("b"))[0]
+    cache.invalidate()
+    assert not cache.lookup(scenario_key("b"))[0]
+
+
+def test_etag_ignores_the_key_order():
+    assert MetadataCache.etag({"a": 1, "b": [2]}) == MetadataCache.etag({"b": [2], "a": 1})
+    assert MetadataCache.etag({"a": 1}) != MetadataCache.etag({"a": 2})
+
+
+def test_stamps_are_shared_by_the_workers_of_a_host(tmp_path):
+    worker, other_worker = ActivationStamps(str(tmp_path)), ActivationStamps(str(tmp_path))
+
+    assert other_worker.changed("a")
+    assert not other_worker.changed("a")
+    worker.bump("a")
+
+    assert not worker.changed("a")
+    assert other_worker.changed("a")
+    assert not other_worker.changed("a")
+
+
+def test_activation_on_another_worker_invalidates_the_active_model():
+    # Stands in for the stamps of another worker process on the same host
+    other_worker = ActivationStamps(get_activation_stamps().directory)
+    active = iter(["model-1", "model-2"])
+
+    async def load():
+        return next(active)
+
+    async def lookups():
+        first = await _cached(active_model_key("activated"), load)
+        cached = await _cached(active_model_key("activated"), load)
+        other_worker.bump("activated")
+        return first, cached, await _cached(active_model_key("activated"), load)
+
+    assert asyncio.run(lookups()) == ("model-1", "model-1", "model-2")
+
+
+def test_disabled_cache_is_not_consulted(monkeypatch):
+    monkeypatch.setenv("METADATA_CACHE", "false")
+    lookups = get_metadata_cache().stats()["misses"] + get_metadata_cache().stats()["hits"]
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return "model-1"
+
+    async def predictions():
+        return [await _cached(active_model_key("uncached"), load) for _ in range(3)]
+
+    assert asyncio.run(predictions()) == ["model-1"] * 3
+    assert len(calls) == 3
+    stats = get_metadata_cache().stats()
+    assert stats["misses"] + stats["hits"] == lookups
+
+
+def test_local_invalidation_stamps_the_scenario():
+    other_worker = ActivationStamps(get_activation_stamps().directory)
+    other_worker.changed("uploaded")
+
+    invalidate_metadata("uploaded")
+
+    assert other_worker.changed("uploaded")
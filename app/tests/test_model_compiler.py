@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.neighbors import KNeighborsClassifier
+
+from benchmarks.run import synthetic_records
+from utility.feature_encoder import FeatureEncoder
+from utility.model_compiler import PARITY_TOLERANCE, compile_model, parity_records
+from utility.model_trainer import build_pipeline
+
+
+def _fit(classifier):
+    frame = pd.DataFrame(synthetic_records(500, seed=0))
+    labels = (frame["fields_filled_percentage"] + 10 * frame["previous_year_filing"] > 55).astype(int)
+    return build_pipeline(random_state=0, classifier=classifier).fit(frame, labels)
+
+
+@pytest.mark.parametrize("classifier", [
+    None,
+    SGDClassifier(loss="log_loss", random_state=0),
+    RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0),
+    GradientBoostingClassifier(n_estimators=20, max_depth=2, random_state=0),
+], ids=["logistic_regression", "sgd", "random_forest", "gradient_boosting"])
+def test_compiled_model_matches_pipeline(classifier):
+    model = _fit(classifier)
+
+    compiled = compile_model(model, FeatureEncoder.compile(model))
+
+    assert compiled is not None
+    records = parity_records(rows=200, seed=1)
+    expected = model.predict(pd.DataFrame(records))
+    np.testing.assert_allclose(compiled.predict(records), expected, rtol=0, atol=PARITY_TOLERANCE)
+
+
+def test_unsupported_model_is_not_compiled():
+    model = _fit(KNeighborsClassifier())
+
+    assert compile_model(model, FeatureEncoder.compile(model)) is None
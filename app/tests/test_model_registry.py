@@ -0,0 +1,55 @@
+import pytest
+
+from utility.model_registry import ModelRegistry, RegisteredModel
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Fresh registry with a budget of three 100 byte models."""
+    monkeypatch.setattr(ModelRegistry, "_instance", None)
+    registry = ModelRegistry()
+    registry.max_bytes = 300
+    return registry
+
+
+def _model(scenario_id, model_id, size_bytes=100):
+    return RegisteredModel(scenario_id=scenario_id, model_id=model_id, model=None, encoder=None,
+                           size_bytes=size_bytes)
+
+
+def _resident(registry):
+    return [model_id for _, model_id in registry._entries]
+
+
+def test_inactive_models_are_evicted_before_active_ones(registry):
+    registry.put(_model("s1", "a"))
+    registry.put(_model("s1", "b"), activate=False)
+    registry.put(_model("s2", "c"))
+
+    registry.put(_model("s3", "d"))
+
+    # a is colder but active
+    assert _resident(registry) == ["a", "c", "d"]
+    assert registry.resident_bytes() == 300
+
+
+def test_least_recently_used_active_model_is_evicted_last(registry):
+    for scenario_id, model_id in (("s1", "a"), ("s2", "b"), ("s3", "c")):
+        registry.put(_model(scenario_id, model_id))
+    registry.get("s1", "a")
+
+    registry.put(_model("s4", "d"))
+
+    assert _resident(registry) == ["c", "a", "d"]
+    # The scenario still points at its evicted model, which is reloaded on demand
+    assert registry.active_model_id("s2") == "b"
+    assert registry.get_active("s2") is None
+
+
+def test_model_over_the_budget_stays_resident(registry):
+    registry.put(_model("s1", "a"))
+
+    registry.put(_model("s2", "large", size_bytes=500))
+
+    assert _resident(registry) == ["large"]
+    assert registry._evictions == 1
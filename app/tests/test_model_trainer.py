@@ -0,0 +1,69 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.run import synthetic_records
+from models.models import PerformanceMetrics
+from utility.feature_encoder import NUMERIC_FEATURES
+from utility.model_trainer import iter_training_chunks, train_model_incremental
+
+
+@pytest.fixture(scope="module")
+def training_csv(tmp_path_factory):
+    """Training CSV of 1000 applicants whose completion follows fields_filled_percentage."""
+    frame = pd.DataFrame(synthetic_records(1000, seed=0))
+    frame["completed_filing"] = (frame["fields_filled_percentage"] + 10 * frame["previous_year_filing"] > 55)
+    path = tmp_path_factory.mktemp("training") / "training.csv"
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def _train(training_csv, tmp_path, **kwargs):
+    model_path = tmp_path / "model.pkl"
+    metrics = train_model_incremental(training_csv, str(model_path), **kwargs)
+    with open(model_path, 'rb') as model_file:
+        return pickle.load(model_file), metrics
+
+
+def _training_rows(training_csv):
+    chunks = [features[~holdout] for features, _, holdout in iter_training_chunks(training_csv, 1000)]
+    return pd.concat(chunks)
+
+
+def test_scaler_is_fitted_on_every_chunk(training_csv, tmp_path):
+    pipeline, _ = _train(training_csv, tmp_path, chunk_rows=100)
+
+    scaler = pipeline.named_steps['preprocessor'].named_transformers_['numeric']
+    train_x = _training_rows(training_csv)[NUMERIC_FEATURES]
+    np.testing.assert_allclose(scaler.mean_, train_x.mean().to_numpy())
+    np.testing.assert_allclose(scaler.var_, train_x.var(ddof=0).to_numpy())
+    assert scaler.n_samples_seen_ == len(train_x)
+
+
+@pytest.mark.parametrize("epochs", [1, 3])
+def test_classifier_is_updated_with_every_training_row(training_csv, tmp_path, epochs):
+    pipeline, metrics = _train(training_csv, tmp_path, chunk_rows=100, epochs=epochs)
+
+    classifier = pipeline.named_steps['classifier']
+    assert classifier.t_ == epochs * len(_training_rows(training_csv)) + 1
+    assert metrics[PerformanceMetrics.ACCURACY.value] > 0.8
+
+
+def test_chunk_size_does_not_change_the_split(training_csv, tmp_path):
+    small, _ = _train(training_csv, tmp_path, chunk_rows=64)
+    large, _ = _train(training_csv, tmp_path, chunk_rows=1000)
+
+    scalers = [model.named_steps['preprocessor'].named_transformers_['numeric'] for model in (small, large)]
+    np.testing.assert_allclose(scalers[0].mean_, scalers[1].mean_)
+    assert scalers[0].n_samples_seen_ == scalers[1].n_samples_seen_
+
+
+def test_single_class_data_is_rejected(tmp_path):
+    frame = pd.DataFrame(synthetic_records(50, seed=1))
+    frame["completed_filing"] = True
+    frame.to_csv(tmp_path / "training.csv", index=False)
+
+    with pytest.raises(ValueError):
+        train_model_incremental(str(tmp_path / "training.csv"), str(tmp_path / "model.pkl"), chunk_rows=10)
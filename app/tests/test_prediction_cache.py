@@ -0,0 +1,101 @@
+import io
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.run import synthetic_records, train_model
+from utility.model_loader import ModelLoader
+from utility.prediction_cache import PredictionCache, get_prediction_cache
+
+MODEL = SimpleNamespace(scenario_id="scenario", model_id="model", version=1)
+RECORD = {"age": 35, "income": 52000.0}
+
+
+def test_record_order_does_not_change_the_key():
+    reordered = dict(reversed(list(RECORD.items())))
+
+    assert PredictionCache.key(MODEL, RECORD) == PredictionCache.key(MODEL, reordered)
+    assert PredictionCache.key(MODEL, RECORD) != PredictionCache.key(
+        SimpleNamespace(scenario_id="scenario", model_id="model", version=2), RECORD
+    )
+
+
+def test_entries_expire_after_the_ttl():
+    cache = PredictionCache(ttl_seconds=0.01)
+    key = PredictionCache.key(MODEL, RECORD)
+    cache.store(key, (1, 0.9))
+
+    assert cache.lookup(key) == (1, 0.9)
+    time.sleep(0.02)
+    assert cache.lookup(key) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2, ttl_seconds=None)
+    keys = [PredictionCache.key(MODEL, {"age": age}) for age in range(3)]
+    cache.store(keys[0], (0, 0.5))
+    cache.store(keys[1], (1, 0.5))
+
+    cache.lookup(keys[0])
+    cache.store(keys[2], (2, 0.5))
+
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[0]) == (0, 0.5) and cache.lookup(keys[2]) == (2, 0.5)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_lookups_share_one_computation():
+    cache = PredictionCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return (1, 0.75)
+
+    async def lookups():
+        return await asyncio.gather(*(cache.get_or_compute(MODEL, RECORD, compute) for _ in range(10)))
+
+    results = asyncio.run(lookups())
+
+    assert results == [(1, 0.75)] * 10
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 9
+    assert asyncio.run(cache.get_or_compute(MODEL, RECORD, compute)) == (1, 0.75)
+    assert len(calls) == 1
+
+
+def test_failures_are_not_cached():
+    cache = PredictionCache()
+
+    async def fail():
+        raise RuntimeError("model failed")
+
+    async def succeed():
+        return (0, 0.6)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute(MODEL, RECORD, fail))
+    assert asyncio.run(cache.get_or_compute(MODEL, RECORD, succeed)) == (0, 0.6)
+
+
+def test_activating_a_model_drops_the_predictions_of_its_scenario():
+    blob = train_model(synthetic_records(300, seed=0), seed=0)
+    loader = ModelLoader()
+    first, second, other = (
+        loader.build_candidate(io.BytesIO(blob), scenario_id, model_id)
+        for scenario_id, model_id in (("cached", "model-1"), ("cached", "model-2"), ("kept", "model-3"))
+    )
+    cache = get_prediction_cache()
+    loader.publish(first)
+    loader.publish(other)
+    cache.store(PredictionCache.key(first, RECORD), (1, 0.9))
+    cache.store(PredictionCache.key(other, RECORD), (0, 0.8))
+
+    loader.publish(second)
+
+    assert cache.lookup(PredictionCache.key(first, RECORD)) is None
+    assert cache.lookup(PredictionCache.key(other, RECORD)) == (0, 0.8)
@@ -0,0 +1,95 @@
+import os
+import json
+import asyncio
+
+from benchmarks.fake_supabase import FakeSupabase
+from database import prediction_writer
+from database.prediction_writer import PredictionWriter
+
+
+class FlakyDB(FakeSupabase):
+    """FakeSupabase whose queries fail while down is set."""
+
+    def __init__(self):
+        super().__init__(latency_seconds=0, jitter_seconds=0)
+        self.down = False
+
+    def run(self, query):
+        if self.down:
+            raise ConnectionError("database unavailable")
+        return super().run(query)
+
+
+def _written(db):
+    return sorted(row["confidence"] for row in db.tables.get("prediction_responses", []))
+
+
+def _spilled(path):
+    with open(path) as spill_file:
+        return [json.loads(line)["confidence"] for line in spill_file]
+
+
+def _writer(tmp_path, **kwargs):
+    return PredictionWriter(flush_size=2, flush_interval=0.01, spill_path=str(tmp_path / "spill.jsonl"), **kwargs)
+
+
+def test_failed_flushes_are_spilled_and_replayed(tmp_path):
+    db = FlakyDB()
+    writer = _writer(tmp_path)
+
+    async def outage():
+        writer.start(db)
+        db.down = True
+        for confidence in (0.1, 0.2, 0.3):
+            writer.submit("scenario", "model", 1, confidence)
+        await asyncio.sleep(0.1)
+        spilled = _spilled(writer.spill_path)
+        db.down = False
+        writer.submit("scenario", "model", 1, 0.4)
+        await writer.stop()
+        return spilled
+
+    spilled = asyncio.run(outage())
+
+    assert sorted(spilled) == [0.1, 0.2, 0.3]
+    # Every prediction is written once, the spill file is gone after the replay
+    assert _written(db) == [0.1, 0.2, 0.3, 0.4]
+    assert writer.stats()["replayed"] == 3
+    assert not os.listdir(tmp_path)
+
+
+def test_spills_of_stopped_processes_are_adopted(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_writer, "_process_alive", lambda pid: pid != 1000001)
+    for pid, confidence in ((1000001, 0.5), (1000002, 0.6)):
+        with open(tmp_path / f"spill.{pid}.jsonl", 'w') as spill_file:
+            spill_file.write(json.dumps({"prediction_id": str(pid), "confidence": confidence}) + "\n")
+    db = FlakyDB()
+    writer = _writer(tmp_path)
+
+    async def restart():
+        writer.start(db)
+        await writer.stop()
+
+    asyncio.run(restart())
+
+    assert _written(db) == [0.5]
+    # The spill file of the running process is left to that process
+    assert os.listdir(tmp_path) == ["spill.1000002.jsonl"]
+
+
+def test_queue_overflow_is_spilled_and_replayed(tmp_path):
+    db = FlakyDB()
+    writer = _writer(tmp_path, max_queue_size=2)
+
+    async def burst():
+        writer.start(db)
+        for confidence in (0.1, 0.2, 0.3, 0.4, 0.5):
+            writer.submit("scenario", "model", 1, confidence)
+        await writer.stop()
+
+    asyncio.run(burst())
+
+    # Two records fit in the queue, two in the overflow buffer, which is bounded like the queue
+    stats = writer.stats()
+    assert (stats["spilled"], stats["replayed"], stats["dropped"]) == (2, 2, 1)
+    assert _written(db) == [0.1, 0.2, 0.3, 0.4]
@@ -0,0 +1,109 @@
+import os
+import json
+import shutil
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.run import synthetic_records
+from database.crud import download_columnar_dataset
+from utility.training_dataset import (
+    FORMAT_VERSION, MANIFEST_NAME, ColumnarDataset, DatasetCache, clean_training_frame, convert_csv
+)
+
+COLUMNAR_PREFIX = "data-1/columnar"
+
+
+def _applicants(count=20, **overrides):
+    frame = pd.DataFrame(synthetic_records(count, seed=0))
+    frame["completed_filing"] = np.arange(count) % 2 == 0
+    for column, values in overrides.items():
+        frame[column] = values
+    return frame
+
+
+def _write_manifest(directory, **changes):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest.update(changes)
+    with open(path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+@pytest.fixture
+def converted(tmp_path):
+    """Directory of a converted CSV of 20 applicants, converted from a CSV with hash 'csv-hash'."""
+    _applicants().to_csv(tmp_path / "training.csv", index=False)
+    directory = tmp_path / "converted"
+    directory.mkdir()
+    convert_csv(str(tmp_path / "training.csv"), str(directory), chunk_rows=7, source_sha256="csv-hash")
+    return str(directory)
+
+
+def test_rows_with_unknown_categories_are_dropped():
+    frame = _applicants(4, employment_type=["Full_Time", "astronaut", "retired", "part_time"],
+                        device_type=["mobile", "mobile", "watch", "tablet"])
+
+    features, labels = clean_training_frame(frame)
+
+    assert features.index.tolist() == [0, 3]
+    assert features["employment_type"].tolist() == ["full_time", "part_time"]
+    assert labels.tolist() == [1, 0]
+
+
+def test_converted_dataset_decodes_the_cleaned_rows(tmp_path):
+    frame = _applicants(employment_type=["astronaut"] + ["retired"] * 19)
+    frame.to_csv(tmp_path / "training.csv", index=False)
+    expected_features, expected_labels = clean_training_frame(frame.astype(str))
+
+    convert_csv(str(tmp_path / "training.csv"), str(tmp_path), chunk_rows=7)
+    features, labels = ColumnarDataset(str(tmp_path)).frame()
+
+    assert len(labels) == 19
+    assert labels.tolist() == expected_labels.tolist()
+    assert features["employment_type"].tolist() == ["retired"] * 19
+    np.testing.assert_allclose(features["income"], expected_features["income"])
+
+
+def test_dataset_of_an_older_format_is_stale(converted, tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"), max_bytes=1024 ** 2)
+    build_dir = cache.new_directory()
+    shutil.copytree(converted, build_dir, dirs_exist_ok=True)
+    path = cache.put("data-1", build_dir)
+
+    assert cache.get_path("data-1", "csv-hash") == path
+    assert cache.get_path("data-1", "other-hash") is None
+
+    _write_manifest(path, format_version=FORMAT_VERSION - 1)
+
+    assert cache.get_path("data-1", "csv-hash") is None
+    with pytest.raises(ValueError):
+        ColumnarDataset(path)
+
+
+@pytest.mark.parametrize("changes, downloaded", [
+    ({}, True),
+    ({"format_version": FORMAT_VERSION - 1}, False),
+    ({"source_sha256": "other-hash"}, False),
+])
+def test_stale_columnar_download_is_refused(converted, tmp_path, changes, downloaded):
+    _write_manifest(converted, **changes)
+    db = FakeSupabase()
+    bucket = db.buckets.setdefault("training-data", {})
+    for name in os.listdir(converted):
+        with open(os.path.join(converted, name), 'rb') as dataset_file:
+            bucket[f"{COLUMNAR_PREFIX}/{name}"] = dataset_file.read()
+    training_data = {
+        "model_training_data_id": "data-1", "sha256": "csv-hash",
+        "columnar_url": f"/storage/v1/object/public/training-data/{COLUMNAR_PREFIX}",
+    }
+    destination = tmp_path / "download"
+    destination.mkdir()
+
+    assert asyncio.run(download_columnar_dataset(training_data, str(destination), db)) is downloaded
+    if downloaded:
+        assert ColumnarDataset(str(destination)).rows == 20
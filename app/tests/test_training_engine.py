@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabase
+from models.models import ModelStatus
+from utility.training_engine import TrainingEngine
+
+
+def test_tune_jobs_default_to_the_training_threads():
+    assert TrainingEngine(threads=4).tune_jobs == 4
+    assert TrainingEngine(threads=4, tune_jobs=2).tune_jobs == 2
+
+
+@pytest.mark.parametrize("tune_jobs", [-1, 0, 5])
+def test_tune_jobs_outside_the_training_threads_are_rejected(tune_jobs):
+    with pytest.raises(ValueError):
+        TrainingEngine(threads=4, tune_jobs=tune_jobs)
+
+
+def test_job_cancelled_while_queued_is_recorded_as_failed():
+    db = FakeSupabase(latency_seconds=0.05, jitter_seconds=0)
+
+    async def cancel_during_first_save():
+        job = TrainingEngine().submit("scenario", {"model_training_data_id": "data"}, db)
+        await asyncio.sleep(0.01)
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+        return job
+
+    job = asyncio.run(cancel_during_first_save())
+
+    assert job.status == ModelStatus.FAILES and job.finished
+    assert [row["status"] for row in db.tables["training_jobs"]] == [ModelStatus.FAILES.value]
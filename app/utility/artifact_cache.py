@@ -0,0 +1,208 @@
+import os
+import mmap
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+
+
+def sha256_hex(data: bytes) -> str:
+    """Returns the hex encoded SHA-256 digest of data."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ArtifactCache:
+    """Local content-addressed cache of model artifacts with LRU eviction.
+
+    Artifacts are stored as <model_id>.<sha256>.pkl. Model IDs are assigned once per
+    upload, so an artifact never changes for a given model_id and a cached copy can be
+    served without asking the database or the storage. The hash in the file name is
+    checked on every read, through a memory map so the artifact is never copied into
+    memory, and corrupted files are dropped. The least recently used
+    files are evicted once the directory grows above max_bytes.
+    """
+
+    SUFFIX = ".pkl"
+    COPY_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, model_id: str, sha256: str) -> str:
+        return os.path.join(self.directory, f"{model_id}.{sha256}{self.SUFFIX}")
+
+    def _find(self, model_id: str) -> Optional[Tuple[str, str]]:
+        """Returns (path, sha256) of the cached artifact of a model, if any."""
+        prefix = f"{model_id}."
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(self.SUFFIX):
+                return os.path.join(self.directory, name), name[len(prefix):-len(self.SUFFIX)]
+        return None
+
+    def open(self, model_id: str, expected_sha256: Optional[str] = None) -> Optional[BinaryIO]:
+        """Opens a cached artifact after verifying its content hash.
+
+        The file is opened while holding the lock, so a concurrent put evicting it
+        cannot remove it between the lookup and the read: the returned handle keeps
+        reading the removed file.
+
+        Args:
+            model_id: ID of the model
+            expected_sha256: Hash recorded in the database, if known
+
+        Returns:
+            Open artifact positioned at its start, to be closed by the caller,
+            None on a miss or if the cached file is corrupted
+        """
+        with self._lock:
+            found = self._find(model_id)
+            if found is None or (expected_sha256 and found[1] != expected_sha256):
+                self._misses += 1
+                return None
+            path, sha256 = found
+            artifact_file = None
+            try:
+                artifact_file = open(path, 'rb')
+                with mmap.mmap(artifact_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    valid = hashlib.sha256(mapped).hexdigest() == sha256
+            except (OSError, ValueError) as e:
+                # ValueError is raised for empty files, which cannot be mapped
+                logging.error(f"Failed to read cached artifact {path}: {e}")
+                valid = False
+
+            if not valid:
+                if artifact_file is not None:
+                    artifact_file.close()
+                logging.error(f"Cached artifact of model {model_id} failed the hash check, removing it")
+                self._remove(path)
+                self._misses += 1
+                return None
+
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+            self._hits += 1
+            artifact_file.seek(0)
+            return artifact_file
+
+    def contains(self, model_id: str) -> bool:
+        """Returns True if an artifact of the model is cached, without verifying it."""
+        with self._lock:
+            return self._find(model_id) is not None
+
+    def put(self, model_id: str, data: bytes, sha256: Optional[str] = None) -> str:
+        """Stores an artifact in the cache.
+
+        Args:
+            model_id: ID of the model
+            data: Artifact bytes
+            sha256: Hash of data if already computed
+
+        Returns:
+            The content hash of the artifact
+        """
+        sha256 = sha256 or sha256_hex(data)
+        self._store(model_id, sha256, lambda tmp_file: tmp_file.write(data))
+        return sha256
+
+    def put_file(self, model_id: str, source: BinaryIO, sha256: str) -> None:
+        """Stores an artifact by copying it from a file object in chunks.
+
+        Args:
+            model_id: ID of the model
+            source: Seekable binary file holding the artifact, copied from the start
+            sha256: Hash of the artifact
+        """
+        def copy(tmp_file: BinaryIO) -> None:
+            source.seek(0)
+            shutil.copyfileobj(source, tmp_file, self.COPY_CHUNK_SIZE)
+
+        self._store(model_id, sha256, copy)
+
+    def _store(self, model_id: str, sha256: str, write: Callable[[BinaryIO], Any]) -> None:
+        """Writes an artifact under its content hash and evicts cold artifacts."""
+        with self._lock:
+            found = self._find(model_id)
+            if found is not None and found[1] != sha256:
+                self._remove(found[0])
+            path = self._path(model_id, sha256)
+            if not os.path.exists(path):
+                # Write to a temporary file first so readers never see partial artifacts
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, 'wb') as tmp_file:
+                        write(tmp_file)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logging.error(f"Failed to cache artifact of model {model_id}: {e}")
+                    self._remove(tmp_path)
+                    return
+            self._evict(keep=path)
+
+    def _entries(self):
+        """Returns (mtime, size, path) of every cached artifact, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, keep: str) -> None:
+        """Removes least recently used artifacts until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+            self._evictions += 1
+            logging.info(f"Evicted cached artifact {os.path.basename(path)}")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            entries = self._entries()
+            return {
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "cached_bytes": sum(size for _, size, _ in entries),
+                "cached_artifacts": len(entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+@lru_cache()
+def get_artifact_cache() -> ArtifactCache:
+    """Returns the process-wide model artifact cache configured from the environment."""
+    return ArtifactCache(
+        directory=os.environ.get(
+            "MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ml_pipeline_model_cache")
+        ),
+        max_bytes=int(os.environ.get("MODEL_CACHE_MAX_BYTES", str(5 * 1024 ** 3))),
+    )
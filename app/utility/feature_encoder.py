@@ -0,0 +1,162 @@
+# feature_encoder.py
+import logging
+import threading
+import warnings
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.models import CATEGORICAL_VOCABULARIES
+
+# Default column order expected by the model pipelines (raw categorical values first)
+CATEGORICAL_FEATURES = ['employment_type', 'marital_status', 'device_type', 'referral_source']
+NUMERIC_FEATURES = [
+    'age', 'income', 'time_spent_on_platform', 'number_of_sessions',
+    'fields_filled_percentage', 'previous_year_filing'
+]
+DEFAULT_COLUMNS = CATEGORICAL_FEATURES + NUMERIC_FEATURES
+
+# Warning of models fitted on DataFrames on every call with the NumPy fast path input
+FEATURE_NAMES_WARNING = "X does not have valid feature names"
+
+NUMPY_MODE = "numpy"
+PANDAS_MODE = "pandas"
+
+
+class FeatureEncoder:
+    """Encodes validated prediction records into the input layout of a loaded model.
+
+    The encoder is compiled once per model. When every input column of the model is
+    either a numeric feature or a one-hot indicator of a TaxFilingPredictionRequest
+    vocabulary value (e.g. "device_type_mobile"), records are written straight into a
+    preallocated float64 NumPy buffer. Pipelines that consume raw categorical strings
+    (e.g. a ColumnTransformer with a OneHotEncoder) fall back to a columnar DataFrame.
+    """
+
+    def __init__(self, columns: Sequence[str], mode: str,
+                 numeric_plan: Optional[List[Tuple[int, str]]] = None,
+                 one_hot_plan: Optional[Dict[str, Dict[str, int]]] = None):
+        self.columns = list(columns)
+        self.mode = mode
+        self._numeric_plan = numeric_plan or []
+        self._one_hot_plan = one_hot_plan or {}
+        self._buffers = threading.local()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Per-thread buffers are not picklable, they are recreated on first use
+        state = self.__dict__.copy()
+        del state['_buffers']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._buffers = threading.local()
+
+    @classmethod
+    def compile(cls, model: Any) -> 'FeatureEncoder':
+        """Builds an encoder for the column layout the model was fitted with.
+
+        Args:
+            model: Loaded model, ideally exposing sklearn's feature_names_in_
+
+        Returns:
+            FeatureEncoder using the NumPy fast path when the layout allows it.
+        """
+        feature_names = getattr(model, 'feature_names_in_', None)
+        if feature_names is None:
+            logging.info("Model does not expose feature names, using the default pandas layout")
+            return cls(DEFAULT_COLUMNS, PANDAS_MODE)
+
+        columns = [str(name) for name in feature_names]
+        one_hot_columns = {
+            f"{field}_{value}": (field, value)
+            for field, vocabulary in CATEGORICAL_VOCABULARIES.items()
+            for value in vocabulary
+        }
+
+        numeric_plan = []
+        one_hot_plan: Dict[str, Dict[str, int]] = {}
+        for index, column in enumerate(columns):
+            if column in NUMERIC_FEATURES:
+                numeric_plan.append((index, column))
+            elif column in one_hot_columns:
+                field, value = one_hot_columns[column]
+                one_hot_plan.setdefault(field, {})[value] = index
+            else:
+                # Raw categorical (or unknown) column, the pipeline needs a DataFrame
+                logging.info(f"Model column '{column}' requires the pandas input path")
+                return cls(columns, PANDAS_MODE)
+
+        logging.info(f"Compiled NumPy feature encoder for {len(columns)} model columns")
+        return cls(columns, NUMPY_MODE, numeric_plan, one_hot_plan)
+
+    def encode(self, records: List[Dict[str, Any]]) -> Any:
+        """Encodes validated records into model input.
+
+        Args:
+            records: Records already validated by TaxFilingPredictionRequest
+
+        Returns:
+            A float64 array view (NumPy mode) or a DataFrame (pandas mode).
+        """
+        if self.mode == NUMPY_MODE:
+            return self._encode_numpy(records)
+        return self._encode_frame(records)
+
+    def predict(self, model: Any, model_input: Any) -> Any:
+        """Runs model.predict on input produced by encode.
+
+        The feature name warning is only silenced around NumPy mode calls, so it
+        still reaches training and any other code fitting on DataFrames.
+        """
+        if self.mode != NUMPY_MODE:
+            return model.predict(model_input)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message=FEATURE_NAMES_WARNING)
+            return model.predict(model_input)
+
+    def _buffer(self, rows: int) -> np.ndarray:
+        """Returns a zeroed per-thread buffer with room for at least rows rows."""
+        buffer = getattr(self._buffers, 'array', None)
+        if buffer is None or buffer.shape[0] < rows:
+            capacity = max(rows, 2 * buffer.shape[0] if buffer is not None else 1)
+            buffer = np.zeros((capacity, len(self.columns)), dtype=np.float64)
+            self._buffers.array = buffer
+        view = buffer[:rows]
+        view.fill(0.0)
+        return view
+
+    def _encode_numpy(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        """Writes records into the preallocated buffer using the compiled plan."""
+        rows = len(records)
+        view = self._buffer(rows)
+        for index, field in self._numeric_plan:
+            view[:, index] = np.fromiter(
+                (record[field] for record in records), dtype=np.float64, count=rows
+            )
+        row_index = np.arange(rows)
+        for field, lookup in self._one_hot_plan.items():
+            column_index = np.fromiter(
+                (lookup.get(record[field], -1) for record in records), dtype=np.int64, count=rows
+            )
+            # Values without a model column (e.g. dropped reference category) stay all-zero
+            known = column_index >= 0
+            view[row_index[known], column_index[known]] = 1.0
+        return view
+
+    def _encode_frame(self, records: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Builds a columnar DataFrame in the model's column order."""
+        rows = len(records)
+        columns = {}
+        for field in self.columns:
+            if field in NUMERIC_FEATURES:
+                columns[field] = np.fromiter(
+                    (record[field] for record in records), dtype=np.float64, count=rows
+                )
+            else:
+                columns[field] = [record[field] for record in records]
+        return pd.DataFrame(columns, columns=self.columns)
+
+
+DEFAULT_ENCODER = FeatureEncoder(DEFAULT_COLUMNS, PANDAS_MODE)
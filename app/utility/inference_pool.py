@@ -0,0 +1,337 @@
+# inference_pool.py
+import os
+import asyncio
+import logging
+import pickle
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from utility.model_executor import ModelExecutor
+from utility.model_registry import RegisteredModel
+from utility.feature_encoder import FeatureEncoder
+from utility.model_compiler import CompiledModel
+from utility.metrics import INFERENCE_STAGE_SECONDS
+
+THREAD_MODE = "thread"
+PROCESS_MODE = "process"
+INLINE_MODE = "inline"
+
+
+class InferenceTimeoutError(RuntimeError):
+    """Raised when an inference call does not finish within its timeout."""
+
+
+# LRU model cache of a process pool worker: {model_path: (model, encoder)}, no encoder for compiled models
+_worker_models: "OrderedDict[str, Tuple[Any, Optional[FeatureEncoder]]]" = OrderedDict()
+
+
+def _execute_in_worker(model_path: str, records: List[Dict[str, Any]], max_models: int) -> List[Tuple[int, float]]:
+    """Runs batch inference inside a process pool worker.
+
+    The worker unpickles each model published to disk once and keeps at most
+    max_models of them resident. Compiled models are published instead of the
+    original pipeline and take the records directly.
+    """
+    if model_path not in _worker_models:
+        with open(model_path, 'rb') as model_file:
+            model = pickle.load(model_file)
+        encoder = None if isinstance(model, CompiledModel) else FeatureEncoder.compile(model)
+        _worker_models[model_path] = (model, encoder)
+        while len(_worker_models) > max_models:
+            _worker_models.popitem(last=False)
+    _worker_models.move_to_end(model_path)
+    model, encoder = _worker_models[model_path]
+    if encoder is None:
+        prediction_proba = model.predict(records)
+    else:
+        prediction_proba = encoder.predict(model, ModelExecutor._preprocess_data(records, encoder))
+    return [ModelExecutor._to_result(row) for row in prediction_proba]
+
+
+def _warm_worker(model_path: str, records: List[Dict[str, Any]], max_models: int) -> int:
+    """Runs warm-up inference inside a process pool worker and returns its PID."""
+    _execute_in_worker(model_path, records, max_models)
+    return os.getpid()
+
+
+def _worker_ready() -> int:
+    """No-op task used to spawn pool workers and import the inference modules."""
+    return os.getpid()
+
+
+class InferencePool:
+    """Dispatches CPU-bound model inference off the asyncio event loop.
+
+    Modes:
+        thread: ThreadPoolExecutor sharing the models resident in the ModelRegistry
+        process: ProcessPoolExecutor; each registry model is published to a temporary
+            file once, off the event loop, and unpickled lazily by the workers, which
+            keep up to worker_max_models of them resident. A replaced or cold file is
+            only removed once no queued or running task refers to it.
+        inline: run on the event loop (debugging only)
+    """
+
+    def __init__(self, mode: str = THREAD_MODE, max_workers: Optional[int] = None,
+                 timeout_seconds: Optional[float] = None, worker_max_models: int = 4):
+        if mode not in (THREAD_MODE, PROCESS_MODE, INLINE_MODE):
+            raise ValueError(f"Unknown inference executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout_seconds = timeout_seconds
+        self.worker_max_models = worker_max_models
+        self._executor: Optional[Executor] = None
+
+        # Process mode: models published to disk, {(scenario_id, model_id): (entry, path)}
+        self._published: "OrderedDict[Tuple[str, str], Tuple[RegisteredModel, str]]" = OrderedDict()
+        self._published_count = 0
+        self._model_dir = None
+        # Concurrent publications of the same registry entry share one write
+        self._publishing: Dict[Tuple[str, str], Tuple[RegisteredModel, asyncio.Future]] = {}
+        # {path: queued or running tasks reading it}, retired paths are removed once unused
+        self._path_users: Dict[str, int] = {}
+        self._retired: Set[str] = set()
+
+    def _get_executor(self) -> Optional[Executor]:
+        """Creates the underlying executor on first use."""
+        if self._executor is None and self.mode != INLINE_MODE:
+            if self.mode == THREAD_MODE:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="inference"
+                )
+            else:
+                # spawn avoids forking the threads of the web server
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            logging.info(f"Inference pool started in {self.mode} mode with {self.max_workers} workers")
+        return self._executor
+
+    def start(self) -> None:
+        """Creates the executor and, in process mode, spawns and primes every worker.
+
+        Spawning a worker imports pandas and sklearn, which is too slow to happen
+        inside the first requests.
+        """
+        executor = self._get_executor()
+        if self.mode == PROCESS_MODE:
+            pids = {f.result() for f in [executor.submit(_worker_ready) for _ in range(self.max_workers)]}
+            logging.info(f"Inference process workers ready: {sorted(pids)}")
+
+    async def _publish_model(self, loaded_model: RegisteredModel) -> str:
+        """Writes a registry model to disk for process pool workers, in a worker thread.
+
+        Args:
+            loaded_model: Registry entry to publish
+
+        Returns:
+            Path of the pickled model file
+        """
+        published = self._published.get(loaded_model.key)
+        if published is not None and published[0] is loaded_model:
+            self._published.move_to_end(loaded_model.key)
+            return published[1]
+
+        publishing = self._publishing.get(loaded_model.key)
+        if publishing is None or publishing[0] is not loaded_model:
+            future = asyncio.ensure_future(self._write_model(loaded_model))
+            publishing = self._publishing[loaded_model.key] = (loaded_model, future)
+            future.add_done_callback(lambda done: self._publish_done(loaded_model.key, done))
+        # A cancelled caller must not cancel a write other callers are waiting for
+        return await asyncio.shield(publishing[1])
+
+    async def _hold_model(self, loaded_model: RegisteredModel) -> str:
+        """Publishes a model and keeps its file on disk until the hold is released with _release.
+
+        Another publication may remove the file while the caller waits for its own,
+        the model is published again in that case.
+        """
+        while True:
+            path = await self._publish_model(loaded_model)
+            published = self._published.get(loaded_model.key)
+            if (published is not None and published[1] == path) or path in self._retired:
+                self._path_users[path] = self._path_users.get(path, 0) + 1
+                return path
+
+    def _publish_done(self, key: Tuple[str, str], done: asyncio.Future) -> None:
+        if key in self._publishing and self._publishing[key][1] is done:
+            del self._publishing[key]
+
+    async def _write_model(self, loaded_model: RegisteredModel) -> str:
+        if self._model_dir is None:
+            self._model_dir = tempfile.mkdtemp(prefix="inference_models_")
+        self._published_count += 1
+        path = os.path.join(self._model_dir, f"model_{self._published_count}.pkl")
+
+        def write() -> None:
+            with open(path, 'wb') as model_file:
+                # The compiled evaluator is smaller and faster to unpickle than the pipeline
+                pickle.dump(loaded_model.compiled or loaded_model.model, model_file)
+
+        await asyncio.to_thread(write)
+        published = self._published.get(loaded_model.key)
+        if published is not None:
+            self._retire(published[1])
+        self._published[loaded_model.key] = (loaded_model, path)
+        self._published.move_to_end(loaded_model.key)
+        # Files of models that went cold are removed once the limit is exceeded
+        while len(self._published) > 2 * self.worker_max_models:
+            _, (_, stale_path) = self._published.popitem(last=False)
+            self._retire(stale_path)
+        return path
+
+    def _retire(self, path: str) -> None:
+        """Removes a published model file now, or once the last task reading it finished."""
+        if self._path_users.get(path):
+            self._retired.add(path)
+        else:
+            self._remove_file(path)
+
+    def _submit(self, executor: Executor, function: Callable, model_path: str, *args: Any) -> asyncio.Future:
+        """Submits a task reading model_path, which is kept on disk until the task finished.
+
+        The task is tracked on the executor future rather than the awaiting coroutine,
+        a timed out task may still be running in its worker.
+        """
+        loop = asyncio.get_running_loop()
+        self._path_users[model_path] = self._path_users.get(model_path, 0) + 1
+        future = executor.submit(function, model_path, *args)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, model_path))
+        return asyncio.wrap_future(future)
+
+    def _release(self, path: str) -> None:
+        remaining = self._path_users.get(path, 0) - 1
+        if remaining > 0:
+            self._path_users[path] = remaining
+            return
+        self._path_users.pop(path, None)
+        if path in self._retired:
+            self._retired.discard(path)
+            self._remove_file(path)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        """Removes a published model file, ignoring files that are already gone."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def run_batch(self, loaded_model: Optional[RegisteredModel], records: List[Dict[str, Any]],
+                        timeout_seconds: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Runs batch inference on the pool.
+
+        Args:
+            loaded_model: Registry entry of the model to run
+            records: Validated input records
+            timeout_seconds: Per-call timeout, defaults to the pool timeout
+
+        Returns:
+            A list of (prediction, confidence_score) tuples in the same order as records
+
+        Raises:
+            InferenceTimeoutError: If inference does not finish in time
+            RuntimeError: If model execution fails
+        """
+        executor = self._get_executor()
+        if executor is None or loaded_model is None:
+            return ModelExecutor.execute_batch_inference(records, loaded_model)
+
+        if self.mode == THREAD_MODE:
+            future = asyncio.get_running_loop().run_in_executor(executor, ModelExecutor.execute_batch_inference, records, loaded_model)
+        else:
+            model_path = await self._hold_model(loaded_model)
+            try:
+                future = self._submit(executor, _execute_in_worker, model_path, records, self.worker_max_models)
+            finally:
+                self._release(model_path)
+
+        timeout = timeout_seconds if timeout_seconds is not None else self.timeout_seconds
+        # Round trip through the pool, the only stage recorded for process workers
+        with INFERENCE_STAGE_SECONDS.time("inference"):
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise InferenceTimeoutError(f"Inference did not finish within {timeout} seconds")
+            except RuntimeError:
+                raise
+            except Exception as e:
+                # e.g. BrokenProcessPool or errors raised inside a process worker
+                raise RuntimeError(f"Failed to execute inference: {str(e)}")
+
+    async def warm_up(self, loaded_model: RegisteredModel, records: List[Dict[str, Any]],
+                      max_rounds: int = 10) -> int:
+        """Runs warm-up inference on a model in every pool worker.
+
+        In process mode a round submits one task per worker, but an idle worker may
+        pick up several of them, so rounds are repeated until every worker PID has
+        answered or max_rounds is reached. Thread and inline mode share the resident
+        model, one call is enough.
+
+        Returns:
+            Number of workers that ran the warm-up
+
+        Raises:
+            InferenceTimeoutError: If a round does not finish in time
+            RuntimeError: If model execution fails
+        """
+        executor = self._get_executor()
+        if self.mode != PROCESS_MODE or executor is None:
+            await self.run_batch(loaded_model, records)
+            return 1
+
+        model_path = await self._hold_model(loaded_model)
+        try:
+            return await self._warm_up_rounds(loaded_model, model_path, records, max_rounds)
+        finally:
+            self._release(model_path)
+
+    async def _warm_up_rounds(self, loaded_model: RegisteredModel, model_path: str,
+                              records: List[Dict[str, Any]], max_rounds: int) -> int:
+        executor = self._get_executor()
+        warmed = set()
+        for _ in range(max_rounds):
+            tasks = asyncio.gather(*(
+                self._submit(executor, _warm_worker, model_path, records, self.worker_max_models)
+                for _ in range(self.max_workers)
+            ))
+            try:
+                warmed.update(await asyncio.wait_for(tasks, self.timeout_seconds))
+            except asyncio.TimeoutError:
+                raise InferenceTimeoutError(f"Warm-up did not finish within {self.timeout_seconds} seconds")
+            except Exception as e:
+                raise RuntimeError(f"Failed to warm up model {loaded_model.model_id}: {str(e)}")
+            if len(warmed) >= self.max_workers:
+                break
+        if len(warmed) < self.max_workers:
+            logging.warning(
+                f"Model {loaded_model.model_id} warmed up in {len(warmed)} of {self.max_workers} workers"
+            )
+        return len(warmed)
+
+    def shutdown(self) -> None:
+        """Shuts down the executor and removes published model files."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for path in [path for _, path in self._published.values()] + list(self._retired):
+            self._remove_file(path)
+        self._published.clear()
+        self._retired.clear()
+        self._path_users.clear()
+
+
+@lru_cache()
+def get_inference_pool() -> InferencePool:
+    """Returns the process-wide inference pool configured from the environment."""
+    workers = os.environ.get("INFERENCE_WORKERS")
+    timeout = os.environ.get("INFERENCE_TIMEOUT_SECONDS", "10")
+    return InferencePool(
+        mode=os.environ.get("INFERENCE_EXECUTOR", THREAD_MODE).lower(),
+        max_workers=int(workers) if workers else None,
+        timeout_seconds=float(timeout) if float(timeout) > 0 else None,
+        worker_max_models=int(os.environ.get("INFERENCE_WORKER_MAX_MODELS", "4")),
+    )
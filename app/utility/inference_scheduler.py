@@ -0,0 +1,224 @@
+# inference_scheduler.py
+import os
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utility.inference_pool import InferencePool, InferenceTimeoutError, get_inference_pool
+from utility.model_registry import RegisteredModel
+from utility.metrics import INFERENCE_STAGE_SECONDS
+
+# Queue item: (model, record, future, enqueue time)
+QueueItem = Tuple[RegisteredModel, Dict[str, Any], asyncio.Future, float]
+
+
+class SchedulerOverloadedError(RuntimeError):
+    """Raised when the inference queue is full and a request cannot be accepted."""
+
+
+class InferenceScheduler:
+    """Collects concurrent single-row inference requests into micro-batches.
+
+    Requests are queued and picked up by a background worker which waits at most
+    max_wait_ms for more requests to arrive (or until max_batch_size is reached),
+    runs the whole batch through a single vectorized call on the inference pool and
+    fans the results back out to the waiting callers. At most one batch per pool
+    worker is in flight, so requests keep accumulating while all workers are busy.
+    Requests for different scenario models that land in the same micro-batch are
+    split into one vectorized call per model.
+    """
+
+    def __init__(self, pool: InferencePool, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 max_queue_size: int = 1000):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Micro-batches in flight, the event loop only keeps weak references to tasks
+        self._batch_tasks: Set[asyncio.Task] = set()
+
+        # Statistics
+        self._batches = 0
+        self._requests = 0
+        self._max_batch_seen = 0
+        self._total_wait_seconds = 0.0
+        self._batch_size_histogram: Dict[int, int] = {}
+
+    def _ensure_started(self) -> None:
+        """Starts the background worker on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._slots = asyncio.Semaphore(self.pool.max_workers)
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+            logging.info(
+                f"Inference scheduler started (max_batch_size={self.max_batch_size}, "
+                f"max_wait_ms={self.max_wait_ms})"
+            )
+
+    async def submit(self, loaded_model: RegisteredModel, data: Dict[str, Any],
+                     timeout_seconds: Optional[float] = None) -> Tuple[int, float]:
+        """Queues a single validated record and waits for its prediction.
+
+        Args:
+            loaded_model: Registry entry of the model to run
+            data: Dictionary with the fields of TaxFilingPredictionRequest
+            timeout_seconds: Time budget covering queueing and execution,
+                defaults to the inference pool timeout
+
+        Returns:
+            A tuple containing (prediction, confidence_score)
+
+        Raises:
+            SchedulerOverloadedError: If the queue is full
+            InferenceTimeoutError: If the prediction is not ready in time
+            RuntimeError: If model execution fails
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((loaded_model, data, future, self._loop.time()))
+        except asyncio.QueueFull:
+            raise SchedulerOverloadedError(
+                f"Inference queue is full ({self.max_queue_size} pending requests)"
+            )
+        timeout = timeout_seconds if timeout_seconds is not None else self.pool.timeout_seconds
+        try:
+            # A cancelled future is skipped by the worker if it is still queued
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutError(f"Inference did not finish within {timeout} seconds")
+
+    async def stop(self) -> None:
+        """Stops the background worker, failing any requests still queued."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    async def _run(self) -> None:
+        """Worker loop collecting and executing micro-batches."""
+        while True:
+            # Wait for a free pool worker first so the batch can grow in the meantime
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = self._loop.create_task(self._execute(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(lambda _: self._slots.release())
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _collect(self) -> List[QueueItem]:
+        """Collects the next micro-batch from the queue."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _execute(self, batch: List[QueueItem]) -> None:
+        """Runs a micro-batch on the inference pool and resolves the futures of its requests."""
+        # Skip requests whose callers have already gone away
+        batch = [item for item in batch if not item[2].done()]
+        if not batch:
+            return
+
+        now = self._loop.time()
+        self._record_batch(len(batch), sum(now - enqueued for _, _, _, enqueued in batch))
+        for _, _, _, enqueued in batch:
+            INFERENCE_STAGE_SECONDS.observe(now - enqueued, "queue")
+
+        groups: Dict[Tuple[str, str], List[QueueItem]] = {}
+        for item in batch:
+            groups.setdefault(item[0].key, []).append(item)
+        await asyncio.gather(*(self._execute_group(items) for items in groups.values()))
+
+    async def _execute_group(self, items: List[QueueItem]) -> None:
+        """Runs the requests of a micro-batch that target the same model."""
+        try:
+            results = await self.pool.run_batch(items[0][0], [data for _, data, _, _ in items])
+        except Exception as e:
+            for _, _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future, _), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record_batch(self, size: int, wait_seconds: float) -> None:
+        """Updates batch statistics."""
+        self._batches += 1
+        self._requests += size
+        self._total_wait_seconds += wait_seconds
+        self._max_batch_seen = max(self._max_batch_seen, size)
+        self._batch_size_histogram[size] = self._batch_size_histogram.get(size, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth and batch size statistics.
+
+        Returns:
+            Dictionary with current queue depth, batch counts and averages.
+        """
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "executor_mode": self.pool.mode,
+            "executor_workers": self.pool.max_workers,
+            "batches_executed": self._batches,
+            "requests_executed": self._requests,
+            "average_batch_size": self._requests / self._batches if self._batches else 0.0,
+            "largest_batch_size": self._max_batch_seen,
+            "average_queue_wait_ms": (
+                1000.0 * self._total_wait_seconds / self._requests if self._requests else 0.0
+            ),
+            "batch_size_histogram": dict(sorted(self._batch_size_histogram.items())),
+        }
+
+
+def micro_batching_enabled() -> bool:
+    """Returns True if single-row predictions should go through the scheduler."""
+    return os.environ.get("INFERENCE_MICRO_BATCHING", "true").lower() in ("1", "true", "yes")
+
+
+@lru_cache()
+def get_inference_scheduler() -> InferenceScheduler:
+    """Returns the process-wide inference scheduler configured from the environment."""
+    return InferenceScheduler(
+        pool=get_inference_pool(),
+        max_batch_size=int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.environ.get("INFERENCE_MAX_WAIT_MS", "2")),
+        max_queue_size=int(os.environ.get("INFERENCE_MAX_QUEUE_SIZE", "1000")),
+    )
@@ -0,0 +1,188 @@
+# metrics.py
+import os
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Record hot path metrics, the /metrics endpoint answers 404 when disabled
+METRICS_ENABLED = os.environ.get("METRICS", "true").lower() in ("1", "true", "yes")
+
+# Upper bounds in seconds, from sub-millisecond predictions to model loads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds in bytes, 1 KiB to 1 GiB in steps of 4
+SIZE_BUCKETS = tuple(float(1024 * 4 ** exponent) for exponent in range(11))
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets and one series per label combination.
+
+    observe costs a bisect and a short critical section, cumulative bucket counts are
+    only computed when the metrics are rendered.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # {label values: [per bucket counts with a trailing +Inf bucket, sum, count]}
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Records one value for the given label values, in the order of label_names."""
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values: str) -> "Timer":
+        """Context manager observing the duration of its block in seconds."""
+        return Timer(self, label_values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{series_labels} {count}")
+        return lines
+
+
+class Timer:
+    """Observes the wall time spent in a with block, also if the block raises."""
+
+    __slots__ = ("_histogram", "_label_values", "_started")
+
+    def __init__(self, histogram: Histogram, label_values: LabelValues):
+        self._histogram = histogram
+        self._label_values = label_values
+        self._started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, *self._label_values)
+
+
+class Gauge:
+    """Prometheus gauge whose values are read from a callback when the metrics are rendered.
+
+    The callback keeps the hot path free of any bookkeeping for values that other
+    components already track, e.g. the active models of the ModelRegistry.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._collect: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set_function(self, collect: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Sets the callback returning {label values: value}."""
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        values = self._collect() if self._collect is not None else {}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "ml_http_request_seconds", "HTTP request latency by route template and status code.",
+    ("method", "route", "status"),
+)
+INFERENCE_STAGE_SECONDS = REGISTRY.histogram(
+    "ml_inference_stage_seconds",
+    "Latency of the prediction stages: validate, resolve_model, queue, inference (pool round trip), "
+    "preprocess, predict and compiled_predict.",
+    ("stage",),
+)
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "ml_model_load_seconds", "Duration of the model load stages: unpickle, compile and warmup.", ("stage",),
+)
+MODEL_ACTIVATION_SECONDS = REGISTRY.histogram(
+    "ml_model_activation_seconds", "Duration of model activations and rollbacks by result.", ("result",),
+)
+STORAGE_DOWNLOAD_SECONDS = REGISTRY.histogram(
+    "ml_storage_download_seconds", "Duration of storage downloads by bucket.", ("bucket",),
+)
+STORAGE_DOWNLOAD_BYTES = REGISTRY.histogram(
+    "ml_storage_download_bytes", "Size of storage downloads by bucket.", ("bucket",), buckets=SIZE_BUCKETS,
+)
+DB_CALL_SECONDS = REGISTRY.histogram(
+    "ml_db_call_seconds", "Latency of database calls including the wait for a pool thread.",
+    ("table", "operation"),
+)
+ACTIVE_MODEL_VERSION = REGISTRY.gauge(
+    "ml_active_model_version",
+    "Registry snapshot version of the resident active model of every scenario, increases on each activation.",
+    ("scenario_id", "model_id"),
+)
@@ -0,0 +1,392 @@
+# model_compiler.py
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.special import expit, logit
+from sklearn.compose import ColumnTransformer
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from models.models import CATEGORICAL_VOCABULARIES
+from utility.feature_encoder import FeatureEncoder, NUMERIC_FEATURES, NUMPY_MODE
+
+# Maximum absolute difference between compiled and original probabilities
+PARITY_TOLERANCE = 1e-6
+
+# One-hot table markers: known category without an output column, unknown category
+_DROPPED = -1
+_UNKNOWN = -2
+
+
+class UnsupportedModelError(ValueError):
+    """Raised when a pipeline step has no compiled equivalent."""
+
+
+class _ColumnStage:
+    """Encodes records the way a fitted ColumnTransformer would, using precomputed tables.
+
+    Numeric fields are standardized (or passed through with mean 0 and scale 1) into
+    their output columns. Categorical values are looked up in per-field one-hot
+    tables mapping each category to its output column.
+    """
+
+    def __init__(self, width: int, numeric: List[Tuple[int, str, float, float]],
+                 one_hot: List[Tuple[str, Dict[Any, int], bool]]):
+        self.width = width
+        self.numeric_fields = [field for _, field, _, _ in numeric]
+        self.numeric_columns = np.array([column for column, _, _, _ in numeric], dtype=np.intp)
+        self.numeric_mean = np.array([mean for _, _, mean, _ in numeric], dtype=np.float64)
+        self.numeric_scale = np.array([scale for _, _, _, scale in numeric], dtype=np.float64)
+        self.one_hot = one_hot
+
+    def transform(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        rows = len(records)
+        output = np.zeros((rows, self.width), dtype=np.float64)
+        if self.numeric_fields:
+            values = np.empty((rows, len(self.numeric_fields)), dtype=np.float64)
+            for position, field in enumerate(self.numeric_fields):
+                values[:, position] = np.fromiter(
+                    (record[field] for record in records), dtype=np.float64, count=rows
+                )
+            output[:, self.numeric_columns] = (values - self.numeric_mean) / self.numeric_scale
+
+        row_index = np.arange(rows)
+        for field, table, reject_unknown in self.one_hot:
+            column_index = np.fromiter(
+                (table.get(record[field], _UNKNOWN) for record in records), dtype=np.intp, count=rows
+            )
+            if reject_unknown and (column_index == _UNKNOWN).any():
+                raise ValueError(f"Found unknown categories in field {field}")
+            known = column_index >= 0
+            output[row_index[known], column_index[known]] = 1.0
+        return output
+
+
+class _EncoderStage:
+    """Uses the NumPy FeatureEncoder for models fitted directly on one-hot columns."""
+
+    def __init__(self, encoder: FeatureEncoder):
+        self.encoder = encoder
+
+    def transform(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        # A view of the encoder's per-thread buffer, later steps never modify it in place
+        return self.encoder.encode(records)
+
+
+class _ScaleStep:
+    """StandardScaler applied to the whole feature matrix."""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        return (features - self.mean) / self.scale
+
+
+class _LinearEstimator:
+    """Binary linear classifier with a logistic link."""
+
+    def __init__(self, coef: np.ndarray, intercept: float):
+        self.coef = coef
+        self.intercept = intercept
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        positive = expit(features @ self.coef + self.intercept)
+        return np.column_stack((1.0 - positive, positive))
+
+
+class _TreeEnsemble:
+    """Tree classifiers flattened into shared node arrays and evaluated level by level.
+
+    All trees are traversed at once, so a forest costs max_depth vectorized steps
+    instead of a Python loop per tree.
+
+    Modes:
+        average: mean of the per-tree class probabilities (decision trees, forests)
+        boosting: binary gradient boosting, logistic link over the summed leaf values
+    """
+
+    AVERAGE = "average"
+    BOOSTING = "boosting"
+
+    def __init__(self, trees: Sequence[Any], mode: str, learning_rate: float = 1.0, init_raw: float = 0.0):
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]]).astype(np.intp)
+        self.roots = offsets
+        self.left = np.concatenate([
+            np.where(tree.children_left >= 0, tree.children_left + offset, -1)
+            for tree, offset in zip(trees, offsets)
+        ]).astype(np.intp)
+        self.right = np.concatenate([
+            np.where(tree.children_right >= 0, tree.children_right + offset, -1)
+            for tree, offset in zip(trees, offsets)
+        ]).astype(np.intp)
+        # Leaves store feature -2, any valid column works since leaves never move
+        self.feature = np.maximum(np.concatenate([tree.feature for tree in trees]), 0).astype(np.intp)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.max_depth = max(tree.max_depth for tree in trees)
+        self.mode = mode
+        self.learning_rate = learning_rate
+        self.init_raw = init_raw
+
+        if mode == self.AVERAGE:
+            values = np.concatenate([tree.value[:, 0, :] for tree in trees])
+            totals = values.sum(axis=1, keepdims=True)
+            self.leaf_values = np.divide(values, totals, out=np.zeros_like(values), where=totals > 0)
+        else:
+            self.leaf_values = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+
+    def _leaves(self, features: np.ndarray) -> np.ndarray:
+        """Returns the leaf reached by every row in every tree, shape (trees, rows)."""
+        # sklearn trees compare float32 inputs against their thresholds
+        features = features.astype(np.float32)
+        rows = features.shape[0]
+        nodes = np.repeat(self.roots[:, None], rows, axis=1)
+        row_index = np.broadcast_to(np.arange(rows), nodes.shape)
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            go_left = features[row_index, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(left < 0, nodes, np.where(go_left, left, self.right[nodes]))
+        return nodes
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        leaves = self._leaves(features)
+        if self.mode == self.AVERAGE:
+            return self.leaf_values[leaves].mean(axis=0)
+        positive = expit(self.init_raw + self.learning_rate * self.leaf_values[leaves].sum(axis=0))
+        return np.column_stack((1.0 - positive, positive))
+
+
+class CompiledModel:
+    """Flat NumPy evaluator equivalent to the predict call of a fitted sklearn pipeline.
+
+    Takes validated records and returns the same probability rows as the original
+    model, without building a DataFrame or going through sklearn's input validation.
+    """
+
+    def __init__(self, stage: Any, steps: List[_ScaleStep], estimator: Any, description: str):
+        self.stage = stage
+        self.steps = steps
+        self.estimator = estimator
+        self.description = description
+
+    def predict(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        """Returns one row of class probabilities per record."""
+        features = self.stage.transform(records)
+        for step in self.steps:
+            features = step.transform(features)
+        return self.estimator.predict_proba(features)
+
+
+def _as_python(value: Any) -> Any:
+    """Turns NumPy scalars into the Python values found in validated records."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _resolve_columns(columns: Any, feature_names: Sequence[str]) -> List[str]:
+    """Turns a ColumnTransformer column selection into input field names."""
+    if isinstance(columns, str):
+        return [columns]
+    if isinstance(columns, slice) or callable(columns):
+        raise UnsupportedModelError(f"Unsupported column selection {columns!r}")
+    columns = [_as_python(column) for column in np.asarray(columns).ravel()]
+    if all(isinstance(column, str) for column in columns):
+        return columns
+    if all(isinstance(column, int) and not isinstance(column, bool) for column in columns):
+        return [feature_names[column] for column in columns]
+    raise UnsupportedModelError(f"Unsupported column selection {columns!r}")
+
+
+def _scale_parameters(scaler: StandardScaler, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the mean and scale of a fitted StandardScaler, honoring with_mean/with_std."""
+    mean = scaler.mean_ if scaler.with_mean and scaler.mean_ is not None else np.zeros(width)
+    scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(width)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+
+def _compile_column_transformer(transformer: ColumnTransformer) -> _ColumnStage:
+    """Precomputes the output layout and encoding tables of a fitted ColumnTransformer."""
+    feature_names = [str(name) for name in getattr(transformer, 'feature_names_in_', [])]
+    numeric: List[Tuple[int, str, float, float]] = []
+    one_hot: List[Tuple[str, Dict[Any, int], bool]] = []
+    offset = 0
+    for _, step, columns in transformer.transformers_:
+        if step == 'drop':
+            continue
+        fields = _resolve_columns(columns, feature_names)
+        if not fields:
+            continue
+
+        # Fitted ColumnTransformers store passthrough columns as an identity FunctionTransformer
+        passthrough = step == 'passthrough' or (isinstance(step, FunctionTransformer) and step.func is None)
+        if passthrough or isinstance(step, StandardScaler):
+            if any(field not in NUMERIC_FEATURES for field in fields):
+                raise UnsupportedModelError("Only numeric fields can be passed through or scaled")
+            if passthrough:
+                mean, scale = np.zeros(len(fields)), np.ones(len(fields))
+            else:
+                mean, scale = _scale_parameters(step, len(fields))
+            for position, field in enumerate(fields):
+                numeric.append((offset + position, field, float(mean[position]), float(scale[position])))
+            offset += len(fields)
+
+        elif isinstance(step, OneHotEncoder):
+            if getattr(step, '_infrequent_enabled', False):
+                raise UnsupportedModelError("OneHotEncoder with infrequent categories is not supported")
+            drop_idx = getattr(step, 'drop_idx_', None)
+            for position, (field, categories) in enumerate(zip(fields, step.categories_)):
+                dropped = drop_idx[position] if drop_idx is not None else None
+                table: Dict[Any, int] = {}
+                for index, category in enumerate(categories):
+                    if dropped is not None and index == dropped:
+                        table[_as_python(category)] = _DROPPED
+                    else:
+                        table[_as_python(category)] = offset
+                        offset += 1
+                one_hot.append((field, table, step.handle_unknown == 'error'))
+
+        else:
+            raise UnsupportedModelError(f"Unsupported ColumnTransformer step {type(step).__name__}")
+    return _ColumnStage(offset, numeric, one_hot)
+
+
+def _compile_estimator(estimator: Any) -> Any:
+    """Extracts the weights or flattened trees of a fitted binary classifier."""
+    classes = getattr(estimator, 'classes_', None)
+    if classes is None:
+        raise UnsupportedModelError(f"{type(estimator).__name__} is not a fitted classifier")
+
+    if isinstance(estimator, (LogisticRegression, SGDClassifier)):
+        if isinstance(estimator, SGDClassifier) and estimator.loss not in ('log_loss', 'log'):
+            raise UnsupportedModelError(f"SGDClassifier with {estimator.loss} loss has no probabilities")
+        if len(classes) != 2 or estimator.coef_.shape[0] != 1:
+            raise UnsupportedModelError("Only binary linear classifiers are supported")
+        return _LinearEstimator(np.asarray(estimator.coef_[0], dtype=np.float64), float(estimator.intercept_[0]))
+
+    if isinstance(estimator, DecisionTreeClassifier):
+        if estimator.n_outputs_ != 1:
+            raise UnsupportedModelError("Multi-output trees are not supported")
+        return _TreeEnsemble([estimator.tree_], _TreeEnsemble.AVERAGE)
+
+    if isinstance(estimator, (RandomForestClassifier, ExtraTreesClassifier)):
+        if estimator.n_outputs_ != 1:
+            raise UnsupportedModelError("Multi-output forests are not supported")
+        return _TreeEnsemble([tree.tree_ for tree in estimator.estimators_], _TreeEnsemble.AVERAGE)
+
+    if isinstance(estimator, GradientBoostingClassifier):
+        if len(classes) != 2:
+            raise UnsupportedModelError("Only binary gradient boosting is supported")
+        if estimator.init_ == 'zero':
+            init_raw = 0.0
+        elif isinstance(estimator.init_, DummyClassifier) and estimator.init_.strategy == 'prior':
+            eps = np.finfo(np.float64).eps
+            init_raw = float(logit(np.clip(estimator.init_.class_prior_[1], eps, 1 - eps)))
+        else:
+            raise UnsupportedModelError("Gradient boosting with a custom init estimator is not supported")
+        return _TreeEnsemble(
+            [tree.tree_ for tree in estimator.estimators_[:, 0]], _TreeEnsemble.BOOSTING,
+            learning_rate=estimator.learning_rate, init_raw=init_raw,
+        )
+
+    raise UnsupportedModelError(f"Unsupported estimator {type(estimator).__name__}")
+
+
+def _build(model: Any, encoder: FeatureEncoder) -> CompiledModel:
+    """Translates every step of a fitted pipeline into its NumPy equivalent."""
+    steps = [step for _, step in model.steps] if isinstance(model, Pipeline) else [model]
+    steps = [step for step in steps if step is not None and step != 'passthrough']
+    if not steps:
+        raise UnsupportedModelError("Pipeline has no estimator")
+    transforms, estimator = steps[:-1], steps[-1]
+
+    if transforms and isinstance(transforms[0], ColumnTransformer):
+        stage = _compile_column_transformer(transforms[0])
+        transforms = transforms[1:]
+    elif encoder.mode == NUMPY_MODE:
+        stage = _EncoderStage(encoder)
+    else:
+        raise UnsupportedModelError("Model input requires the pandas encoder")
+
+    scale_steps = []
+    for transform in transforms:
+        if not isinstance(transform, StandardScaler):
+            raise UnsupportedModelError(f"Unsupported pipeline step {type(transform).__name__}")
+        mean, scale = _scale_parameters(transform, transform.n_features_in_)
+        scale_steps.append(_ScaleStep(mean, scale))
+
+    compiled_estimator = _compile_estimator(estimator)
+    description = " -> ".join(
+        [type(stage).__name__.strip('_')] + ["StandardScaler"] * len(scale_steps) + [type(estimator).__name__]
+    )
+    return CompiledModel(stage, scale_steps, compiled_estimator, description)
+
+
+def parity_records(rows: int = 64, seed: int = 0) -> List[Dict[str, Any]]:
+    """Deterministic validated records covering every vocabulary value and a spread of numeric values.
+
+    Args:
+        rows: Number of records
+        seed: Seed of the numeric values
+
+    Returns:
+        List of records in the format produced by TaxFilingPredictionRequest
+    """
+    rng = np.random.default_rng(seed)
+    records = []
+    for index in range(rows):
+        records.append({
+            'age': int(rng.integers(18, 90)),
+            'income': float(rng.uniform(0, 250000)),
+            'time_spent_on_platform': float(rng.uniform(0, 600)),
+            'number_of_sessions': int(rng.integers(0, 50)),
+            'fields_filled_percentage': float(rng.uniform(0, 100)),
+            'previous_year_filing': int(rng.integers(0, 2)),
+            **{
+                # Different strides per field so categories are mixed across records
+                field: vocabulary[(index * (position + 1)) % len(vocabulary)]
+                for position, (field, vocabulary) in enumerate(CATEGORICAL_VOCABULARIES.items())
+            },
+        })
+    return records
+
+
+def compile_model(model: Any, encoder: FeatureEncoder) -> Optional[CompiledModel]:
+    """Compiles a fitted sklearn pipeline into a NumPy evaluator if it is supported.
+
+    Supported pipelines consist of an optional ColumnTransformer (OneHotEncoder,
+    StandardScaler, passthrough), optional StandardScaler steps and a binary
+    LogisticRegression, log-loss SGDClassifier, decision tree, random forest, extra
+    trees or gradient boosting classifier. The compiled evaluator is only returned if
+    it reproduces the predict output of the original model on parity records.
+
+    Args:
+        model: Unpickled model
+        encoder: Feature encoder compiled for the model
+
+    Returns:
+        CompiledModel or None if the original predict path has to be used.
+    """
+    try:
+        compiled = _build(model, encoder)
+    except UnsupportedModelError as e:
+        logging.info(f"Model is not compiled, using the original predict path: {e}")
+        return None
+
+    records = parity_records()
+    try:
+        expected = np.asarray(encoder.predict(model, encoder.encode(records)), dtype=np.float64)
+        actual = compiled.predict(records)
+    except Exception as e:
+        logging.warning(f"Compiled model failed the parity check, using the original predict path: {e}")
+        return None
+    if expected.shape != actual.shape or not np.allclose(actual, expected, rtol=0, atol=PARITY_TOLERANCE):
+        logging.warning("Compiled model output differs from the original, using the original predict path")
+        return None
+
+    logging.info(f"Compiled model into a NumPy evaluator: {compiled.description}")
+    return compiled
@@ -1,14 +1,16 @@
 # model_executor.py
-import pandas as pd
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 import logging
-from utility.model_loader import ModelLoader
+from models.models import CATEGORICAL_VOCABULARIES
+from utility.feature_encoder import FeatureEncoder, DEFAULT_ENCODER
+from utility.model_registry import RegisteredModel
+from utility.metrics import INFERENCE_STAGE_SECONDS
 
 class ModelExecutor:
     """Handles model inference execution logic."""
     
     @staticmethod
-    def execute_inference(data: Dict[str, Any]) -> Tuple[int, float]:
+    def execute_inference(data: Dict[str, Any], loaded_model: Optional[RegisteredModel]) -> Tuple[int, float]:
         """Execute model inference on the provided user data.
         
         Args:
@@ -16,74 +18,97 @@ class ModelExecutor:
                 age, income, employment_type, marital_status, time_spent_on_platform,
                 number_of_sessions, fields_filled_percentage, previous_year_filing,
                 device_type, referral_source
+            loaded_model: Registry entry of the model to run
                 
         Returns:
             A tuple containing (prediction, confidence_score)
             
         Raises:
-            ValueError: If required fields are missing or in incorrect format
+            RuntimeError: If model execution fails
+        """
+        return ModelExecutor.execute_batch_inference([data], loaded_model)[0]
+
+    @staticmethod
+    def execute_batch_inference(records: List[Dict[str, Any]], loaded_model: Optional[RegisteredModel]) -> List[Tuple[int, float]]:
+        """Execute model inference on a batch of user data with a single predict call.
+        
+        Args:
+            records: List of dictionaries with the same fields as execute_inference
+            loaded_model: Registry entry of the model to run
+                
+        Returns:
+            A list of (prediction, confidence_score) tuples in the same order as records
+            
+        Raises:
             RuntimeError: If model execution fails
         """
         try:
-            model = ModelLoader()._model
-            if model is None:
+            if loaded_model is None:
                 raise RuntimeError("Model not loaded")
 
-            # Get raw data DataFrame
-            input_df = ModelExecutor._preprocess_data(data)
-            logging.info(f"Preprocessed data: {input_df.info()}")
-            
-            # Let pipeline handle all transformations
-            logging.info (f"model = {model}")
-            
-            prediction_proba = model.predict(input_df)[0]
-            prediction = int(prediction_proba[1] >= 0.5)
-            confidence = float(prediction_proba[1] if prediction == 1 else prediction_proba[0])
-            
-            return prediction, confidence
-            
+            if loaded_model.compiled is not None:
+                # Parity-checked NumPy evaluator, skips the sklearn and pandas overhead
+                with INFERENCE_STAGE_SECONDS.time("compiled_predict"):
+                    prediction_proba = loaded_model.compiled.predict(records)
+            else:
+                # Let the compiled encoder build the input layout the model was fitted with
+                with INFERENCE_STAGE_SECONDS.time("preprocess"):
+                    model_input = ModelExecutor._preprocess_data(records, loaded_model.encoder)
+                with INFERENCE_STAGE_SECONDS.time("predict"):
+                    encoder = loaded_model.encoder or DEFAULT_ENCODER
+                    prediction_proba = encoder.predict(loaded_model.model, model_input)
+
+            return [ModelExecutor._to_result(row) for row in prediction_proba]
+
         except Exception as e:
             logging.error(f"Inference execution error: {str(e)}")
             raise RuntimeError(f"Failed to execute inference: {str(e)}")
-    
+
     @staticmethod
-    def _preprocess_data(data: Dict[str, Any]) -> List[float]:
-        """Preprocess raw input data into model-ready features.
+    def warmup_records() -> List[Dict[str, Any]]:
+        """Synthetic validated records covering every categorical vocabulary value.
+        
+        Used to warm up freshly loaded models before they receive traffic.
         
-        Args:
-            data: Raw input data dictionary
-            
         Returns:
-            List of preprocessed features in the correct order for model input
+            List of records in the format produced by TaxFilingPredictionRequest
         """
-        """Validate data and return DataFrame with raw categorical values."""
-       
-        required_fields = [
-            'age', 'income', 'employment_type', 'marital_status', 
-            'time_spent_on_platform', 'number_of_sessions', 
-            'fields_filled_percentage', 'previous_year_filing', 
-            'device_type', 'referral_source'
+        rows = max(len(vocabulary) for vocabulary in CATEGORICAL_VOCABULARIES.values())
+        return [
+            {
+                'age': 35,
+                'income': 50000.0,
+                'time_spent_on_platform': 60.0,
+                'number_of_sessions': 5,
+                'fields_filled_percentage': 50.0,
+                'previous_year_filing': index % 2,
+                **{
+                    field: vocabulary[index % len(vocabulary)]
+                    for field, vocabulary in CATEGORICAL_VOCABULARIES.items()
+                },
+            }
+            for index in range(rows)
         ]
-        
-        # Validation checks (keep existing)
-        for field in required_fields:
-            if field not in data:
-                raise ValueError(f"Missing required field: {field}")
 
-        logging.info(f"Data received for inference: {data}")
+    @staticmethod
+    def _to_result(prediction_proba) -> Tuple[int, float]:
+        """Convert a single row of class probabilities into (prediction, confidence)."""
+        prediction = int(prediction_proba[1] >= 0.5)
+        confidence = float(prediction_proba[1] if prediction == 1 else prediction_proba[0])
+        return prediction, confidence
+    
+    @staticmethod
+    def _preprocess_data(records: List[Dict[str, Any]], encoder: Optional[FeatureEncoder] = None) -> Any:
+        """Encode validated records into model-ready input.
         
-        # Create DataFrame with original string values
-        return pd.DataFrame([{
-            'employment_type': data['employment_type'].lower(),
-            'marital_status': data['marital_status'].lower(),
-            'device_type': data['device_type'].lower(),
-            'referral_source': data['referral_source'].lower(),
-            'age': float(data['age']),
-            'income': float(data['income']),
-            'time_spent_on_platform': float(data['time_spent_on_platform']),
-            'number_of_sessions': float(data['number_of_sessions']),
-            'fields_filled_percentage': float(data['fields_filled_percentage']),
-            'previous_year_filing': float(data['previous_year_filing'])
-        }])
-                
-        
\ No newline at end of file
+        Records come from TaxFilingPredictionRequest, which already checks required
+        fields and lowercases categorical values, so no further validation happens here.
+        
+        Args:
+            records: Validated input records
+            encoder: Feature encoder compiled for the loaded model
+            
+        Returns:
+            NumPy array or DataFrame in the column layout expected by the model
+        """
+        return (encoder or DEFAULT_ENCODER).encode(records)
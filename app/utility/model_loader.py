@@ -1,138 +1,339 @@
 import os
 import pickle
+import asyncio
+import itertools
 import tempfile
-from typing import Any, Optional, BinaryIO, Tuple
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, BinaryIO, Set, Tuple
 import logging
 import shutil
+from collections import deque
+
+from utility.feature_encoder import FeatureEncoder
+from utility.model_compiler import compile_model
+from utility.model_registry import ModelRegistry, RegisteredModel
+from utility.model_executor import ModelExecutor
+from utility.inference_pool import get_inference_pool, PROCESS_MODE
+from utility.artifact_cache import get_artifact_cache
+from utility.prediction_cache import get_prediction_cache
+from utility.metrics import MODEL_LOAD_SECONDS
+
+# Number of warm-up batches run on a candidate model before it is published
+WARMUP_ROUNDS = int(os.environ.get("MODEL_WARMUP_ROUNDS", "3"))
+# Number of previously active models per scenario that can be rolled back to
+HISTORY_DEPTH = int(os.environ.get("MODEL_HISTORY_DEPTH", "5"))
+# Compile supported sklearn pipelines into a NumPy evaluator at load time
+COMPILE_MODELS = os.environ.get("MODEL_COMPILATION", "true").lower() in ("1", "true", "yes")
 
 class ModelLoader:
-    """Singleton class responsible for loading and providing access to ML models with rollback support."""
-    
+    """Singleton class responsible for loading models into the ModelRegistry with rollback support.
+
+    Models are loaded as candidates off to the side: unpickled, validated and warmed
+    up with synthetic predictions before an immutable, versioned RegisteredModel
+    snapshot is published to the registry in a single step.
+
+    Replaced models are not kept in memory. Only their model_id is remembered in a
+    bounded per-scenario history, the raw artifact stays in the local ArtifactCache
+    and is rehydrated from disk when the scenario is rolled back.
+    """
+
     _instance = None
-    _model = None
-    _previous_model = None
-    _model_binary_backup = None
-    
+    _history: Dict[str, Deque[str]] = {}
+    _loading: Dict[Tuple[str, str], asyncio.Future] = {}
+    _activation_locks: Dict[str, asyncio.Lock] = {}
+    # Background spills, referenced until they finish
+    _spills: Set[asyncio.Task] = set()
+    _versions = itertools.count(1)
+
     def __new__(cls) -> 'ModelLoader':
         """Ensures single instance of ModelLoader exists."""
         if cls._instance is None:
             cls._instance = super(ModelLoader, cls).__new__(cls)
         return cls._instance
-    
-    def load_model_from_file(self, model_path: str) -> bool:
-        """Loads model from a local file path with backup of previous model.
-        
+
+    def load_model_from_file(self, model_path: str, scenario_id: str, model_id: str, activate: bool = True) -> bool:
+        """Loads model from a local file path into the registry.
+
         Args:
             model_path: Path to the pickled model file.
-            
+            scenario_id: Scenario the model belongs to.
+            model_id: ID of the model.
+            activate: Make the model the active model of the scenario.
+
         Returns:
             True if model loaded successfully, False otherwise.
         """
         if not os.path.exists(model_path):
             logging.error(f"Model file not found at: {model_path}")
             return False
-            
+
         try:
-            # Backup current model before loading new one
-            self._backup_current_model()
-            
-            with open(model_path, 'rb') as model_file:
-                ModelLoader._model = pickle.load(model_file)
-                logging.info(f"model type = {ModelLoader._model}")
-                
-            # Create binary backup of the new model
             with open(model_path, 'rb') as model_file:
-                ModelLoader._model_binary_backup = model_file.read()
-                
+                candidate = self.build_candidate(model_file, scenario_id, model_id)
+
+            self.publish(candidate, activate)
             logging.info(f"Model successfully loaded from {model_path}")
             return True
-        except (pickle.PickleError, IOError) as e:
+        except (pickle.PickleError, IOError, EOFError, ValueError) as e:
             logging.error(f"Failed to load model: {e}")
-            self._restore_previous_model()
             return False
-    
-    def load_model_from_binary(self, binary_data: BinaryIO) -> bool:
-        """Loads model directly from binary data with backup of previous model.
-        
+
+    def load_model_from_binary(self, binary_data: BinaryIO, scenario_id: str, model_id: str, activate: bool = True) -> bool:
+        """Loads model directly from binary data into the registry.
+
         Args:
             binary_data: Binary file-like object containing the pickled model.
-            
+            scenario_id: Scenario the model belongs to.
+            model_id: ID of the model.
+            activate: Make the model the active model of the scenario.
+
         Returns:
             True if model loaded successfully, False otherwise.
         """
         try:
-            # Store current position to rewind later
-            current_position = binary_data.tell()
-            
-            # Backup current model before loading new one
-            self._backup_current_model()
-            
-            # Load the new model
-            binary_data.seek(current_position)
-            ModelLoader._model = pickle.load(binary_data)
-            
-            # Create binary backup of the new model
-            binary_data.seek(current_position)
-            ModelLoader._model_binary_backup = binary_data.read()
-            
-            logging.info("Model successfully loaded from binary data")
+            candidate = self.build_candidate(binary_data, scenario_id, model_id)
+            self.publish(candidate, activate)
+            logging.info(f"Model {model_id} successfully loaded from binary data")
             return True
-        except (pickle.PickleError, IOError) as e:
+        except (pickle.PickleError, IOError, EOFError, ValueError) as e:
             logging.error(f"Failed to load model from binary data: {e}")
-            self._restore_previous_model()
             return False
-    
-    def _backup_current_model(self) -> None:
-        """Backs up the currently loaded model before replacing it."""
-        ModelLoader._previous_model = ModelLoader._model
-    
-    def _restore_previous_model(self) -> None:
-        """Restores the previous model in case of failure."""
-        ModelLoader._model = ModelLoader._previous_model
-        logging.info("Restored previous model due to loading failure")
-    
-    def rollback_model(self) -> bool:
-        """Explicitly rolls back to the previous model version.
-        
+
+    def build_candidate(self, binary_data: BinaryIO, scenario_id: str, model_id: str) -> RegisteredModel:
+        """Unpickles, validates and warms up a model without publishing it.
+
+        Args:
+            binary_data: Binary file-like object containing the pickled model.
+            scenario_id: Scenario the model belongs to.
+            model_id: ID of the model.
+
         Returns:
-            True if rollback successful, False otherwise.
+            A new versioned snapshot ready to be published.
+
+        Raises:
+            pickle.PickleError, EOFError: If the artifact cannot be unpickled.
+            ValueError: If the model fails the warm-up predictions.
         """
-        if ModelLoader._previous_model is None:
-            logging.error("No previous model available for rollback")
-            return False
-        
-        ModelLoader._model = ModelLoader._previous_model
-        logging.info("Successfully rolled back to previous model")
-        return True
-    
-    @property
-    def model(self) -> Optional[Any]:
-        """Provides access to the loaded model.
-        
+        current_position = binary_data.tell()
+        with MODEL_LOAD_SECONDS.time("unpickle"):
+            model = pickle.load(binary_data)
+        size_bytes = binary_data.tell() - current_position
+
+        with MODEL_LOAD_SECONDS.time("compile"):
+            encoder = FeatureEncoder.compile(model)
+            compiled = compile_model(model, encoder) if COMPILE_MODELS else None
+        candidate = RegisteredModel(
+            scenario_id=scenario_id,
+            model_id=model_id,
+            model=model,
+            encoder=encoder,
+            size_bytes=size_bytes,
+            version=next(ModelLoader._versions),
+            compiled=compiled,
+        )
+
+        # Warm-up predictions trigger lazy initialization and validate the output format
+        warmup_records = ModelExecutor.warmup_records()
+        with MODEL_LOAD_SECONDS.time("warmup"):
+            for _ in range(max(WARMUP_ROUNDS, 1)):
+                try:
+                    results = ModelExecutor.execute_batch_inference(warmup_records, candidate)
+                except RuntimeError as e:
+                    raise ValueError(f"Model {model_id} failed warm-up inference: {e}")
+                if len(results) != len(warmup_records):
+                    raise ValueError(
+                        f"Model {model_id} returned {len(results)} predictions for {len(warmup_records)} rows"
+                    )
+        return candidate
+
+    def publish(self, candidate: RegisteredModel, activate: bool = True, record_history: bool = True) -> None:
+        """Atomically publishes a candidate snapshot to the registry.
+
+        Args:
+            candidate: Snapshot returned by build_candidate.
+            activate: Make the model the active model of its scenario.
+            record_history: Remember the replaced model for rollback.
+        """
+        previous = ModelRegistry().put(candidate, activate=activate)
+        if activate and previous is not None and previous != candidate.model_id:
+            if record_history:
+                history = ModelLoader._history.setdefault(candidate.scenario_id, deque(maxlen=HISTORY_DEPTH))
+                history.append(previous)
+            self._spill(candidate.scenario_id, previous)
+        if activate:
+            # Cached predictions were made by the model that is no longer active
+            get_prediction_cache().invalidate(candidate.scenario_id)
+        logging.info(
+            f"Published model {candidate.model_id} version {candidate.version} "
+            f"for scenario {candidate.scenario_id}"
+        )
+
+    def _spill(self, scenario_id: str, model_id: str) -> None:
+        """Drops a replaced model from memory, keeping its raw artifact on local disk.
+
+        Models loaded from a local file or stream never went through the artifact
+        cache and have to be pickled and written first. On the event loop that runs
+        in a worker thread and the model stays resident until it is on disk.
+        """
+        entry = ModelRegistry().get(scenario_id, model_id)
+        if entry is None:
+            return
+        cache = get_artifact_cache()
+        if cache.contains(model_id):
+            self._evict_replaced(scenario_id, model_id)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            cache.put(model_id, pickle.dumps(entry.model))
+            self._evict_replaced(scenario_id, model_id)
+            return
+        task = loop.create_task(self._spill_in_background(entry))
+        ModelLoader._spills.add(task)
+        task.add_done_callback(ModelLoader._spills.discard)
+
+    async def _spill_in_background(self, entry: RegisteredModel) -> None:
+        cache = get_artifact_cache()
+        try:
+            await asyncio.to_thread(lambda: cache.put(entry.model_id, pickle.dumps(entry.model)))
+        except Exception as e:
+            logging.error(f"Failed to spill model {entry.model_id}, keeping it in memory: {e}")
+            return
+        self._evict_replaced(entry.scenario_id, entry.model_id)
+
+    @staticmethod
+    def _evict_replaced(scenario_id: str, model_id: str) -> None:
+        registry = ModelRegistry()
+        # A rollback may have activated the model again while it was written
+        if registry.active_model_id(scenario_id) == model_id:
+            return
+        registry.evict(scenario_id, model_id)
+        logging.info(f"Spilled model {model_id} of scenario {scenario_id} to disk")
+
+    async def prepare_model(self, binary_data: BinaryIO, scenario_id: str, model_id: str) -> Optional[RegisteredModel]:
+        """Builds a candidate off the event loop and warms up the inference workers with it.
+
+        Args:
+            binary_data: Binary file-like object containing the pickled model.
+            scenario_id: Scenario the model belongs to.
+            model_id: ID of the model.
+
+        Returns:
+            A validated, warmed up candidate or None if the model is unusable.
+        """
+        try:
+            candidate = await asyncio.to_thread(self.build_candidate, binary_data, scenario_id, model_id)
+            pool = get_inference_pool()
+            if pool.mode == PROCESS_MODE:
+                # Let every process worker unpickle the candidate before it gets traffic
+                await pool.warm_up(candidate, ModelExecutor.warmup_records())
+            return candidate
+        except (pickle.PickleError, IOError, EOFError, ValueError, RuntimeError) as e:
+            logging.error(f"Failed to prepare model {model_id}: {e}")
+            return None
+
+    def activation_lock(self, scenario_id: str) -> asyncio.Lock:
+        """Lock serializing model activations of a scenario."""
+        if scenario_id not in ModelLoader._activation_locks:
+            ModelLoader._activation_locks[scenario_id] = asyncio.Lock()
+        return ModelLoader._activation_locks[scenario_id]
+
+    async def ensure_loaded(self, scenario_id: str, model_id: str,
+                            fetch: Callable[[], Awaitable[Optional[BinaryIO]]]) -> Optional[RegisteredModel]:
+        """Returns a resident model, loading it with fetch if it is not in the registry.
+
+        Concurrent calls for the same model share a single download and unpickle.
+
+        Args:
+            scenario_id: Scenario the model belongs to.
+            model_id: ID of the model.
+            fetch: Coroutine function opening the pickled model artifact.
+
+        Returns:
+            The loaded model or None if it could not be loaded.
+        """
+        registry = ModelRegistry()
+        entry = registry.get(scenario_id, model_id)
+        if entry is not None:
+            return entry
+
+        key = (scenario_id, model_id)
+        if key not in ModelLoader._loading:
+            ModelLoader._loading[key] = asyncio.ensure_future(self._fetch_and_load(scenario_id, model_id, fetch))
+            ModelLoader._loading[key].add_done_callback(lambda _: ModelLoader._loading.pop(key, None))
+        return await asyncio.shield(ModelLoader._loading[key])
+
+    async def _fetch_and_load(self, scenario_id: str, model_id: str,
+                              fetch: Callable[[], Awaitable[Optional[BinaryIO]]]) -> Optional[RegisteredModel]:
+        """Fetches a model and unpickles it off the event loop without changing the active model."""
+        binary_data = await fetch()
+        if binary_data is None:
+            logging.error(f"Could not fetch model {model_id} for scenario {scenario_id}")
+            return None
+        with binary_data:
+            candidate = await self.prepare_model(binary_data, scenario_id, model_id)
+        if candidate is None:
+            return None
+        self.publish(candidate, activate=False)
+        return candidate
+
+    def history(self, scenario_id: str) -> List[str]:
+        """Returns the model_ids a scenario can be rolled back to, most recent first."""
+        return list(reversed(ModelLoader._history.get(scenario_id, ())))
+
+    def rollback_target(self, scenario_id: str, steps: int = 1) -> Optional[str]:
+        """Returns the model_id that was active steps activations ago, if still in the history.
+
+        Args:
+            scenario_id: Scenario to roll back.
+            steps: Number of versions to go back.
+
         Returns:
-            The loaded model or None if model hasn't been loaded.
+            The model_id to roll back to, None if the history is not deep enough.
         """
-        if ModelLoader._model is None:
-            logging.warning("Attempted to access model before loading")
-        return ModelLoader._model
-    
-    def persist_model(self, file_path: str) -> bool:
-        """Persists the current model to disk.
-        
+        history = self.history(scenario_id)
+        if steps < 1 or steps > len(history):
+            logging.error(f"No model available {steps} versions back for scenario {scenario_id}")
+            return None
+        return history[steps - 1]
+
+    def drop_history(self, scenario_id: str, steps: int) -> None:
+        """Forgets the most recent history entries of a scenario after a rollback."""
+        history = ModelLoader._history.get(scenario_id)
+        for _ in range(min(steps, len(history or ()))):
+            history.pop()
+
+    def get_model(self, scenario_id: str) -> Optional[RegisteredModel]:
+        """Provides access to the resident active model of a scenario.
+
+        Returns:
+            The loaded model or None if it isn't resident.
+        """
+        entry = ModelRegistry().get_active(scenario_id)
+        if entry is None:
+            logging.warning(f"Attempted to access model of scenario {scenario_id} before loading")
+        return entry
+
+    def persist_model(self, file_path: str, scenario_id: str) -> bool:
+        """Persists the active model of a scenario to disk.
+
         Args:
             file_path: Path where the model should be saved.
-            
+            scenario_id: Scenario whose active model is saved.
+
         Returns:
             True if successfully persisted, False otherwise.
         """
+        entry = self.get_model(scenario_id)
+        if entry is None:
+            return False
         try:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
+
             with open(file_path, 'wb') as f:
-                pickle.dump(ModelLoader._model, f)
+                pickle.dump(entry.model, f)
             logging.info(f"Model successfully persisted to {file_path}")
             return True
         except (IOError, OSError) as e:
             logging.error(f"Failed to persist model: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from supabase import Client
+
+from database.crud import get_active_scenario_models, open_model_artifact
+from utility.model_executor import ModelExecutor
+from utility.model_loader import ModelLoader
+from utility.model_registry import ModelRegistry
+from utility.inference_pool import get_inference_pool
+
+
+class ReadinessState:
+    """Tracks the startup preload of the active scenario models."""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.loaded: Dict[str, str] = {}
+        self.failed: Dict[str, str] = {}
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "loaded_models": self.loaded,
+            "failed_models": self.failed,
+            "error": self.error,
+        }
+
+
+readiness = ReadinessState()
+
+
+# Backoff between attempts to list the active models while the database is unreachable
+PRELOAD_RETRY_SECONDS = float(os.environ.get("MODEL_PRELOAD_RETRY_SECONDS", "1"))
+PRELOAD_MAX_RETRY_SECONDS = float(os.environ.get("MODEL_PRELOAD_MAX_RETRY_SECONDS", "30"))
+
+
+def model_preload_enabled() -> bool:
+    """Returns True if active models should be loaded at application startup."""
+    return os.environ.get("MODEL_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+
+async def _preload_model(scenario_id: str, model_id: str, db: Client) -> None:
+    """Downloads, unpickles and warms up the active model of one scenario."""
+    start = time.perf_counter()
+    ModelRegistry().set_active(scenario_id, model_id)
+    loaded_model = await ModelLoader().ensure_loaded(
+        scenario_id, model_id, lambda: open_model_artifact(model_id, db)
+    )
+    if loaded_model is None:
+        raise RuntimeError(f"Model {model_id} could not be loaded")
+    # Run through the pool so every process worker unpickles the model before traffic arrives
+    await get_inference_pool().warm_up(loaded_model, ModelExecutor.warmup_records())
+    logging.info(
+        f"Preloaded model {model_id} for scenario {scenario_id} in {time.perf_counter() - start:.2f}s"
+    )
+
+
+async def preload_active_models(db: Client) -> ReadinessState:
+    """Loads and warms up the active model of every scenario concurrently.
+
+    Readiness is reported once every active model was attempted. Scenarios whose
+    model failed to load are listed in the probe body and load on demand with their
+    first request, so they never take the healthy scenarios out of rotation. Listing
+    the active models is retried with exponential backoff until the database answers.
+
+    Args:
+        db (Client): Supabase client
+
+    Returns:
+        ReadinessState: Outcome of the preload
+    """
+    readiness.started_at = datetime.now()
+    delay = PRELOAD_RETRY_SECONDS
+    while True:
+        try:
+            active_models = await get_active_scenario_models(db)
+            readiness.error = None
+            break
+        except Exception as e:
+            logging.error(f"Could not list the active models, retrying in {delay:g}s: {str(e)}")
+            readiness.error = str(e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, PRELOAD_MAX_RETRY_SECONDS)
+
+    logging.info(f"Preloading {len(active_models)} active scenario models")
+    results = await asyncio.gather(
+        *(_preload_model(row["scenario_id"], row["model_id"], db) for row in active_models),
+        return_exceptions=True,
+    )
+    for row, result in zip(active_models, results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to preload model {row['model_id']}: {result}")
+            readiness.failed[row["scenario_id"]] = f"{row['model_id']}: {result}"
+        else:
+            readiness.loaded[row["scenario_id"]] = row["model_id"]
+    readiness.ready = True
+    readiness.finished_at = datetime.now()
+    return readiness
@@ -0,0 +1,183 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utility.feature_encoder import FeatureEncoder
+from utility.metrics import ACTIVE_MODEL_VERSION
+
+
+@dataclass(frozen=True)
+class RegisteredModel:
+    """Immutable snapshot of a deserialized model and everything needed to run inference on it.
+
+    Requests resolve the snapshot once and keep using it, so publishing a new model
+    never affects predictions that are already in flight.
+    """
+    scenario_id: str
+    model_id: str
+    model: Any
+    encoder: FeatureEncoder
+    size_bytes: int
+    version: int = 0
+    # NumPy evaluator replacing model.predict, None if the model could not be compiled
+    compiled: Any = None
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.scenario_id, self.model_id)
+
+
+class ModelRegistry:
+    """Singleton registry of resident models keyed by (scenario_id, model_id).
+
+    Keeps track of the active model of every scenario and evicts the least recently
+    used models once the total resident size exceeds MODEL_REGISTRY_MAX_BYTES.
+    Resident size is approximated by the size of the serialized model artifact,
+    which for sklearn pipelines is dominated by the same NumPy arrays held in memory.
+    Evicted models are reloaded on demand through ModelLoader.
+    """
+
+    _instance = None
+
+    def __new__(cls) -> 'ModelRegistry':
+        """Ensures single instance of ModelRegistry exists."""
+        if cls._instance is None:
+            instance = super(ModelRegistry, cls).__new__(cls)
+            instance._lock = threading.RLock()
+            instance._entries = OrderedDict()
+            instance._active = {}
+            instance._evictions = 0
+            instance.max_bytes = int(os.environ.get("MODEL_REGISTRY_MAX_BYTES", str(2 * 1024 ** 3)))
+            cls._instance = instance
+        return cls._instance
+
+    def put(self, entry: RegisteredModel, activate: bool = True) -> Optional[str]:
+        """Adds a loaded model to the registry, evicting cold models if over budget.
+
+        Args:
+            entry: Loaded model
+            activate: Make the model the active model of its scenario
+
+        Returns:
+            The model_id that was active for the scenario before, if any
+        """
+        with self._lock:
+            previous = self._active.get(entry.scenario_id)
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            if activate:
+                self._active[entry.scenario_id] = entry.model_id
+            self._evict_over_budget(keep=entry.key)
+            return previous
+
+    def get(self, scenario_id: str, model_id: str) -> Optional[RegisteredModel]:
+        """Returns a resident model and marks it as recently used."""
+        with self._lock:
+            entry = self._entries.get((scenario_id, model_id))
+            if entry is not None:
+                self._entries.move_to_end(entry.key)
+            return entry
+
+    def get_active(self, scenario_id: str) -> Optional[RegisteredModel]:
+        """Returns the active model of a scenario if it is resident."""
+        with self._lock:
+            model_id = self._active.get(scenario_id)
+            return self.get(scenario_id, model_id) if model_id is not None else None
+
+    def active_model_id(self, scenario_id: str) -> Optional[str]:
+        """Returns the model_id of the active model of a scenario, resident or not."""
+        with self._lock:
+            return self._active.get(scenario_id)
+
+    def set_active(self, scenario_id: str, model_id: Optional[str]) -> Optional[str]:
+        """Points a scenario to another model_id without loading it.
+
+        Returns:
+            The model_id that was active before, if any
+        """
+        with self._lock:
+            previous = self._active.get(scenario_id)
+            if model_id is None:
+                self._active.pop(scenario_id, None)
+            else:
+                self._active[scenario_id] = model_id
+            return previous
+
+    def evict(self, scenario_id: str, model_id: str) -> bool:
+        """Removes a model from memory. Returns True if it was resident."""
+        with self._lock:
+            return self._entries.pop((scenario_id, model_id), None) is not None
+
+    def active_versions(self) -> Dict[Tuple[str, str], int]:
+        """Returns {(scenario_id, model_id): snapshot version} of the resident active models."""
+        with self._lock:
+            return {
+                (scenario_id, model_id): self._entries[(scenario_id, model_id)].version
+                for scenario_id, model_id in self._active.items()
+                if (scenario_id, model_id) in self._entries
+            }
+
+    def resident_bytes(self) -> int:
+        """Returns the total resident size of all registered models."""
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._entries.values())
+
+    def _evict_over_budget(self, keep: Tuple[str, str]) -> None:
+        """Evicts least recently used models, inactive ones first, until within budget."""
+        total = self.resident_bytes()
+        active_keys = set(self._active.items())
+        for evict_active in (False, True):
+            for key in list(self._entries.keys()):
+                if total <= self.max_bytes:
+                    return
+                if key == keep or ((key in active_keys) != evict_active):
+                    continue
+                entry = self._entries.pop(key)
+                total -= entry.size_bytes
+                self._evictions += 1
+                logging.info(
+                    f"Evicted model {entry.model_id} of scenario {entry.scenario_id} "
+                    f"({entry.size_bytes} bytes) from the model registry"
+                )
+        if total > self.max_bytes:
+            logging.warning(
+                f"Model {keep[1]} alone exceeds the registry budget of {self.max_bytes} bytes"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the memory budget and the resident size of every model.
+
+        Returns:
+            Dictionary with totals and per-model entries in LRU order (coldest first).
+        """
+        with self._lock:
+            models: List[Dict[str, Any]] = [
+                {
+                    "scenario_id": entry.scenario_id,
+                    "model_id": entry.model_id,
+                    "size_bytes": entry.size_bytes,
+                    "version": entry.version,
+                    "active": self._active.get(entry.scenario_id) == entry.model_id,
+                    "encoder_mode": entry.encoder.mode,
+                    "compiled": entry.compiled.description if entry.compiled is not None else None,
+                    "loaded_at": entry.loaded_at.isoformat(),
+                }
+                for entry in self._entries.values()
+            ]
+            return {
+                "max_bytes": self.max_bytes,
+                "resident_bytes": sum(model["size_bytes"] for model in models),
+                "resident_models": len(models),
+                "evictions": self._evictions,
+                "active_models": dict(self._active),
+                "models": models,
+            }
+
+
+# Read at scrape time, activations pay nothing for the gauge
+ACTIVE_MODEL_VERSION.set_function(lambda: ModelRegistry().active_versions())
@@ -0,0 +1,323 @@
+# model_trainer.py
+import os
+import json
+import pickle
+import logging
+import traceback
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Memory
+from joblib.externals.loky import get_reusable_executor
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import confusion_matrix
+from sklearn.model_selection import HalvingGridSearchCV, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from threadpoolctl import threadpool_limits
+
+from models.models import CATEGORICAL_VOCABULARIES, PerformanceMetrics
+from utility.feature_encoder import CATEGORICAL_FEATURES, NUMERIC_FEATURES
+from utility.training_dataset import ColumnarDataset, clean_training_frame, read_csv_chunks
+
+# Candidates are ranked by the log loss of their probabilities, which are served as confidence scores
+TUNING_SCORING = 'neg_log_loss'
+
+
+class ProbabilityPipeline(Pipeline):
+    """Pipeline whose predict returns class probabilities.
+
+    The inference path expects model.predict to return one row of class
+    probabilities per record, see ModelExecutor._to_result.
+    """
+
+    def predict(self, X, **params):
+        return self.predict_proba(X, **params)
+
+
+def build_pipeline(random_state: Optional[int] = 0, classifier: Any = None) -> ProbabilityPipeline:
+    """Creates the default tax filing completion pipeline.
+
+    Categorical columns are one-hot encoded against the fixed request vocabularies, so
+    every trained model accepts exactly the values TaxFilingPredictionRequest validates
+    and the encoder never needs a pass over the data to learn them.
+
+    Args:
+        random_state: Seed of the classifier
+        classifier: Final estimator, a logistic regression by default
+    """
+    preprocessor = ColumnTransformer([
+        ('categorical', OneHotEncoder(
+            categories=[CATEGORICAL_VOCABULARIES[field] for field in CATEGORICAL_FEATURES],
+            handle_unknown='ignore',
+        ), CATEGORICAL_FEATURES),
+        ('numeric', StandardScaler(), NUMERIC_FEATURES),
+    ])
+    if classifier is None:
+        classifier = LogisticRegression(max_iter=1000, random_state=random_state)
+    return ProbabilityPipeline([('preprocessor', preprocessor), ('classifier', classifier)])
+
+
+def tuning_grid(random_state: Optional[int] = 0) -> list:
+    """Candidate classifiers and parameters searched in tuning mode.
+
+    Every candidate can be compiled by utility.model_compiler. Gradient boosting
+    stops adding trees once its internal validation score stops improving.
+    """
+    return [
+        {
+            'classifier': [LogisticRegression(max_iter=1000, random_state=random_state)],
+            'classifier__C': [0.01, 0.1, 1.0, 10.0],
+        },
+        {
+            'classifier': [RandomForestClassifier(n_estimators=100, random_state=random_state)],
+            'classifier__max_depth': [6, 12],
+            'classifier__min_samples_leaf': [1, 20],
+        },
+        {
+            'classifier': [GradientBoostingClassifier(
+                n_estimators=500, n_iter_no_change=5, validation_fraction=0.1, random_state=random_state
+            )],
+            'classifier__learning_rate': [0.05, 0.2],
+            'classifier__max_depth': [2, 3],
+        },
+    ]
+
+
+def prepare_training_frame(frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """Selects and cleans the feature and label columns of a training data frame.
+
+    Args:
+        frame: Raw training data with the feature columns and TARGET_COLUMN
+
+    Returns:
+        (features, labels) with incomplete rows dropped
+
+    Raises:
+        ValueError: If columns are missing or both classes are not present
+    """
+    features, labels = clean_training_frame(frame)
+    if labels.nunique() < 2:
+        raise ValueError("Training data must contain both completed and abandoned filings")
+    return features, labels
+
+
+def load_training_data(data_path: str) -> Tuple[pd.DataFrame, pd.Series]:
+    """Loads the features and labels of a training CSV or of a converted dataset directory.
+
+    Raises:
+        ValueError: If columns are missing or both classes are not present
+    """
+    if os.path.isdir(data_path):
+        features, labels = ColumnarDataset(data_path).frame()
+        labels = pd.Series(labels)
+        if labels.nunique() < 2:
+            raise ValueError("Training data must contain both completed and abandoned filings")
+        return features, labels
+    return prepare_training_frame(pd.read_csv(data_path))
+
+
+def iter_training_chunks(data_path: str, chunk_rows: int, test_size: float = 0.2,
+                         random_state: Optional[int] = 0) -> Iterator[Tuple[pd.DataFrame, np.ndarray, np.ndarray]]:
+    """Streams a training CSV or converted dataset directory in chunks of chunk_rows rows.
+
+    Rows are assigned to the hold-out set with a seeded generator, so every pass
+    over the data yields the same split.
+
+    Yields:
+        (features, labels, holdout mask) of each chunk
+    """
+    rng = np.random.default_rng(random_state)
+    if os.path.isdir(data_path):
+        chunks = ColumnarDataset(data_path).iter_frames(chunk_rows)
+    else:
+        chunks = read_csv_chunks(data_path, chunk_rows)
+    for features, labels in chunks:
+        yield features, labels, rng.random(len(labels)) < test_size
+
+
+def _metrics(confusion: np.ndarray) -> Dict[str, float]:
+    """Computes the PerformanceMetrics from a 2x2 confusion matrix."""
+    (true_negatives, false_positives), (false_negatives, true_positives) = confusion.tolist()
+    total = true_negatives + false_positives + false_negatives + true_positives
+    if total == 0:
+        raise ValueError("Training data has no hold-out rows to compute metrics on")
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+    return {
+        PerformanceMetrics.ACCURACY.value: (true_positives + true_negatives) / total,
+        PerformanceMetrics.PRECISION.value: precision,
+        PerformanceMetrics.RECALL.value: recall,
+        PerformanceMetrics.F1_SCORE.value: 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def train_model(data_path: str, model_path: str, test_size: float = 0.2,
+                random_state: Optional[int] = 0) -> Dict[str, float]:
+    """Fits the default pipeline on a training dataset and pickles it.
+
+    Args:
+        data_path: Training data CSV or converted dataset directory
+        model_path: Destination of the pickled model
+        test_size: Fraction of rows held out to compute the metrics
+        random_state: Seed of the split and the classifier
+
+    Returns:
+        Hold-out metrics keyed by PerformanceMetrics values
+    """
+    features, labels = load_training_data(data_path)
+    train_x, test_x, train_y, test_y = train_test_split(
+        features, labels, test_size=test_size, random_state=random_state, stratify=labels
+    )
+    pipeline = build_pipeline(random_state).fit(train_x, train_y)
+
+    predicted = (pipeline.predict(test_x)[:, 1] >= 0.5).astype(int)
+    metrics = _metrics(confusion_matrix(test_y, predicted, labels=[0, 1]))
+    with open(model_path, 'wb') as model_file:
+        pickle.dump(pipeline, model_file)
+    logging.info(f"Trained model on {len(train_y)} rows, hold-out metrics {metrics}")
+    return metrics
+
+
+def tune_model(data_path: str, model_path: str, cache_dir: str, test_size: float = 0.2, n_jobs: int = -1,
+               cv: int = 3, random_state: Optional[int] = 0) -> Dict[str, float]:
+    """Selects and fits the best pipeline of tuning_grid with successive halving.
+
+    Candidates and CV folds are fitted in parallel on n_jobs worker processes. The
+    search starts every candidate on a small sample and only gives the best third
+    more rows in each round. The preprocessing step is cached in cache_dir, so
+    candidates sharing a fold and sample size reuse the fitted transform instead of
+    refitting it.
+
+    Args:
+        data_path: Training data CSV or converted dataset directory
+        model_path: Destination of the pickled model
+        cache_dir: Directory of the preprocessing cache, removed by the caller
+        test_size: Fraction of rows held out to compute the metrics
+        n_jobs: Worker processes of the search, all cores if -1
+        cv: Cross-validation folds
+        random_state: Seed of the split, the folds and the classifiers
+
+    Returns:
+        Hold-out metrics of the best pipeline keyed by PerformanceMetrics values
+    """
+    features, labels = load_training_data(data_path)
+    train_x, test_x, train_y, test_y = train_test_split(
+        features, labels, test_size=test_size, random_state=random_state, stratify=labels
+    )
+    pipeline = build_pipeline(random_state)
+    pipeline.set_params(memory=Memory(cache_dir, verbose=0))
+    search = HalvingGridSearchCV(
+        pipeline, tuning_grid(random_state), factor=3, cv=cv, scoring=TUNING_SCORING,
+        n_jobs=n_jobs, random_state=random_state, refit=True,
+    ).fit(train_x, train_y)
+    best = search.best_estimator_
+    # The cache directory does not outlive the job
+    best.set_params(memory=None)
+
+    predicted = (best.predict(test_x)[:, 1] >= 0.5).astype(int)
+    metrics = _metrics(confusion_matrix(test_y, predicted, labels=[0, 1]))
+    with open(model_path, 'wb') as model_file:
+        pickle.dump(best, model_file)
+    logging.info(
+        f"Tuned {len(search.cv_results_['params'])} fits over {search.n_iterations_} rounds, "
+        f"best {search.best_params_} with {TUNING_SCORING} {search.best_score_:.4f}, hold-out metrics {metrics}"
+    )
+    return metrics
+
+
+def train_model_incremental(data_path: str, model_path: str, chunk_rows: int = 50000, test_size: float = 0.2,
+                            epochs: int = 1, random_state: Optional[int] = 0) -> Dict[str, float]:
+    """Fits the pipeline out of core, streaming the training data in chunks.
+
+    The one-hot encoder uses the fixed request vocabularies. A first pass fits the
+    scaler on the training rows of every chunk with partial_fit, after which a
+    log-loss SGDClassifier is updated with partial_fit chunk by chunk. The hold-out
+    rows are scored in a final pass. Peak memory depends on chunk_rows, not on the
+    size of the dataset.
+
+    Args:
+        data_path: Training data CSV or converted dataset directory
+        model_path: Destination of the pickled model
+        chunk_rows: Rows parsed and fitted at a time
+        test_size: Fraction of rows held out to compute the metrics
+        epochs: Passes over the training rows
+        random_state: Seed of the split and the classifier
+
+    Returns:
+        Hold-out metrics keyed by PerformanceMetrics values
+    """
+    pipeline = build_pipeline(random_state, SGDClassifier(loss='log_loss', random_state=random_state))
+    preprocessor, classifier = pipeline.named_steps['preprocessor'], pipeline.named_steps['classifier']
+    scaler = StandardScaler()
+    class_counts = np.zeros(2, dtype=np.int64)
+    sample_x = None
+    for features, labels, holdout in iter_training_chunks(data_path, chunk_rows, test_size, random_state):
+        train_x, train_y = features[~holdout], labels[~holdout]
+        if len(train_y) == 0:
+            continue
+        if sample_x is None:
+            sample_x = train_x.head(1)
+        scaler.partial_fit(train_x[NUMERIC_FEATURES])
+        class_counts += np.bincount(train_y, minlength=2)
+    if not class_counts.all():
+        raise ValueError("Training data must contain both completed and abandoned filings")
+    # Fitting sets up the column transformer, the scaler statistics come from the whole training set
+    preprocessor.fit(sample_x)
+    fitted_scaler = preprocessor.named_transformers_['numeric']
+    for attribute in ('mean_', 'var_', 'scale_', 'n_samples_seen_'):
+        setattr(fitted_scaler, attribute, getattr(scaler, attribute))
+
+    for _ in range(epochs):
+        for features, labels, holdout in iter_training_chunks(data_path, chunk_rows, test_size, random_state):
+            train_x, train_y = features[~holdout], labels[~holdout]
+            if len(train_y) > 0:
+                classifier.partial_fit(preprocessor.transform(train_x), train_y, classes=[0, 1])
+
+    confusion = np.zeros((2, 2), dtype=np.int64)
+    for features, labels, holdout in iter_training_chunks(data_path, chunk_rows, test_size, random_state):
+        if holdout.any():
+            predicted = (pipeline.predict(features[holdout])[:, 1] >= 0.5).astype(int)
+            confusion += confusion_matrix(labels[holdout], predicted, labels=[0, 1])
+    metrics = _metrics(confusion)
+    with open(model_path, 'wb') as model_file:
+        pickle.dump(pipeline, model_file)
+    logging.info(f"Trained model out of core on {int(class_counts.sum())} rows, hold-out metrics {metrics}")
+    return metrics
+
+
+def run_training_process(data_path: str, model_path: str, result_path: str, threads: int = 1, niceness: int = 0,
+                         chunk_rows: Optional[int] = None, tune_jobs: Optional[int] = None) -> None:
+    """Entry point of a training worker process.
+
+    Lowers the process priority and caps the native thread pools before fitting so
+    training yields the CPU to the inference workers. The metrics, or the error,
+    are written to result_path as JSON. With chunk_rows the model is trained out of
+    core by train_model_incremental, with tune_jobs it is tuned by tune_model on
+    that many search workers, which inherit the lower priority.
+    """
+    result: Dict[str, Any] = {}
+    try:
+        if niceness and hasattr(os, 'nice'):
+            os.nice(niceness)
+        with threadpool_limits(limits=threads):
+            if chunk_rows:
+                result['metrics'] = train_model_incremental(data_path, model_path, chunk_rows)
+            elif tune_jobs:
+                cache_dir = os.path.join(os.path.dirname(result_path), "preprocessing_cache")
+                try:
+                    result['metrics'] = tune_model(data_path, model_path, cache_dir, n_jobs=tune_jobs)
+                finally:
+                    # Idle search workers would otherwise keep this process from exiting
+                    get_reusable_executor().shutdown(wait=True)
+            else:
+                result['metrics'] = train_model(data_path, model_path)
+    except Exception as e:
+        logging.error(f"Training failed: {traceback.format_exc()}")
+        result['error'] = f"{type(e).__name__}: {str(e)}"
+    with open(result_path, 'w') as result_file:
+        json.dump(result, result_file)
@@ -0,0 +1,165 @@
+# prediction_cache.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utility.model_registry import RegisteredModel
+
+# (scenario_id, model_id, model version, record digest)
+CacheKey = Tuple[str, str, int, str]
+Prediction = Tuple[int, float]
+
+
+class PredictionCache:
+    """LRU/TTL cache of single-record predictions with in-flight request coalescing.
+
+    Entries are keyed by the exact model snapshot (scenario, model and load version)
+    and a canonical hash of the validated record, so a prediction can never be served
+    for another model. Entries of a scenario are also dropped as soon as another model
+    is activated or the scenario is rolled back. Concurrent lookups of the same key
+    share a single computation.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Prediction]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def record_digest(record: Dict[str, Any]) -> str:
+        """Canonical hash of a validated record, independent of the field order."""
+        canonical = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+    @classmethod
+    def key(cls, loaded_model: RegisteredModel, record: Dict[str, Any]) -> CacheKey:
+        return (loaded_model.scenario_id, loaded_model.model_id, loaded_model.version, cls.record_digest(record))
+
+    def lookup(self, key: CacheKey) -> Optional[Prediction]:
+        """Returns a cached prediction and marks it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def store(self, key: CacheKey, prediction: Prediction) -> None:
+        """Adds a prediction, evicting the least recently used entries above max_entries."""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else float('inf')
+        with self._lock:
+            self._entries[key] = (expires_at, prediction)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    async def get_or_compute(self, loaded_model: RegisteredModel, record: Dict[str, Any],
+                             compute: Callable[[], Awaitable[Prediction]]) -> Prediction:
+        """Returns the cached prediction of a record or computes it once for all concurrent callers.
+
+        Args:
+            loaded_model: Model snapshot the prediction is made with
+            record: Validated input record
+            compute: Coroutine function running the prediction on a miss
+
+        Returns:
+            (prediction, confidence_score)
+        """
+        key = self.key(loaded_model, record)
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._compute(key, compute))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._coalesced += 1
+        # A cancelled caller must not cancel the computation other callers are waiting for
+        return await asyncio.shield(in_flight)
+
+    async def _compute(self, key: CacheKey, compute: Callable[[], Awaitable[Prediction]]) -> Prediction:
+        prediction = await compute()
+        # Failures are not cached, the next request retries
+        self.store(key, prediction)
+        return prediction
+
+    def invalidate(self, scenario_id: str) -> int:
+        """Drops every cached prediction of a scenario.
+
+        Returns:
+            Number of removed entries
+        """
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == scenario_id]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+        if stale:
+            logging.info(f"Invalidated {len(stale)} cached predictions of scenario {scenario_id}")
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drops every cached prediction."""
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "in_flight": len(self._in_flight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+def prediction_cache_enabled() -> bool:
+    """Returns True if predictions should be served from the prediction cache."""
+    return os.environ.get("PREDICTION_CACHE", "true").lower() in ("1", "true", "yes")
+
+
+@lru_cache()
+def get_prediction_cache() -> PredictionCache:
+    """Returns the process-wide prediction cache configured from the environment."""
+    ttl = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", "300"))
+    return PredictionCache(
+        max_entries=int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", "10000")),
+        ttl_seconds=ttl if ttl > 0 else None,
+    )
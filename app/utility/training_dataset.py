@@ -0,0 +1,386 @@
+# training_dataset.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import traceback
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.models import CATEGORICAL_VOCABULARIES
+from utility.feature_encoder import CATEGORICAL_FEATURES, NUMERIC_FEATURES
+
+# Label column of the training data, as in the applicants table
+TARGET_COLUMN = 'completed_filing'
+TRUE_VALUES = {'1', '1.0', 'true', 'yes'}
+FALSE_VALUES = {'0', '0.0', 'false', 'no'}
+
+MANIFEST_NAME = "manifest.json"
+# Version 2 datasets contain no rows with categories outside the vocabularies
+FORMAT_VERSION = 2
+
+# Storage dtype of every column. Categorical columns hold int8 codes into their
+# vocabulary.
+COLUMN_DTYPES = {
+    **{column: 'int8' for column in CATEGORICAL_FEATURES},
+    **{column: 'float64' for column in NUMERIC_FEATURES},
+    'previous_year_filing': 'int8',
+    TARGET_COLUMN: 'int8',
+}
+
+
+def _as_binary(series: pd.Series) -> pd.Series:
+    """Converts booleans, 0/1 and true/false strings into 0.0/1.0, anything else into NaN."""
+    if series.dtype == bool:
+        return series.astype(np.float64)
+    text = series.astype(str).str.strip().str.lower()
+    return pd.Series(
+        np.where(text.isin(TRUE_VALUES), 1.0, np.where(text.isin(FALSE_VALUES), 0.0, np.nan)),
+        index=series.index,
+    )
+
+
+def clean_training_frame(frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """Selects and converts the feature and label columns, dropping incomplete rows.
+
+    Rows with a category outside CATEGORICAL_VOCABULARIES are dropped as well, the
+    prediction requests reject these values so a model never needs to learn them.
+
+    Raises:
+        ValueError: If columns are missing
+    """
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    missing = [column for column in CATEGORICAL_FEATURES + NUMERIC_FEATURES + [TARGET_COLUMN]
+               if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Training data is missing columns: {missing}")
+
+    features = pd.DataFrame(index=frame.index)
+    for column in CATEGORICAL_FEATURES:
+        # Requests are lowercased by TaxFilingPredictionRequest
+        features[column] = frame[column].astype(str).str.strip().str.lower()
+    for column in NUMERIC_FEATURES:
+        if column == 'previous_year_filing':
+            features[column] = _as_binary(frame[column])
+        else:
+            features[column] = pd.to_numeric(frame[column], errors='coerce')
+    labels = _as_binary(frame[TARGET_COLUMN])
+
+    complete = features[NUMERIC_FEATURES].notna().all(axis=1) & labels.notna()
+    dropped = int((~complete).sum())
+    if dropped:
+        logging.warning(f"Dropped {dropped} incomplete training rows")
+
+    unknown = {column: ~features[column].isin(CATEGORICAL_VOCABULARIES[column]) & complete
+               for column in CATEGORICAL_FEATURES}
+    known = complete & ~np.logical_or.reduce(list(unknown.values()))
+    rejected = int((complete & ~known).sum())
+    if rejected:
+        counts = {column: int(mask.sum()) for column, mask in unknown.items() if mask.any()}
+        logging.warning(f"Dropped {rejected} training rows with unknown categories: {counts}")
+    return features[known], labels[known].astype(int)
+
+
+def read_csv_chunks(csv_path: str, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+    """Streams the cleaned feature and label columns of a training CSV in chunks.
+
+    Only the feature and label columns are parsed.
+
+    Yields:
+        (features, labels) of each chunk
+    """
+    wanted = set(CATEGORICAL_FEATURES + NUMERIC_FEATURES + [TARGET_COLUMN])
+    with pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str,
+                     usecols=lambda column: str(column).strip().lower() in wanted) as reader:
+        for chunk in reader:
+            features, labels = clean_training_frame(chunk)
+            yield features, labels.to_numpy()
+
+
+def convert_csv(csv_path: str, output_dir: str, chunk_rows: int = 100000,
+                source_sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Converts a training CSV into memory-mappable columns.
+
+    Each column is written to <column>.bin as a raw little-endian array of its
+    COLUMN_DTYPES type. The manifest records the row count, the per-column files
+    and hashes, the vocabularies of the categorical codes and the hash of the
+    source CSV. Memory depends on chunk_rows, not on the size of the file.
+
+    Args:
+        csv_path: Training data CSV
+        output_dir: Existing empty directory receiving the columns and the manifest
+        chunk_rows: Rows parsed at a time
+        source_sha256: Hash of the CSV, used to detect stale conversions
+
+    Returns:
+        The manifest
+    """
+    columns = list(COLUMN_DTYPES)
+    files = {column: open(os.path.join(output_dir, f"{column}.bin"), 'wb') for column in columns}
+    digests = {column: hashlib.sha256() for column in columns}
+    rows = 0
+    try:
+        for features, labels in read_csv_chunks(csv_path, chunk_rows):
+            arrays = {
+                column: pd.Categorical(features[column], categories=CATEGORICAL_VOCABULARIES[column]).codes
+                for column in CATEGORICAL_FEATURES
+            }
+            arrays.update({column: features[column].to_numpy() for column in NUMERIC_FEATURES})
+            arrays[TARGET_COLUMN] = labels
+            for column in columns:
+                data = np.ascontiguousarray(arrays[column], dtype=np.dtype(COLUMN_DTYPES[column]).newbyteorder('<'))
+                files[column].write(data.data)
+                digests[column].update(data.data)
+            rows += len(labels)
+    finally:
+        for column_file in files.values():
+            column_file.close()
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "rows": rows,
+        "source_sha256": source_sha256,
+        "columns": {
+            column: {
+                "file": f"{column}.bin",
+                "dtype": COLUMN_DTYPES[column],
+                "size_bytes": os.path.getsize(os.path.join(output_dir, f"{column}.bin")),
+                "sha256": digests[column].hexdigest(),
+                **({"vocabulary": CATEGORICAL_VOCABULARIES[column]} if column in CATEGORICAL_FEATURES else {}),
+            }
+            for column in columns
+        },
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    logging.info(f"Converted {rows} training rows into {len(columns)} columns")
+    return manifest
+
+
+class ColumnarDataset:
+    """Read-only view of a converted training dataset.
+
+    Columns are memory mapped, so opening a dataset only reads its manifest and
+    slicing it only pages in the rows that are used.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format {self.manifest.get('format_version')}")
+        self.rows = self.manifest["rows"]
+        self._columns: Dict[str, np.ndarray] = {}
+        self._lookups = {
+            column: np.asarray(spec["vocabulary"], dtype=object)
+            for column, spec in self.manifest["columns"].items() if "vocabulary" in spec
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(spec["size_bytes"] for spec in self.manifest["columns"].values())
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns the memory-mapped array of a column."""
+        if name not in self._columns:
+            spec = self.manifest["columns"][name]
+            dtype = np.dtype(spec["dtype"]).newbyteorder('<')
+            if self.rows == 0:
+                self._columns[name] = np.empty(0, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(
+                    os.path.join(self.directory, spec["file"]), dtype=dtype, mode='r', shape=(self.rows,)
+                )
+        return self._columns[name]
+
+    def frame(self, start: int = 0, stop: Optional[int] = None) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Decodes a row range into the feature frame and labels the pipelines are fitted on.
+
+        Returns:
+            (features, labels) with categorical codes decoded into their values
+        """
+        features = pd.DataFrame({
+            column: self._lookups[column][self.column(column)[start:stop]] if column in self._lookups
+            else np.asarray(self.column(column)[start:stop], dtype=np.float64)
+            for column in CATEGORICAL_FEATURES + NUMERIC_FEATURES
+        })
+        return features, np.asarray(self.column(TARGET_COLUMN)[start:stop], dtype=np.int64)
+
+    def iter_frames(self, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+        """Streams the dataset in chunks of chunk_rows rows."""
+        for start in range(0, self.rows, chunk_rows):
+            yield self.frame(start, start + chunk_rows)
+
+
+class DatasetCache:
+    """Local cache of converted training datasets with LRU eviction.
+
+    Every dataset is a directory named after its training data ID. Entries whose
+    manifest does not match the hash of the current CSV or the current format are
+    treated as misses. The least recently used datasets are removed once the cache
+    grows above max_bytes, except datasets held with acquire by a running job.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # {training data ID: jobs using the dataset}
+        self._in_use: Dict[str, int] = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, data_id: str) -> str:
+        return os.path.join(self.directory, data_id)
+
+    def get_path(self, data_id: str, source_sha256: Optional[str] = None) -> Optional[str]:
+        """Returns the directory of a cached dataset.
+
+        Args:
+            data_id: Training data ID
+            source_sha256: Hash of the CSV the dataset must have been converted from
+
+        Returns:
+            Dataset directory, None on a miss
+        """
+        path = self._path(data_id)
+        with self._lock:
+            try:
+                with open(os.path.join(path, MANIFEST_NAME)) as manifest_file:
+                    manifest = json.load(manifest_file)
+            except (OSError, ValueError):
+                self._misses += 1
+                return None
+            if (manifest.get("format_version") != FORMAT_VERSION
+                    or (source_sha256 and manifest.get("source_sha256") != source_sha256)):
+                self._misses += 1
+                return None
+            # Mark as recently used
+            os.utime(path)
+            self._hits += 1
+            return path
+
+    def acquire(self, data_id: str) -> None:
+        """Protects the dataset of a training data ID from eviction until release.
+
+        Acquire before looking up or building the dataset, so it cannot be evicted
+        between being cached and being opened.
+        """
+        with self._lock:
+            self._in_use[data_id] = self._in_use.get(data_id, 0) + 1
+
+    def release(self, data_id: str) -> None:
+        """Drops one hold of acquire, the dataset can be evicted once no job holds it."""
+        with self._lock:
+            remaining = self._in_use.get(data_id, 0) - 1
+            if remaining > 0:
+                self._in_use[data_id] = remaining
+            else:
+                self._in_use.pop(data_id, None)
+
+    def new_directory(self) -> str:
+        """Returns an empty directory on the cache filesystem to build a dataset in."""
+        return tempfile.mkdtemp(dir=self.directory, prefix=".tmp_")
+
+    def put(self, data_id: str, build_dir: str) -> str:
+        """Moves a dataset built in build_dir into the cache and evicts cold datasets.
+
+        Returns:
+            Directory of the cached dataset
+        """
+        path = self._path(data_id)
+        with self._lock:
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(build_dir, path)
+            self._evict(keep=path)
+        return path
+
+    def _entries(self):
+        """Returns (mtime, size, path) of every cached dataset, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+        return sorted(entries)
+
+    def _evict(self, keep: str) -> None:
+        """Removes least recently used datasets until the cache fits in max_bytes.
+
+        Datasets in use are skipped, the cache may stay above max_bytes until they are released.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep or os.path.basename(path) in self._in_use:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self._evictions += 1
+            logging.info(f"Evicted cached dataset {os.path.basename(path)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            entries = self._entries()
+            return {
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "cached_bytes": sum(size for _, size, _ in entries),
+                "cached_datasets": len(entries),
+                "datasets_in_use": len(self._in_use),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+def run_conversion_process(csv_path: str, output_dir: str, result_path: str, chunk_rows: int = 100000,
+                           source_sha256: Optional[str] = None, niceness: int = 0) -> None:
+    """Entry point of a dataset conversion worker process.
+
+    The row count, or the error, is written to result_path as JSON.
+    """
+    result: Dict[str, Any] = {}
+    try:
+        if niceness and hasattr(os, 'nice'):
+            os.nice(niceness)
+        result['rows'] = convert_csv(csv_path, output_dir, chunk_rows, source_sha256)['rows']
+    except Exception as e:
+        logging.error(f"Dataset conversion failed: {traceback.format_exc()}")
+        result['error'] = f"{type(e).__name__}: {str(e)}"
+    with open(result_path, 'w') as result_file:
+        json.dump(result, result_file)
+
+
+def dataset_conversion_enabled() -> bool:
+    """Returns True if uploaded training data should be converted to columnar datasets."""
+    return os.environ.get("DATASET_CONVERSION", "true").lower() in ("1", "true", "yes")
+
+
+@lru_cache()
+def get_dataset_cache() -> DatasetCache:
+    """Returns the process-wide dataset cache configured from the environment."""
+    return DatasetCache(
+        directory=os.environ.get(
+            "DATASET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ml_pipeline_dataset_cache")
+        ),
+        max_bytes=int(os.environ.get("DATASET_CACHE_MAX_BYTES", str(20 * 1024 ** 3))),
+    )
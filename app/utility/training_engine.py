@@ -0,0 +1,500 @@
+# training_engine.py
+import os
+import json
+import uuid
+import shutil
+import asyncio
+import logging
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from supabase import Client
+
+from models.models import ModelStatus
+from database.crud import (
+    claim_training_slot, download_columnar_dataset, download_training_data, get_next_model_version,
+    heartbeat_training_job, mark_training_data_used, save_training_job, upload_columnar_dataset, upload_new_model
+)
+from utility.model_trainer import run_training_process
+from utility.training_dataset import ColumnarDataset, get_dataset_cache, run_conversion_process
+
+logger = logging.getLogger("training_engine")
+
+MODEL_FILE_NAME = "model.pkl"
+
+BATCH_MODE = "batch"
+INCREMENTAL_MODE = "incremental"
+AUTO_MODE = "auto"
+
+
+class TrainingCancelledError(RuntimeError):
+    """Raised when a training job can no longer be cancelled."""
+
+
+@dataclass
+class TrainingJob:
+    """State of a training job.
+
+    The status moves from pending (queued) to training (dataset download, fit and
+    upload) and ends as inactive (the model is registered and can be activated)
+    or failed (including cancelled jobs).
+    """
+    training_id: str
+    scenario_id: str
+    data_id: str
+    tune: bool = False
+    status: ModelStatus = ModelStatus.PENDING
+    model_id: Optional[str] = None
+    metrics: Optional[Dict[str, float]] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Cleared once the trained model is being uploaded, which must not be interrupted
+    cancellable: bool = field(default=True, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def to_row(self) -> Dict[str, Any]:
+        """Returns the job as a training_jobs row."""
+        return {
+            "training_id": self.training_id,
+            "scenario_id": self.scenario_id,
+            "data_id": self.data_id,
+            "tuned": self.tune,
+            "status": self.status.value,
+            "model_id": self.model_id,
+            "metrics": self.metrics,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class TrainingEngine:
+    """Runs training jobs in worker processes outside the web server.
+
+    At most max_concurrency jobs train at a time over every worker and replica, the
+    others wait as pending. The limit is enforced through the training_jobs table:
+    pending jobs claim a slot with the claim_training_slot function every
+    slot_poll_seconds, and training jobs refresh their heartbeat every
+    heartbeat_seconds. A job without a heartbeat for stale_seconds lost its worker,
+    the next claim fails it and frees its slot. Cancellations requested on another
+    worker are flagged in the table and picked up with the next claim or heartbeat.
+
+    Each
+    job fits its model in a separate spawned process running at a lower priority
+    with its native thread pools capped to threads, so training cannot starve the
+    inference workers, and a running fit can be cancelled by terminating its process.
+    Trained models are uploaded through upload_new_model as inactive models.
+
+    Modes:
+        batch: load the whole dataset and fit a logistic regression
+        incremental: stream the dataset in chunk_rows chunks and fit with partial_fit,
+            memory does not depend on the dataset size
+        auto: incremental for datasets larger than out_of_core_bytes, batch otherwise
+
+    Jobs train on the columnar conversion of their CSV (see utility.training_dataset),
+    taken from the local dataset cache, downloaded from storage or converted once in
+    a worker process and uploaded next to the CSV. prepare_dataset starts the
+    conversion right after an upload, concurrent requests share one conversion.
+
+    Batch jobs can be tuned instead of fitting a single configuration. Tuning runs
+    a successive halving search over tune_jobs search workers, which inherit the
+    lower priority of the training process. The search workers share the threads
+    core budget of the job, so tune_jobs defaults to threads and cannot exceed it.
+    """
+
+    def __init__(self, max_concurrency: int = 1, threads: int = 1, niceness: int = 10,
+                 timeout_seconds: Optional[float] = None, max_jobs: int = 100, poll_interval: float = 0.5,
+                 mode: str = AUTO_MODE, out_of_core_bytes: int = 256 * 1024 * 1024, chunk_rows: int = 50000,
+                 tune: bool = False, tune_jobs: Optional[int] = None, slot_poll_seconds: float = 2.0,
+                 heartbeat_seconds: float = 10.0, stale_seconds: int = 60):
+        if mode not in (BATCH_MODE, INCREMENTAL_MODE, AUTO_MODE):
+            raise ValueError(f"Unknown training mode: {mode}")
+        tune_jobs = threads if tune_jobs is None else tune_jobs
+        if not 1 <= tune_jobs <= threads:
+            raise ValueError(f"tune_jobs must be between 1 and the {threads} training threads, got {tune_jobs}")
+        self.max_concurrency = max_concurrency
+        self.threads = threads
+        self.niceness = niceness
+        self.timeout_seconds = timeout_seconds
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.mode = mode
+        self.out_of_core_bytes = out_of_core_bytes
+        self.chunk_rows = chunk_rows
+        self.tune = tune
+        self.tune_jobs = tune_jobs
+        self.slot_poll_seconds = slot_poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        # Per worker limit, jobs holding a training slot wait for their dataset conversion
+        self._conversion_semaphore = asyncio.Semaphore(max_concurrency)
+        self._datasets: Dict[str, asyncio.Task] = {}
+        # spawn avoids forking the threads of the web server
+        self._context = multiprocessing.get_context("spawn")
+        self._jobs: "OrderedDict[str, TrainingJob]" = OrderedDict()
+
+    def submit(self, scenario_id: str, training_data: Dict[str, Any], db: Client,
+               tune: Optional[bool] = None) -> TrainingJob:
+        """Queues a training job on the running event loop.
+
+        Args:
+            scenario_id: Scenario the trained model is added to
+            training_data: training_data row of the dataset
+            db: Supabase client
+            tune: Tune the model, defaults to the engine setting
+
+        Returns:
+            The pending job
+        """
+        job = TrainingJob(
+            training_id=str(uuid.uuid4()),
+            scenario_id=scenario_id,
+            data_id=training_data["model_training_data_id"],
+            tune=self.tune if tune is None else tune,
+        )
+        self._jobs[job.training_id] = job
+        self._prune()
+        job.task = asyncio.create_task(self._run(job, training_data, db))
+        logger.info(f"Queued training job {job.training_id} for scenario {scenario_id} on data {job.data_id}")
+        return job
+
+    def prepare_dataset(self, training_data: Dict[str, Any], db: Client) -> asyncio.Task:
+        """Makes the columnar dataset of a training data file available in the background.
+
+        Args:
+            training_data: training_data row of the CSV
+            db: Supabase client
+
+        Returns:
+            Task resolving to the local dataset directory, shared by concurrent callers
+        """
+        data_id = training_data["model_training_data_id"]
+        task = self._datasets.get(data_id)
+        if task is None:
+            task = asyncio.create_task(self._ensure_dataset(training_data, db))
+            self._datasets[data_id] = task
+            task.add_done_callback(lambda done: self._dataset_done(data_id, done))
+        return task
+
+    def _dataset_done(self, data_id: str, task: asyncio.Task) -> None:
+        self._datasets.pop(data_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to prepare dataset of training data {data_id}: {task.exception()}")
+
+    async def ensure_dataset(self, training_data: Dict[str, Any], db: Client) -> str:
+        """Returns the local columnar dataset directory of a training data file."""
+        # A cancelled job must not cancel a conversion other callers are waiting for
+        return await asyncio.shield(self.prepare_dataset(training_data, db))
+
+    async def _ensure_dataset(self, training_data: Dict[str, Any], db: Client) -> str:
+        data_id = training_data["model_training_data_id"]
+        cache = get_dataset_cache()
+        path = await asyncio.to_thread(cache.get_path, data_id, training_data.get("sha256"))
+        if path is not None:
+            return path
+
+        build_dir = await asyncio.to_thread(cache.new_directory)
+        try:
+            if training_data.get("columnar_url") and await download_columnar_dataset(training_data, build_dir, db):
+                logger.info(f"Downloaded columnar dataset of training data {data_id}")
+            else:
+                await self._convert_dataset(training_data, build_dir, db)
+            return await asyncio.to_thread(cache.put, data_id, build_dir)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+
+    async def _convert_dataset(self, training_data: Dict[str, Any], build_dir: str, db: Client) -> None:
+        """Converts the CSV of a training data file into build_dir and uploads the result."""
+        data_id = training_data["model_training_data_id"]
+        # Remove whatever a failed download left behind
+        for entry in os.scandir(build_dir):
+            os.remove(entry.path)
+        work_dir = tempfile.mkdtemp(prefix=f"dataset_{data_id}_")
+        try:
+            async with self._conversion_semaphore:
+                csv_path = os.path.join(work_dir, "training_data.csv")
+                if not await download_training_data(training_data, csv_path, db):
+                    raise RuntimeError(f"Failed to download training data {data_id}")
+                result = await self._run_process(
+                    run_conversion_process,
+                    (csv_path, build_dir, os.path.join(work_dir, "result.json"), self.chunk_rows,
+                     training_data.get("sha256"), self.niceness),
+                    os.path.join(work_dir, "result.json"),
+                )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        logger.info(f"Converted training data {data_id} into a columnar dataset of {result['rows']} rows")
+        # Later jobs on other instances download the dataset instead of converting it again
+        await upload_columnar_dataset(data_id, build_dir, db)
+
+    def get(self, training_id: str) -> Optional[TrainingJob]:
+        return self._jobs.get(training_id)
+
+    def cancel(self, training_id: str) -> Optional[TrainingJob]:
+        """Cancels a pending or training job of this worker, terminating its training process.
+
+        Jobs of other workers are cancelled with request_training_cancellation.
+
+        Returns:
+            The job, None if it is unknown to this worker
+
+        Raises:
+            TrainingCancelledError: If the job already finished or is uploading its model
+        """
+        job = self._jobs.get(training_id)
+        if job is None:
+            return None
+        if job.finished or not job.cancellable:
+            raise TrainingCancelledError(f"Training job {training_id} can no longer be cancelled")
+        job.task.cancel()
+        logger.info(f"Cancelling training job {training_id}")
+        return job
+
+    def _prune(self) -> None:
+        """Forgets the oldest finished jobs above max_jobs, their rows stay in the database."""
+        finished = [training_id for training_id, job in self._jobs.items() if job.finished]
+        for training_id in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[training_id]
+
+    async def _save(self, job: TrainingJob, db: Client) -> None:
+        """Records the job status in the database without failing the job."""
+        try:
+            await save_training_job(job.to_row(), db)
+        except Exception as e:
+            logger.error(f"Failed to record status of training job {job.training_id}: {str(e)}")
+
+    async def _claim_slot(self, job: TrainingJob, db: Client) -> None:
+        """Waits until the job holds one of the max_concurrency training slots.
+
+        Raises:
+            asyncio.CancelledError: If a cancellation of the job was requested
+            RuntimeError: If the job is no longer pending in the database
+        """
+        while True:
+            try:
+                result = await claim_training_slot(job.training_id, self.max_concurrency, self.stale_seconds, db)
+            except Exception as e:
+                logger.error(f"Failed to claim a training slot for job {job.training_id}: {str(e)}")
+                result = None
+            if result == "claimed":
+                return
+            if result == "cancelled":
+                raise asyncio.CancelledError()
+            if result == "missing":
+                raise RuntimeError("Training job is not pending in the database")
+            await asyncio.sleep(self.slot_poll_seconds)
+
+    async def _heartbeat(self, job: TrainingJob, db: Client) -> None:
+        """Keeps the training slot of a job and applies cancellations requested on other workers."""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                row = await heartbeat_training_job(job.training_id, db)
+            except Exception as e:
+                logger.error(f"Failed to refresh heartbeat of training job {job.training_id}: {str(e)}")
+                continue
+            if row is None:
+                # Failed as stale by another worker, its slot may already be taken
+                logger.error(f"Training job {job.training_id} lost its training slot, cancelling it")
+            elif not row.get("cancel_requested"):
+                continue
+            if job.cancellable:
+                logger.info(f"Cancelling training job {job.training_id} on request")
+                job.task.cancel()
+                return
+
+    async def _run(self, job: TrainingJob, training_data: Dict[str, Any], db: Client) -> None:
+        heartbeat = None
+        try:
+            await self._save(job, db)
+            await self._claim_slot(job, db)
+            # claim_training_slot recorded the status, the final save records the local start time
+            job.status = ModelStatus.TRAINING
+            job.started_at = datetime.now(timezone.utc)
+            heartbeat = asyncio.create_task(self._heartbeat(job, db))
+            work_dir = tempfile.mkdtemp(prefix=f"training_{job.training_id}_")
+            try:
+                await self._train_and_upload(job, training_data, work_dir, db)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            job.status = ModelStatus.INACTIVE
+            logger.info(f"Training job {job.training_id} finished, model {job.model_id} metrics {job.metrics}")
+        except asyncio.CancelledError:
+            job.status = ModelStatus.FAILES
+            job.error = "Cancelled"
+            logger.info(f"Training job {job.training_id} cancelled")
+        except Exception as e:
+            job.status = ModelStatus.FAILES
+            job.error = str(e)
+            logger.error(f"Training job {job.training_id} failed: {str(e)}")
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            job.cancellable = False
+            job.finished_at = datetime.now(timezone.utc)
+            await self._save(job, db)
+
+    async def _train_and_upload(self, job: TrainingJob, training_data: Dict[str, Any], work_dir: str,
+                                db: Client) -> None:
+        model_path = os.path.join(work_dir, MODEL_FILE_NAME)
+        cache = get_dataset_cache()
+        # Keeps other jobs from evicting the dataset while the training process reads it
+        cache.acquire(job.data_id)
+        try:
+            dataset_dir = await self.ensure_dataset(training_data, db)
+            incremental = self.mode == INCREMENTAL_MODE or (
+                self.mode == AUTO_MODE and ColumnarDataset(dataset_dir).nbytes > self.out_of_core_bytes
+            )
+            if incremental and job.tune:
+                # The search needs the dataset in memory
+                logger.warning(f"Training job {job.training_id} trains out of core, tuning is skipped")
+                job.tune = False
+            metrics = await self._fit(
+                dataset_dir, model_path, os.path.join(work_dir, "result.json"),
+                chunk_rows=self.chunk_rows if incremental else None,
+                tune_jobs=self.tune_jobs if job.tune else None,
+            )
+        finally:
+            cache.release(job.data_id)
+
+        job.cancellable = False
+        model_id = str(uuid.uuid4())
+        model_version = await get_next_model_version(job.scenario_id, db)
+        with open(model_path, 'rb') as model_file:
+            model_url = await upload_new_model(
+                file=model_file,
+                file_name=MODEL_FILE_NAME,
+                model_name=f"{job.scenario_id}-v{model_version:g}",
+                model_id=model_id,
+                model_version=model_version,
+                model_performance=json.dumps(metrics),
+                scenario_id=job.scenario_id,
+                db=db,
+                training_data_id=job.data_id,
+            )
+        if model_url is None:
+            raise RuntimeError("Failed to upload the trained model")
+        await mark_training_data_used(job.data_id, db)
+        job.model_id = model_id
+        job.metrics = metrics
+
+    async def _fit(self, data_path: str, model_path: str, result_path: str,
+                   chunk_rows: Optional[int] = None, tune_jobs: Optional[int] = None) -> Dict[str, float]:
+        """Fits the model in a training process and returns its metrics.
+
+        With chunk_rows the dataset is streamed and fitted out of core, with
+        tune_jobs the model is tuned on that many search workers.
+        """
+        result = await self._run_process(
+            run_training_process,
+            (data_path, model_path, result_path, self.threads, self.niceness, chunk_rows, tune_jobs),
+            result_path,
+        )
+        return result["metrics"]
+
+    async def _run_process(self, target: Callable, args: tuple, result_path: str) -> Dict[str, Any]:
+        """Runs target in a worker process and returns the JSON result it wrote to result_path.
+
+        The process is terminated if the caller is cancelled or it exceeds timeout_seconds.
+
+        Raises:
+            RuntimeError: If the process times out, fails or exits without a result
+        """
+        process = self._context.Process(
+            target=target,
+            args=args,
+            # Daemon processes cannot start the worker processes of the tuning search,
+            # shutdown() terminates the process instead
+            daemon=False,
+        )
+        process.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_seconds if self.timeout_seconds is not None else None
+        try:
+            # Poll instead of joining in a thread so long fits do not hold on to executor threads
+            while process.is_alive():
+                if deadline is not None and loop.time() > deadline:
+                    raise RuntimeError(f"Worker process did not finish within {self.timeout_seconds} seconds")
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            if process.is_alive():
+                process.terminate()
+                await asyncio.to_thread(process.join)
+            process.close()
+
+        try:
+            with open(result_path) as result_file:
+                result = json.load(result_file)
+        except (OSError, ValueError):
+            raise RuntimeError("Worker process exited without a result")
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    async def shutdown(self) -> None:
+        """Cancels every unfinished job and waits for their processes to exit."""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} training jobs on shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the concurrency limit and the job counts of this worker by status."""
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status.value] = counts.get(job.status.value, 0) + 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "slot_poll_seconds": self.slot_poll_seconds,
+            "heartbeat_seconds": self.heartbeat_seconds,
+            "stale_seconds": self.stale_seconds,
+            "threads_per_job": self.threads,
+            "niceness": self.niceness,
+            "timeout_seconds": self.timeout_seconds,
+            "mode": self.mode,
+            "out_of_core_bytes": self.out_of_core_bytes,
+            "chunk_rows": self.chunk_rows,
+            "tune": self.tune,
+            "tune_jobs": self.tune_jobs,
+            "datasets_preparing": len(self._datasets),
+            "dataset_cache": get_dataset_cache().stats(),
+            "jobs": counts,
+        }
+
+
+@lru_cache()
+def get_training_engine() -> TrainingEngine:
+    """Returns the process-wide training engine configured from the environment."""
+    timeout = float(os.environ.get("TRAINING_TIMEOUT_SECONDS", "3600"))
+    # 0 uses the training threads budget
+    tune_jobs = int(os.environ.get("TRAINING_TUNE_JOBS", "0"))
+    return TrainingEngine(
+        max_concurrency=int(os.environ.get("TRAINING_MAX_CONCURRENCY", "1")),
+        threads=int(os.environ.get("TRAINING_THREADS", "1")),
+        niceness=int(os.environ.get("TRAINING_NICENESS", "10")),
+        timeout_seconds=timeout if timeout > 0 else None,
+        max_jobs=int(os.environ.get("TRAINING_MAX_JOBS", "100")),
+        mode=os.environ.get("TRAINING_MODE", AUTO_MODE).lower(),
+        out_of_core_bytes=int(os.environ.get("TRAINING_OUT_OF_CORE_BYTES", str(256 * 1024 * 1024))),
+        chunk_rows=int(os.environ.get("TRAINING_CHUNK_ROWS", "50000")),
+        tune=os.environ.get("TRAINING_TUNE", "false").lower() in ("1", "true", "yes"),
+        tune_jobs=tune_jobs if tune_jobs > 0 else None,
+        slot_poll_seconds=float(os.environ.get("TRAINING_SLOT_POLL_SECONDS", "2")),
+        heartbeat_seconds=float(os.environ.get("TRAINING_HEARTBEAT_SECONDS", "10")),
+        stale_seconds=int(os.environ.get("TRAINING_STALE_SECONDS", "60")),
+    )